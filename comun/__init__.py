@@ -0,0 +1 @@
+"""Módulos compartidos por todas las páginas de la app."""
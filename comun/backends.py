@@ -0,0 +1,576 @@
+"""Backends de almacenamiento para las hojas del libro.
+
+Todos exponen la misma interfaz por nombre de hoja (Nadadores, Tiempos, ...):
+    leer(hoja) -> DataFrame
+    leer_varias(hojas) -> {hoja: DataFrame}  (opcional: varias hojas en un viaje)
+    escribir(hoja, df)                     -> reemplaza la hoja completa
+    agregar_filas(hoja, filas)             -> agrega filas al final
+    actualizar_filas(hoja, claves, filas)  -> pisa columnas de las filas que
+                                              coinciden en `claves`; devuelve
+                                              cuántas filas coincidieron
+    eliminar_filas(hoja, claves, filas)    -> borra las filas que coinciden
+
+Las operaciones por fila sólo envían las filas tocadas, así el costo de una
+escritura no crece con el tamaño de la hoja.
+
+Para escrituras concurrentes sobre la misma fila hay además una variante con
+control de versión (columna `rev`, un token nuevo en cada escritura):
+    leer_fila(hoja, claves, fila)                  -> dict o None
+    reemplazar_si(hoja, claves, fila, rev_esperada) -> False si la fila cambió
+                                                       (rev_esperada None: sólo
+                                                       si todavía no existe)
+    eliminar_si(hoja, claves, fila, rev_esperada)   -> False si la fila cambió
+En SQLite (y por lo tanto en el espejo) la comparación y la escritura son
+atómicas. Sheets no tiene escrituras condicionales: se verifica la versión
+justo antes de escribir y se relee después, lo que achica la ventana de
+carrera pero no la elimina.
+
+- "gsheets": Google Sheets directo (comportamiento histórico).
+- "sqlite":  base local embebida; sirve para correr la app offline o en tests.
+- "espejo":  lee y escribe en SQLite y replica cada escritura a Sheets en
+             segundo plano. Sheets pasa a ser destino de sincronización.
+
+El backend se elige con la variable de entorno NATACION_BACKEND o con la
+sección [almacenamiento] de secrets.toml (backend = "...", ruta = "...").
+"""
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+RUTA_DB_DEFECTO = "natacion.db"
+COLUMNA_VERSION = "rev"
+
+
+def normalizar_clave(valor):
+    """Texto comparable para columnas clave: 5, 5.0 y "5" son la misma clave."""
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    texto = str(valor).strip()
+    try:
+        numero = float(texto)
+        if numero.is_integer():
+            return str(int(numero))
+    except ValueError:
+        pass
+    return texto
+
+
+def _valor_python(valor):
+    """Convierte escalares de numpy/pandas a tipos nativos (None si falta)."""
+    if valor is None:
+        return None
+    try:
+        if pd.isna(valor):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(valor, "item"):
+        return valor.item()
+    if isinstance(valor, pd.Timestamp):
+        return str(valor)
+    return valor
+
+
+def _valores_a_dataframe(valores):
+    """Misma conversión que usa conn.read (gspread_dataframe): primera fila
+    como encabezado, tipos inferidos y sin filas ni columnas anónimas vacías."""
+    if not valores:
+        return pd.DataFrame()
+    ancho = max(len(fila) for fila in valores)
+    filas = [list(fila) + [""] * (ancho - len(fila)) for fila in valores]
+    df = TextParser(filas).read()
+    df = df.dropna(how="all", axis=0)
+    vacias = [c for c in df.columns if re.match(r"^Unnamed: \d+$", str(c)) and df[c].isna().all()]
+    return df.drop(columns=vacias)
+
+
+# --- 1. GOOGLE SHEETS ---
+class BackendSheets:
+    def __init__(self, conn):
+        self.conn = conn
+        self._hojas = {}
+        self._libro = None
+
+    def leer(self, hoja):
+        return self.conn.read(worksheet=hoja, ttl=0)
+
+    def leer_varias(self, hojas):
+        """Todas las hojas pedidas en un único values.batchGet."""
+        if self._libro is None:
+            self._libro = self.conn.client._open_spreadsheet()
+        rangos = ["'" + hoja.replace("'", "''") + "'" for hoja in hojas]
+        respuesta = self._libro.values_batch_get(rangos, params={
+            "valueRenderOption": "UNFORMATTED_VALUE",
+            "dateTimeRenderOption": "FORMATTED_STRING",
+        })
+        return {hoja: _valores_a_dataframe(rango.get("values", []))
+                for hoja, rango in zip(hojas, respuesta.get("valueRanges", []))}
+
+    def escribir(self, hoja, df):
+        self.conn.update(worksheet=hoja, data=df)
+
+    def _worksheet(self, hoja):
+        # Abrir el libro y buscar la pestaña cuesta dos llamadas: se hace una vez
+        if hoja not in self._hojas:
+            self._hojas[hoja] = self.conn.client._select_worksheet(worksheet=hoja)
+        return self._hojas[hoja]
+
+    def _encabezado(self, ws, columnas):
+        """Encabezado de la hoja, agregando al final las columnas que falten."""
+        encabezado = ws.row_values(1)
+        nuevas = [c for c in columnas if c not in encabezado]
+        if nuevas:
+            from gspread.utils import rowcol_to_a1
+            total = len(encabezado) + len(nuevas)
+            if total > ws.col_count:
+                ws.add_cols(total - ws.col_count)
+            ws.update(range_name=rowcol_to_a1(1, len(encabezado) + 1), values=[nuevas])
+            encabezado = encabezado + nuevas
+        return encabezado
+
+    def _columnas(self, ws, encabezado, nombres):
+        """Valores (desde la fila 2) de las columnas pedidas, en una sola llamada."""
+        from gspread.utils import rowcol_to_a1
+        rangos = []
+        for c in nombres:
+            letra = rowcol_to_a1(1, encabezado.index(c) + 1)[:-1]
+            rangos.append(f"{letra}2:{letra}")
+        columnas = [[fila[0] if fila else "" for fila in rango] for rango in ws.batch_get(rangos)]
+        largo = max((len(col) for col in columnas), default=0)
+        return [col + [""] * (largo - len(col)) for col in columnas]
+
+    def _filas_por_clave(self, ws, encabezado, claves):
+        """{tupla de clave normalizada: [nro de fila en la hoja]} leyendo sólo las columnas clave."""
+        mapa = {}
+        for i, clave in enumerate(zip(*self._columnas(ws, encabezado, claves))):
+            mapa.setdefault(tuple(normalizar_clave(v) for v in clave), []).append(i + 2)
+        return mapa
+
+    def _versiones(self, ws, encabezado, claves, fila):
+        """[(nro de fila, rev)] de las filas con la misma clave que `fila`."""
+        buscada = tuple(normalizar_clave(fila[c]) for c in claves)
+        *cols_clave, revs = self._columnas(ws, encabezado, list(claves) + [COLUMNA_VERSION])
+        return [(i + 2, normalizar_clave(revs[i]))
+                for i, clave in enumerate(zip(*cols_clave))
+                if tuple(normalizar_clave(v) for v in clave) == buscada]
+
+    @staticmethod
+    def _celda(valor):
+        valor = _valor_python(valor)
+        return "" if valor is None else valor
+
+    def agregar_filas(self, hoja, filas):
+        if filas.empty:
+            return
+        ws = self._worksheet(hoja)
+        encabezado = self._encabezado(ws, list(filas.columns))
+        valores = [[self._celda(fila.get(c)) for c in encabezado] for fila in filas.to_dict("records")]
+        ws.append_rows(valores, value_input_option="USER_ENTERED", table_range="A1")
+
+    def actualizar_filas(self, hoja, claves, filas):
+        if filas.empty:
+            return 0
+        from gspread.utils import rowcol_to_a1
+        ws = self._worksheet(hoja)
+        encabezado = self._encabezado(ws, list(filas.columns))
+        mapa = self._filas_por_clave(ws, encabezado, claves)
+        cambios, coincidencias = [], 0
+        for fila in filas.to_dict("records"):
+            nros = mapa.get(tuple(normalizar_clave(fila[c]) for c in claves), [])
+            coincidencias += len(nros)
+            for nro in nros:
+                for col, valor in fila.items():
+                    if col in claves:
+                        continue
+                    rango = rowcol_to_a1(nro, encabezado.index(col) + 1)
+                    cambios.append({"range": rango, "values": [[self._celda(valor)]]})
+        if cambios:
+            ws.batch_update(cambios, value_input_option="USER_ENTERED")
+        return coincidencias
+
+    def eliminar_filas(self, hoja, claves, filas):
+        if filas.empty:
+            return 0
+        ws = self._worksheet(hoja)
+        encabezado = ws.row_values(1)
+        if any(c not in encabezado for c in claves):
+            # Sin la columna clave no hay fila que coincida (como en SQLite)
+            return 0
+        mapa = self._filas_por_clave(ws, encabezado, claves)
+        nros = sorted({n for fila in filas.to_dict("records")
+                       for n in mapa.get(tuple(normalizar_clave(fila[c]) for c in claves), [])})
+        # De abajo hacia arriba y por bloques contiguos, para no correr los índices
+        bloques = []
+        for n in nros:
+            if bloques and bloques[-1][1] == n - 1:
+                bloques[-1][1] = n
+            else:
+                bloques.append([n, n])
+        for inicio, fin in reversed(bloques):
+            ws.delete_rows(inicio, fin)
+        return len(nros)
+
+    def leer_fila(self, hoja, claves, fila):
+        ws = self._worksheet(hoja)
+        encabezado = ws.row_values(1)
+        if any(c not in encabezado for c in claves):
+            return None
+        nros = self._filas_por_clave(ws, encabezado, claves).get(tuple(normalizar_clave(fila[c]) for c in claves))
+        if not nros:
+            return None
+        valores = ws.row_values(nros[0])
+        return dict(zip(encabezado, valores + [""] * (len(encabezado) - len(valores))))
+
+    def reemplazar_si(self, hoja, claves, fila, rev_esperada):
+        from gspread.utils import rowcol_to_a1
+        ws = self._worksheet(hoja)
+        encabezado = self._encabezado(ws, list(fila) + [COLUMNA_VERSION])
+        token = normalizar_clave(fila[COLUMNA_VERSION])
+        valores = [self._celda(fila.get(c)) for c in encabezado]
+        actuales = self._versiones(ws, encabezado, claves, fila)
+
+        if rev_esperada is None:
+            if actuales:
+                return False
+            ws.append_rows([valores], value_input_option="USER_ENTERED", table_range="A1")
+            # Dos altas simultáneas de la misma clave: queda la primera de la hoja
+            actuales = self._versiones(ws, encabezado, claves, fila)
+            if actuales and actuales[0][1] != token:
+                for nro, rev in reversed(actuales):
+                    if rev == token:
+                        ws.delete_rows(nro)
+                return False
+            return True
+
+        if not actuales or actuales[0][1] != normalizar_clave(rev_esperada):
+            return False
+        nro = actuales[0][0]
+        ws.update(range_name=f"{rowcol_to_a1(nro, 1)}:{rowcol_to_a1(nro, len(encabezado))}",
+                  values=[valores], value_input_option="USER_ENTERED")
+        # Si otro escritor pisó la fila enseguida, la suya es la que queda
+        celda = ws.acell(rowcol_to_a1(nro, encabezado.index(COLUMNA_VERSION) + 1)).value
+        return normalizar_clave(celda) == token
+
+    def eliminar_si(self, hoja, claves, fila, rev_esperada):
+        ws = self._worksheet(hoja)
+        encabezado = self._encabezado(ws, [COLUMNA_VERSION])
+        actuales = self._versiones(ws, encabezado, claves, fila)
+        if not actuales or actuales[0][1] != normalizar_clave(rev_esperada):
+            return False
+        ws.delete_rows(actuales[0][0])
+        return True
+
+
+# --- 2. SQLITE LOCAL ---
+class BackendSQLite:
+    """Una tabla por hoja, con el mismo nombre que la pestaña del libro."""
+
+    def __init__(self, ruta=RUTA_DB_DEFECTO):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+
+    def _existe(self, hoja):
+        fila = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (hoja,)
+        ).fetchone()
+        return fila is not None
+
+    def existe(self, hoja):
+        with self._lock:
+            return self._existe(hoja)
+
+    def leer(self, hoja):
+        with self._lock:
+            if not self._existe(hoja):
+                return pd.DataFrame()
+            return pd.read_sql_query(f'SELECT * FROM "{hoja}"', self._db)
+
+    def escribir(self, hoja, df):
+        with self._lock:
+            # to_sql con una sola transacción: los lectores ven la hoja vieja o la nueva
+            with self._db:
+                df.to_sql(hoja, self._db, if_exists="replace", index=False)
+
+    def _asegurar_columnas(self, hoja, columnas):
+        existentes = {fila[1] for fila in self._db.execute(f'PRAGMA table_info("{hoja}")')}
+        for col in columnas:
+            if col not in existentes:
+                self._db.execute(f'ALTER TABLE "{hoja}" ADD COLUMN "{col}"')
+
+    @staticmethod
+    def _condicion(claves):
+        return " AND ".join(f'"{c}" = ?' for c in claves)
+
+    def agregar_filas(self, hoja, filas):
+        if filas.empty:
+            return
+        with self._lock, self._db:
+            if self._existe(hoja):
+                self._asegurar_columnas(hoja, filas.columns)
+            filas.to_sql(hoja, self._db, if_exists="append", index=False)
+
+    def actualizar_filas(self, hoja, claves, filas):
+        if filas.empty:
+            return 0
+        columnas = [c for c in filas.columns if c not in claves]
+        sql = (f'UPDATE "{hoja}" SET ' + ", ".join(f'"{c}" = ?' for c in columnas)
+               + f" WHERE {self._condicion(claves)}")
+        coincidencias = 0
+        with self._lock, self._db:
+            if not self._existe(hoja):
+                return 0
+            self._asegurar_columnas(hoja, columnas)
+            for fila in filas.to_dict("records"):
+                params = [_valor_python(fila[c]) for c in columnas + list(claves)]
+                coincidencias += self._db.execute(sql, params).rowcount
+        return coincidencias
+
+    def eliminar_filas(self, hoja, claves, filas):
+        if filas.empty:
+            return 0
+        sql = f'DELETE FROM "{hoja}" WHERE {self._condicion(claves)}'
+        borradas = 0
+        with self._lock, self._db:
+            if not self._existe(hoja):
+                return 0
+            for fila in filas.to_dict("records"):
+                borradas += self._db.execute(sql, [_valor_python(fila[c]) for c in claves]).rowcount
+        return borradas
+
+    def leer_fila(self, hoja, claves, fila):
+        with self._lock:
+            if not self._existe(hoja):
+                return None
+            cur = self._db.execute(f'SELECT * FROM "{hoja}" WHERE {self._condicion(claves)} LIMIT 1',
+                                   [_valor_python(fila[c]) for c in claves])
+            valores = cur.fetchone()
+            if valores is None:
+                return None
+            return dict(zip([d[0] for d in cur.description], valores))
+
+    def reemplazar_si(self, hoja, claves, fila, rev_esperada):
+        params_clave = [_valor_python(fila[c]) for c in claves]
+        with self._lock, self._db:
+            if not self._existe(hoja):
+                if rev_esperada is not None:
+                    return False
+                pd.DataFrame([fila]).to_sql(hoja, self._db, index=False)
+                return True
+            self._asegurar_columnas(hoja, list(fila))
+            if rev_esperada is None:
+                existe = self._db.execute(f'SELECT 1 FROM "{hoja}" WHERE {self._condicion(claves)}', params_clave).fetchone()
+                if existe:
+                    return False
+                columnas = list(fila)
+                self._db.execute(
+                    f'INSERT INTO "{hoja}" (' + ", ".join(f'"{c}"' for c in columnas) + ") VALUES ("
+                    + ", ".join("?" for _ in columnas) + ")",
+                    [_valor_python(fila[c]) for c in columnas])
+                return True
+            columnas = [c for c in fila if c not in claves]
+            cursor = self._db.execute(
+                f'UPDATE "{hoja}" SET ' + ", ".join(f'"{c}" = ?' for c in columnas)
+                + f' WHERE {self._condicion(claves)} AND COALESCE(CAST("{COLUMNA_VERSION}" AS TEXT), \'\') = ?',
+                [_valor_python(fila[c]) for c in columnas] + params_clave + [normalizar_clave(rev_esperada)])
+            return cursor.rowcount > 0
+
+    def eliminar_si(self, hoja, claves, fila, rev_esperada):
+        with self._lock, self._db:
+            if not self._existe(hoja):
+                return False
+            self._asegurar_columnas(hoja, [COLUMNA_VERSION])
+            cursor = self._db.execute(
+                f'DELETE FROM "{hoja}" WHERE {self._condicion(claves)} AND COALESCE(CAST("{COLUMNA_VERSION}" AS TEXT), \'\') = ?',
+                [_valor_python(fila[c]) for c in claves] + [normalizar_clave(rev_esperada)])
+            return cursor.rowcount > 0
+
+
+# --- 3. ESPEJO LOCAL + SINCRONIZACIÓN A SHEETS ---
+class BackendEspejo:
+    """SQLite es el camino rápido; Sheets recibe las escrituras en segundo plano.
+
+    Cada hoja tiene su cola de operaciones pendientes, que se replican en orden.
+    Una escritura completa descarta lo que estuviera pendiente para esa hoja.
+    Sólo se reintentan los errores transitorios (cuota, red); una operación
+    que falla por otra cosa pasa a `descartadas` y la cola sigue.
+    """
+
+    def __init__(self, local, remoto, max_reintentos=6):
+        self.local = local
+        self.remoto = remoto
+        self.max_reintentos = max_reintentos
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._aviso = queue.Queue()
+        self.ultimo_error = None
+        # Operaciones que Sheets rechazó de forma permanente: {hoja, operacion, error, hora}
+        self.descartadas = []
+        threading.Thread(target=self._sincronizar, daemon=True, name="espejo-sheets").start()
+
+    def _hidratar(self, hoja):
+        # Primer acceso a una hoja que todavía no está en la base local
+        if not self.local.existe(hoja):
+            self.local.escribir(hoja, self.remoto.leer(hoja))
+
+    def leer(self, hoja):
+        self._hidratar(hoja)
+        return self.local.leer(hoja)
+
+    def leer_varias(self, hojas):
+        # Las que falten en la base local se traen de Sheets en un solo viaje
+        faltantes = [hoja for hoja in hojas if not self.local.existe(hoja)]
+        if len(faltantes) > 1 and hasattr(self.remoto, "leer_varias"):
+            for hoja, df in self.remoto.leer_varias(faltantes).items():
+                self.local.escribir(hoja, df)
+        return {hoja: self.leer(hoja) for hoja in hojas}
+
+    def _encolar(self, hoja, operacion, reemplazar=False):
+        with self._lock:
+            if reemplazar or hoja not in self._pendientes:
+                self._pendientes[hoja] = []
+            self._pendientes[hoja].append(operacion)
+        self._aviso.put(hoja)
+
+    def escribir(self, hoja, df):
+        self.local.escribir(hoja, df)
+        self._encolar(hoja, ("escribir", (df,)), reemplazar=True)
+
+    def agregar_filas(self, hoja, filas):
+        self._hidratar(hoja)
+        self.local.agregar_filas(hoja, filas)
+        self._encolar(hoja, ("agregar_filas", (filas,)))
+
+    def actualizar_filas(self, hoja, claves, filas):
+        self._hidratar(hoja)
+        coincidencias = self.local.actualizar_filas(hoja, claves, filas)
+        if coincidencias:
+            self._encolar(hoja, ("actualizar_filas", (claves, filas)))
+        return coincidencias
+
+    def eliminar_filas(self, hoja, claves, filas):
+        self._hidratar(hoja)
+        borradas = self.local.eliminar_filas(hoja, claves, filas)
+        if borradas:
+            self._encolar(hoja, ("eliminar_filas", (claves, filas)))
+        return borradas
+
+    def leer_fila(self, hoja, claves, fila):
+        self._hidratar(hoja)
+        return self.local.leer_fila(hoja, claves, fila)
+
+    def reemplazar_si(self, hoja, claves, fila, rev_esperada):
+        # La base local decide; Sheets recibe el resultado ya resuelto
+        self._hidratar(hoja)
+        if not self.local.reemplazar_si(hoja, claves, fila, rev_esperada):
+            return False
+        if rev_esperada is None:
+            self._encolar(hoja, ("agregar_filas", (pd.DataFrame([fila]),)))
+        else:
+            self._encolar(hoja, ("actualizar_filas", (claves, pd.DataFrame([fila]))))
+        return True
+
+    def eliminar_si(self, hoja, claves, fila, rev_esperada):
+        self._hidratar(hoja)
+        if not self.local.eliminar_si(hoja, claves, fila, rev_esperada):
+            return False
+        self._encolar(hoja, ("eliminar_filas", (claves, pd.DataFrame([fila])[list(claves)])))
+        return True
+
+    def traer(self, hoja):
+        """Vuelve a copiar la hoja desde Sheets (salvo que tenga cambios sin subir)."""
+        with self._lock:
+            if self._pendientes.get(hoja):
+                return False
+        self.local.escribir(hoja, self.remoto.leer(hoja))
+        return True
+
+    def pendientes(self):
+        with self._lock:
+            return [hoja for hoja, ops in self._pendientes.items() if ops]
+
+    def _sincronizar(self):
+        from comun.limitador import FONDO, prioridad
+        with prioridad(FONDO):
+            self._bucle_sincronizacion()
+
+    def _bucle_sincronizacion(self):
+        from comun.limitador import es_error_transitorio
+        while True:
+            hoja = self._aviso.get()
+            while True:
+                with self._lock:
+                    cola = self._pendientes.get(hoja)
+                    if not cola:
+                        break
+                    operacion = cola[0]
+                metodo, args = operacion
+                permanente = None
+                for i in range(self.max_reintentos):
+                    try:
+                        getattr(self.remoto, metodo)(hoja, *args)
+                        self.ultimo_error = None
+                        break
+                    except Exception as e:
+                        self.ultimo_error = e
+                        if not es_error_transitorio(e):
+                            permanente = e
+                            break
+                        time.sleep((2 ** i) + random.uniform(0, 1))
+                if permanente is not None:
+                    # No se va a arreglar reintentando: se aparta y sigue el resto de la cola
+                    with self._lock:
+                        self.descartadas.append({"hoja": hoja, "operacion": metodo, "error": repr(permanente),
+                                                 "hora": time.strftime("%Y-%m-%d %H:%M:%S")})
+                elif self.ultimo_error is not None:
+                    # Se reintenta en la próxima vuelta sin perder el orden
+                    self._aviso.put(hoja)
+                    break
+                with self._lock:
+                    # Una escritura completa pudo reemplazar la cola mientras subíamos
+                    cola = self._pendientes.get(hoja)
+                    if cola and cola[0] is operacion:
+                        cola.pop(0)
+
+
+# --- 4. SELECCIÓN ---
+def configuracion_almacenamiento():
+    """Devuelve (tipo de backend, ruta de la base local)."""
+    config = {}
+    try:
+        import streamlit as st
+        config = dict(st.secrets.get("almacenamiento", {}))
+    except Exception:
+        pass
+    tipo = os.environ.get("NATACION_BACKEND") or config.get("backend", "gsheets")
+    ruta = os.environ.get("NATACION_DB") or config.get("ruta", RUTA_DB_DEFECTO)
+    return tipo.lower(), ruta
+
+
+def crear_backend(tipo=None, ruta=None):
+    tipo_conf, ruta_conf = configuracion_almacenamiento()
+    tipo = (tipo or tipo_conf).lower()
+    ruta = ruta or ruta_conf
+
+    if tipo == "sqlite":
+        return BackendSQLite(ruta)
+
+    import streamlit as st
+    from streamlit_gsheets import GSheetsConnection
+    from comun.limitador import BackendLimitado, obtener_limitador
+    remoto = BackendLimitado(BackendSheets(st.connection("gsheets", type=GSheetsConnection)), obtener_limitador())
+    if tipo == "espejo":
+        return BackendEspejo(BackendSQLite(ruta), remoto)
+    if tipo == "gsheets":
+        return remoto
+    raise ValueError(f"Backend de almacenamiento desconocido: {tipo}")
@@ -0,0 +1,113 @@
+"""Categorías Master por edad y categorías de relevo por suma de edades.
+
+Las bandas salen de las hojas Categorias (edad_min, edad_max, nombre_cat) y
+Categorias_Relevos (tipo_reglamento, suma_min, suma_max, descripcion). Cada
+tabla se convierte una sola vez en un IntervalIndex (tabla_derivada) y una
+Serie entera de edades se resuelve con get_indexer: O(n log k), sin recorrer
+las filas de la hoja en cada consulta.
+"""
+import numpy as np
+import pandas as pd
+
+from comun.datos import tabla_derivada
+
+SIN_CATEGORIA = "-"
+
+
+class Bandas:
+    """Intervalos cerrados [minimo, maximo] -> etiqueta, ordenados por minimo."""
+
+    def __init__(self, minimos, maximos, etiquetas):
+        tabla = pd.DataFrame({
+            "minimo": pd.to_numeric(pd.Series(minimos, dtype=object), errors="coerce").to_numpy(dtype="float64"),
+            "maximo": pd.to_numeric(pd.Series(maximos, dtype=object), errors="coerce").to_numpy(dtype="float64"),
+            "etiqueta": pd.Series(etiquetas, dtype=object).to_numpy(),
+        }).dropna().sort_values("minimo", kind="stable")
+        tabla = tabla[tabla["minimo"] <= tabla["maximo"]]
+        self.indice = pd.IntervalIndex.from_arrays(tabla["minimo"], tabla["maximo"], closed="both")
+        self.etiquetas = tabla["etiqueta"].astype(str).to_numpy(dtype=object)
+
+    def __len__(self):
+        return len(self.indice)
+
+    def posiciones(self, valores):
+        """Posición de la banda de cada valor (-1 si no cae en ninguna)."""
+        valores = pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce").to_numpy(dtype="float64")
+        if not len(self.indice):
+            return np.full(len(valores), -1)
+        if not self.indice.is_overlapping:
+            pos = self.indice.get_indexer(valores)
+        else:
+            # Bandas superpuestas en la hoja (no debería pasar): gana la de menor minimo
+            dentro = (valores[:, None] >= self.indice.left.to_numpy()) & (valores[:, None] <= self.indice.right.to_numpy())
+            pos = np.where(dentro.any(axis=1), dentro.argmax(axis=1), -1)
+        pos[np.isnan(valores)] = -1
+        return pos
+
+    def etiquetar(self, valores, vacio=SIN_CATEGORIA):
+        pos = self.posiciones(valores)
+        etiquetas = self.etiquetas[pos.clip(0)] if len(self.etiquetas) else np.full(len(pos), vacio, dtype=object)
+        indice = valores.index if isinstance(valores, pd.Series) else None
+        return pd.Series(np.where(pos >= 0, etiquetas, vacio), index=indice, dtype=object)
+
+    def minimos(self, valores):
+        """Límite inferior de la banda de cada valor (NaN si no cae en ninguna)."""
+        pos = self.posiciones(valores)
+        limites = self.indice.left.to_numpy(dtype="float64")
+        return np.where(pos >= 0, limites[pos.clip(0)] if len(limites) else np.nan, np.nan)
+
+
+# --- BANDAS DESDE LAS HOJAS ---
+@tabla_derivada("categorias")
+def bandas_edad(df_cat):
+    if not {"edad_min", "edad_max", "nombre_cat"} <= set(df_cat.columns):
+        return Bandas([], [], [])
+    return Bandas(df_cat["edad_min"], df_cat["edad_max"], df_cat["nombre_cat"])
+
+
+@tabla_derivada("cat_relevos")
+def bandas_relevos(df_cat):
+    """Un juego de bandas por reglamento (FED, MASTER, ...)."""
+    if not {"tipo_reglamento", "suma_min", "suma_max", "descripcion"} <= set(df_cat.columns):
+        return {}
+    return {str(reg): Bandas(g["suma_min"], g["suma_max"], g["descripcion"])
+            for reg, g in df_cat.groupby("tipo_reglamento", observed=True)}
+
+
+# --- CONSULTAS ---
+def orden_categorias():
+    """Nombres de categoría de la más joven a la más grande."""
+    return list(bandas_edad().etiquetas)
+
+
+def categorias_por_edad(edades, vacio=SIN_CATEGORIA):
+    """Serie de edades -> Serie de nombres de categoría."""
+    return bandas_edad().etiquetar(edades, vacio)
+
+
+def categoria_por_edad(edad, vacio=SIN_CATEGORIA):
+    return categorias_por_edad([edad], vacio).iloc[0]
+
+
+def categorias_relevo(sumas, reglamentos):
+    """Sumas de edades y reglamentos alineados -> DataFrame con 'categoria'
+    (None si no hay banda) y 'suma_min' (NaN si no hay banda)."""
+    sumas = pd.Series(sumas, dtype=object).reset_index(drop=True)
+    reglamentos = pd.Series(reglamentos, dtype=object).astype(str).reset_index(drop=True)
+    resultado = pd.DataFrame({"categoria": pd.Series([None] * len(sumas), dtype=object),
+                              "suma_min": np.full(len(sumas), np.nan)})
+    bandas = bandas_relevos()
+    for reg, filas in reglamentos.groupby(reglamentos).groups.items():
+        if reg in bandas:
+            parte = sumas[filas]
+            resultado.loc[filas, "categoria"] = bandas[reg].etiquetar(parte, None).to_numpy()
+            resultado.loc[filas, "suma_min"] = bandas[reg].minimos(parte)
+    return resultado
+
+
+def categoria_relevo(suma, reglamento):
+    """(descripcion, suma_min) de la categoría de relevo; (None, None) si no hay."""
+    fila = categorias_relevo([suma], [reglamento]).iloc[0]
+    if fila["categoria"] is None:
+        return None, None
+    return fila["categoria"], float(fila["suma_min"])
@@ -0,0 +1,152 @@
+"""Cola de escritura diferida para las marcas de Rutinas_Seguimiento.
+
+Cuando el profe publica una sesión, muchos nadadores la marcan como realizada
+en pocos minutos. En lugar de una escritura por click, las marcas se acumulan
+en una cola única del proceso y se vuelcan juntas cada pocos segundos: una
+llamada para las altas y otra para las bajas, sin importar cuántos clicks hubo.
+
+Mientras tanto las lecturas de la hoja ya ven las marcas pendientes, así que
+cada nadador recibe la confirmación en el momento.
+"""
+import atexit
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from comun.datos import CLAVES_FILA, obtener_almacen, registrar_superposicion
+from comun.backends import normalizar_clave
+from comun.esquemas import aplicar_esquema
+from comun.limitador import FONDO, prioridad
+
+INTERVALO_VOLCADO = 3.0
+ESPERA_MAXIMA = 60.0
+
+
+class ColaSeguimiento:
+    """Altas y bajas pendientes por (id_rutina, codnadador); la última gana."""
+
+    def __init__(self, almacen, intervalo=INTERVALO_VOLCADO):
+        self.almacen = almacen
+        self.intervalo = intervalo
+        self.claves = CLAVES_FILA["seguimiento"]
+        self._altas = {}
+        self._bajas = {}
+        self._en_vuelo = ({}, {})
+        self._lock = threading.Lock()
+        self._volcando = threading.Lock()
+        self.volcados = 0
+        self.ultimo_error = None
+        threading.Thread(target=self._bucle, daemon=True, name="cola-seguimiento").start()
+        atexit.register(self.volcar)
+
+    def _clave(self, id_rutina, codnadador):
+        return (normalizar_clave(id_rutina), normalizar_clave(codnadador))
+
+    def marcar(self, id_rutina, codnadador, fecha_realizada):
+        clave = self._clave(id_rutina, codnadador)
+        with self._lock:
+            # Desmarcar y volver a marcar antes del volcado se anulan entre sí
+            if self._bajas.pop(clave, None) is None:
+                self._altas[clave] = {"id_rutina": id_rutina, "codnadador": int(codnadador), "fecha_realizada": fecha_realizada}
+        # Lo superpuesto cambió: las vistas derivadas de seguimiento se recalculan
+        self.almacen.tocar("seguimiento")
+
+    def desmarcar(self, id_rutina, codnadador):
+        clave = self._clave(id_rutina, codnadador)
+        with self._lock:
+            # Una marca que todavía no salió no necesita viajar a la hoja
+            if self._altas.pop(clave, None) is None:
+                self._bajas[clave] = {"id_rutina": id_rutina, "codnadador": int(codnadador)}
+        self.almacen.tocar("seguimiento")
+
+    def pendientes(self):
+        with self._lock:
+            return len(self._altas) + len(self._bajas) + len(self._en_vuelo[0]) + len(self._en_vuelo[1])
+
+    def superponer(self, df):
+        """La hoja tal como quedará después del próximo volcado."""
+        with self._lock:
+            altas = {**self._en_vuelo[0], **self._altas}
+            bajas = {**self._en_vuelo[1], **self._bajas}
+        if not altas and not bajas:
+            return df
+        if df.empty or any(c not in df.columns for c in self.claves):
+            existentes = []
+        else:
+            existentes = list(zip(*[df[c].map(normalizar_clave) for c in self.claves]))
+        if bajas and existentes:
+            df = df[[k not in bajas for k in existentes]]
+        presentes = set(existentes)
+        nuevas = [fila for clave, fila in altas.items() if clave not in presentes]
+        if nuevas:
+            df = pd.concat([df, aplicar_esquema("seguimiento", pd.DataFrame(nuevas))], ignore_index=True)
+        return df
+
+    def volcar(self):
+        """Envía lo pendiente en una escritura por tipo de operación."""
+        with self._volcando:
+            with self._lock:
+                altas, bajas = self._altas, self._bajas
+                self._altas, self._bajas = {}, {}
+                self._en_vuelo = (altas, bajas)
+            if not altas and not bajas:
+                return True
+            try:
+                if altas:
+                    # No duplicar marcas que otro proceso ya dejó en la hoja
+                    hoja = self.almacen.leer("seguimiento", superponer=False)
+                    filas = pd.DataFrame(list(altas.values()))
+                    if not hoja.empty and all(c in hoja.columns for c in self.claves):
+                        ya = set(zip(*[hoja[c].map(normalizar_clave) for c in self.claves]))
+                        filas = filas[[k not in ya for k in altas]]
+                    if not filas.empty:
+                        self.almacen.agregar_filas("seguimiento", filas)
+                    altas = {}
+                if bajas:
+                    self.almacen.eliminar_filas("seguimiento", self.claves, pd.DataFrame(list(bajas.values())))
+                    bajas = {}
+                self.volcados += 1
+                self.ultimo_error = None
+                return True
+            except Exception as e:
+                self.ultimo_error = e
+                with self._lock:
+                    # Lo que no salió vuelve a la cola, salvo que ya lo hayan revertido
+                    for clave, fila in altas.items():
+                        if self._bajas.pop(clave, None) is None:
+                            self._altas.setdefault(clave, fila)
+                    for clave, fila in bajas.items():
+                        if self._altas.pop(clave, None) is None:
+                            self._bajas.setdefault(clave, fila)
+                return False
+            finally:
+                with self._lock:
+                    self._en_vuelo = ({}, {})
+
+    def _bucle(self):
+        espera = self.intervalo
+        while True:
+            time.sleep(espera)
+            with prioridad(FONDO):
+                ok = self.volcar()
+            if ok:
+                espera = self.intervalo
+            else:
+                espera = min(espera * 2, ESPERA_MAXIMA)
+
+
+@st.cache_resource
+def obtener_cola_seguimiento():
+    cola = ColaSeguimiento(obtener_almacen())
+    registrar_superposicion("seguimiento", cola.superponer)
+    return cola
+
+
+def marcar_realizada(id_rutina, codnadador, fecha_realizada):
+    obtener_cola_seguimiento().marcar(id_rutina, codnadador, fecha_realizada)
+
+
+def desmarcar_realizada(id_rutina, codnadador):
+    obtener_cola_seguimiento().desmarcar(id_rutina, codnadador)
@@ -0,0 +1,110 @@
+"""Equivalencia de tiempos entre pileta corta (25m) y pileta larga (50m).
+
+Tiempos mezcla marcas de las dos piletas y en la corta se nada más rápido
+(más vueltas, más impulso en cada pared). Para comparar marcas entre sí cada
+fila guarda, además de tiempo_cs, tiempo_norm_cs: el equivalente en 50m. Una
+marca de 25m se multiplica por el factor de su estilo y distancia; una de 50m
+o de pileta desconocida queda igual.
+
+Los factores por defecto están abajo y se pueden ajustar en secrets.toml:
+
+    [conversion_piletas]
+    libre = 1.02        # todo Libre
+    pecho_100 = 1.03    # sólo 100m Pecho
+"""
+import pandas as pd
+import streamlit as st
+
+from comun.datos import tabla_derivada
+from comun.pruebas import familia_estilo, metros
+
+SIN_MEDIDA = "-"
+LARGO_CORTA, LARGO_LARGA = 25, 50
+
+# Factor 25m -> 50m por estilo y, donde difiere, por estilo y distancia
+FACTORES_ESTILO = {"libre": 1.020, "espalda": 1.030, "pecho": 1.025, "mariposa": 1.020, "combinado": 1.025}
+FACTORES_PRUEBA = {
+    ("libre", "50"): 1.010, ("espalda", "50"): 1.020, ("pecho", "50"): 1.015, ("mariposa", "50"): 1.010,
+    ("libre", "800"): 1.015, ("libre", "1500"): 1.015,
+}
+FACTOR_DEFECTO = 1.020
+
+
+def factores_configurados():
+    """(por estilo, por prueba) con lo que haya en secrets.toml encima de los
+    valores por defecto."""
+    por_estilo, por_prueba = dict(FACTORES_ESTILO), dict(FACTORES_PRUEBA)
+    try:
+        config = dict(st.secrets.get("conversion_piletas", {}))
+    except Exception:
+        config = {}
+    for clave, valor in config.items():
+        familia, _, distancia = str(clave).lower().partition("_")
+        try:
+            valor = float(valor)
+        except (TypeError, ValueError):
+            continue
+        if distancia:
+            por_prueba[(familia, distancia)] = valor
+        else:
+            por_estilo[familia] = valor
+    return por_estilo, por_prueba
+
+
+def largos(medidas):
+    """Serie de medidas ("25m", "50 mts", "-") -> Serie Int de metros (25, 50 o nulo)."""
+    numeros = pd.to_numeric(pd.Series(medidas, dtype=object).astype("string").str.extract(r"(\d+)")[0], errors="coerce")
+    return numeros.where(numeros.isin([LARGO_CORTA, LARGO_LARGA])).astype("Int64")
+
+
+class ConversionPiletas:
+    """Medida de cada pileta y factor 25m -> 50m de cada (codestilo, coddistancia)."""
+
+    def __init__(self, df_piletas, df_estilos, df_distancias):
+        self.medidas = {}
+        if {"codpileta", "medida"} <= set(df_piletas.columns):
+            self.medidas = dict(zip(df_piletas["codpileta"].astype(str), df_piletas["medida"].astype(str).str.strip()))
+        # codestilo -> estilo canónico y coddistancia -> metros ("50", "4x50")
+        self.familias, self.metros = {}, {}
+        if {"codestilo", "descripcion"} <= set(df_estilos.columns):
+            self.familias = dict(zip(df_estilos["codestilo"].astype(str), df_estilos["descripcion"].map(familia_estilo)))
+        if {"coddistancia", "descripcion"} <= set(df_distancias.columns):
+            self.metros = dict(zip(df_distancias["coddistancia"].astype(str), df_distancias["descripcion"].map(metros)))
+        por_estilo, por_prueba = factores_configurados()
+        self.factores = {
+            f"{est}|{dist}": por_prueba.get((familia, distancia), por_estilo.get(familia, FACTOR_DEFECTO))
+            for est, familia in self.familias.items() for dist, distancia in self.metros.items()
+        }
+
+    def normalizar(self, df):
+        """Filas de Tiempos -> mismas filas con medida, largo y tiempo_norm_cs."""
+        if "codpileta" in df.columns:
+            medida = df["codpileta"].astype(str).map(self.medidas).fillna(SIN_MEDIDA)
+        else:
+            medida = pd.Series(SIN_MEDIDA, index=df.index)
+        largo = largos(medida).set_axis(df.index)
+        if df.empty or "tiempo_cs" not in df.columns:
+            return df.assign(medida=medida, largo=largo, tiempo_norm_cs=pd.Series(pd.NA, index=df.index, dtype="Int32"))
+        clave = df["codestilo"].astype(str) + "|" + df["coddistancia"].astype(str)
+        factor = clave.map(self.factores).astype("float64").fillna(FACTOR_DEFECTO)
+        factor = factor.where((largo == LARGO_CORTA).fillna(False), 1.0)
+        norm = (df["tiempo_cs"].astype("Float64") * factor).round().astype("Int32")
+        return df.assign(medida=medida, largo=largo, tiempo_norm_cs=norm)
+
+
+@tabla_derivada("piletas", "estilos", "distancias")
+def conversion_piletas(df_piletas, df_estilos, df_distancias):
+    return ConversionPiletas(df_piletas, df_estilos, df_distancias)
+
+
+def _extender_tiempos(tiempos, clave, filas):
+    # Una pileta, estilo o distancia nueva puede cambiar factores: se reconstruye
+    if clave != "tiempos":
+        return None
+    return pd.concat([tiempos, conversion_piletas().normalizar(filas)], ignore_index=True)
+
+
+@tabla_derivada("tiempos", "piletas", "estilos", "distancias", extender=_extender_tiempos)
+def tiempos_normalizados(df_tiempos, df_piletas, df_estilos, df_distancias):
+    """Hoja Tiempos con tiempo_cs (crudo) y tiempo_norm_cs (equivalente 50m)."""
+    return conversion_piletas().normalizar(df_tiempos)
@@ -0,0 +1,413 @@
+"""Snapshot compartido de las hojas del libro de Google Sheets.
+
+Todas las páginas leen de un único almacén por proceso: cada hoja se descarga
+una sola vez por refresco (según su vigencia) y el mismo DataFrame se comparte
+entre todas las sesiones, en lugar de que cada página guarde su propia copia.
+
+Cada hoja se tipa una sola vez al entrar al snapshot según su esquema
+declarado (comun.esquemas); las páginas reciben columnas listas para usar.
+
+Las escrituras son write-through: la hoja completa escrita, o el delta de
+filas, se instala directamente en el snapshot. El rerun que sigue a un
+guardado no vuelve a descargar nada; la vigencia de cada hoja sólo cubre
+los cambios hechos a mano en el libro.
+"""
+import contextlib
+import functools
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+
+from comun.backends import COLUMNA_VERSION, crear_backend, normalizar_clave
+from comun.esquemas import aplicar_esquema, unificar_codigos
+
+# Con copy-on-write, cualquier frame derivado de uno compartido (filtros,
+# merges, columnas nuevas sobre un .copy(deep=False)) nunca escribe sobre el
+# snapshot, y la copia liviana no duplica los datos. Desde pandas 3 es el
+# comportamiento por defecto (y la opción está deprecada): sólo se activa antes.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# --- CATÁLOGO DE HOJAS ---
+# clave interna -> (nombre de la hoja en el libro, vigencia en segundos)
+HOJAS = {
+    "nadadores": ("Nadadores", 3600),
+    "users": ("User", 3600),
+    "tiempos": ("Tiempos", 900),
+    "relevos": ("Relevos", 900),
+    "categorias": ("Categorias", 3600),
+    "cat_relevos": ("Categorias_Relevos", 3600),
+    "estilos": ("Estilos", 3600),
+    "distancias": ("Distancias", 3600),
+    "piletas": ("Piletas", 3600),
+    "entrenamientos": ("Entrenamientos", 300),
+    "competencias": ("Competencias", 300),
+    "inscripciones": ("Inscripciones", 300),
+    "rutinas": ("Rutinas", 300),
+    "seguimiento": ("Rutinas_Seguimiento", 300),
+    "tiempos_base": ("Tiempos_Base", 3600),
+}
+
+# Hojas que el libro puede no tener: si no se pueden leer quedan vacías
+HOJAS_OPCIONALES = {"tiempos_base"}
+
+
+def _coinciden(df, claves, filas):
+    """Máscara de las filas de df cuya clave aparece en filas."""
+    if df.empty or any(c not in df.columns for c in claves):
+        return pd.Series(False, index=df.index)
+    buscadas = set(zip(*[filas[c].map(normalizar_clave) for c in claves]))
+    propias = zip(*[df[c].map(normalizar_clave) for c in claves])
+    return pd.Series([k in buscadas for k in propias], index=df.index)
+
+
+class ConflictoVersion(Exception):
+    """La fila cambió en la hoja en cada uno de los reintentos."""
+
+
+def _nueva_revision():
+    # Prefijo para que nunca se interprete como número al normalizar
+    return "r" + uuid.uuid4().hex[:12]
+
+
+def _actualizar_df(df, claves, filas):
+    df = df.copy()
+    for fila in filas.to_dict("records"):
+        mascara = _coinciden(df, claves, pd.DataFrame([fila]))
+        for col, valor in fila.items():
+            if col not in claves:
+                if col not in df.columns:
+                    df[col] = None
+                try:
+                    df.loc[mascara, col] = valor
+                except (TypeError, ValueError):
+                    df[col] = df[col].astype(object)
+                    df.loc[mascara, col] = valor
+    return df
+
+
+# --- GRAFO DE TABLAS DERIVADAS ---
+# nombre de la tabla derivada -> hojas de las que depende. Lo completa el
+# decorador tabla_derivada; invalidar o escribir una hoja descarta sólo las
+# derivadas que cuelgan de ella (seguimiento no toca las vistas de Tiempos).
+GRAFO_DERIVADAS = {}
+
+# nombre de la tabla derivada -> extender(valor, clave, filas) -> valor nuevo.
+# Cuando a una hoja sólo se le agregan filas, la derivada se actualiza con el
+# delta en lugar de reconstruirse (None = no se puede, reconstruir).
+EXTENSIONES_DERIVADAS = {}
+
+
+def dependientes(clave):
+    """Tablas derivadas que hay que recalcular si cambia la hoja `clave`."""
+    return [nombre for nombre, fuentes in GRAFO_DERIVADAS.items() if clave in fuentes]
+
+
+# Columnas que identifican una fila en las hojas que se editan por fila
+CLAVES_FILA = {
+    "seguimiento": ["id_rutina", "codnadador"],
+    "inscripciones": ["id_competencia", "codnadador"],
+    "competencias": ["id_competencia"],
+    "rutinas": ["id_rutina"],
+}
+
+
+class AlmacenHojas:
+    """Última versión descargada de cada hoja, compartida por todo el proceso.
+
+    Los frames que devuelve son de solo lectura: las páginas filtran, cruzan o
+    hacen .copy(deep=False) antes de agregar columnas, nunca modifican el
+    original. Las columnas de códigos de todas las hojas comparten categorías
+    (self._vocabulario), así los merges entre hojas cruzan enteros.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._frames = {}
+        self._leidas = {}
+        self._versiones = {clave: 0 for clave in HOJAS}
+        self._derivadas = {}
+        self._locks = {clave: threading.Lock() for clave in HOJAS}
+        self._vocabulario = {}
+        self._lock_vocabulario = threading.Lock()
+        # Cambios aceptados pero todavía no escritos (p. ej. la cola de seguimiento)
+        self.superposiciones = {}
+
+    def _vigente(self, clave):
+        leida = self._leidas.get(clave)
+        return leida is not None and (time.monotonic() - leida) < HOJAS[clave][1]
+
+    def _tipar(self, clave, df):
+        """Esquema de la hoja más las categorías compartidas de los códigos."""
+        df = aplicar_esquema(clave, df)
+        with self._lock_vocabulario:
+            df, crecidas = unificar_codigos(df, self._vocabulario)
+            # Códigos nuevos: las hojas en memoria pasan a las categorías
+            # ampliadas (mismos valores, así que no cambia su versión)
+            for otra, frame in list(self._frames.items()):
+                if any(c in frame.columns for c in crecidas):
+                    self._frames[otra] = unificar_codigos(frame, self._vocabulario)[0]
+        return df
+
+    def _instalar(self, clave, df):
+        self._frames[clave] = self._tipar(clave, df)
+        self._leidas[clave] = time.monotonic()
+        self.tocar(clave)
+
+    def _firma(self, nombre):
+        return tuple(self._versiones[clave] for clave in GRAFO_DERIVADAS[nombre])
+
+    def tocar(self, clave, agregadas=None):
+        """La hoja cambió (o cambió lo que se le superpone): nueva versión y
+        fuera las derivadas que dependen de ella. Si el cambio fue sólo
+        agregar `agregadas`, las derivadas que saben extenderse se actualizan
+        con ese delta."""
+        previas = {nombre: self._firma(nombre) for nombre in dependientes(clave)}
+        self._versiones[clave] += 1
+        for nombre, firma in previas.items():
+            cacheada = self._derivadas.pop(nombre, None)
+            extender = EXTENSIONES_DERIVADAS.get(nombre)
+            if agregadas is None or extender is None or cacheada is None or cacheada[0] != firma:
+                continue
+            try:
+                valor = extender(cacheada[1], clave, agregadas)
+            except Exception:
+                valor = None
+            if valor is not None:
+                self._derivadas[nombre] = (self._firma(nombre), valor)
+
+    def leer(self, clave, fresco=False, superponer=True):
+        """Devuelve la hoja; la descarga sólo si venció o si se pide fresca."""
+        df = self._leer(clave, fresco)
+        if superponer and clave in self.superposiciones:
+            return self.superposiciones[clave](df)
+        return df
+
+    def _leer(self, clave, fresco):
+        if not fresco and self._vigente(clave):
+            return self._frames[clave]
+        with self._locks[clave]:
+            # Otra sesión pudo descargarla mientras esperábamos el lock
+            if not fresco and self._vigente(clave):
+                return self._frames[clave]
+            try:
+                df = self.backend.leer(HOJAS[clave][0])
+            except Exception:
+                if clave not in HOJAS_OPCIONALES:
+                    raise
+                df = pd.DataFrame()
+            self._instalar(clave, df)
+            return self._frames[clave]
+
+    def leer_varias(self, claves):
+        """Descarga juntas las hojas vencidas (un batchGet, o en paralelo si el
+        backend no sabe hacerlo) y devuelve {clave: DataFrame}."""
+        # Las opcionales van aparte: si faltan en el libro no hacen fallar el lote
+        vencidas = sorted(c for c in set(claves) if not self._vigente(c) and c not in HOJAS_OPCIONALES)
+        if len(vencidas) > 1:
+            with contextlib.ExitStack() as pila:
+                # Orden fijo al tomar varios locks: nunca se cruzan dos lotes
+                for clave in vencidas:
+                    pila.enter_context(self._locks[clave])
+                vencidas = [c for c in vencidas if not self._vigente(c)]
+                hojas = [HOJAS[c][0] for c in vencidas]
+                try:
+                    if hasattr(self.backend, "leer_varias"):
+                        frames = self.backend.leer_varias(hojas)
+                    else:
+                        with ThreadPoolExecutor(max_workers=len(hojas)) as pool:
+                            frames = dict(zip(hojas, pool.map(self.backend.leer, hojas)))
+                except Exception:
+                    # Si una hoja falla, el lote entero falla: se sigue de a una
+                    frames = {}
+                for clave in vencidas:
+                    if HOJAS[clave][0] in frames:
+                        self._instalar(clave, frames[HOJAS[clave][0]])
+        return {clave: self.leer(clave) for clave in claves}
+
+    def escribir(self, clave, df):
+        """Reemplaza la hoja en el backend y deja la nueva versión en el snapshot."""
+        with self._locks[clave]:
+            self.backend.escribir(HOJAS[clave][0], df)
+            # Copia perezosa (copy-on-write): el llamador puede seguir usando su frame
+            self._instalar(clave, df.copy())
+
+    def _aplicar(self, clave, cambio, agregadas=None):
+        # Si la hoja ya está en memoria se le aplica el mismo delta; si no, la
+        # próxima lectura la trae completa. La vigencia original no se extiende.
+        if clave in self._frames:
+            self._frames[clave] = self._tipar(clave, cambio(self._frames[clave]))
+            self.tocar(clave, agregadas)
+
+    def agregar_filas(self, clave, filas):
+        with self._locks[clave]:
+            self.backend.agregar_filas(HOJAS[clave][0], filas)
+            tipadas = self._tipar(clave, filas)
+            self._aplicar(clave, lambda df: pd.concat([df, tipadas], ignore_index=True), agregadas=tipadas)
+
+    def actualizar_filas(self, clave, claves, filas):
+        with self._locks[clave]:
+            coincidencias = self.backend.actualizar_filas(HOJAS[clave][0], claves, filas)
+            tipadas = self._tipar(clave, filas)
+            self._aplicar(clave, lambda df: _actualizar_df(df, claves, tipadas))
+            return coincidencias
+
+    def eliminar_filas(self, clave, claves, filas):
+        with self._locks[clave]:
+            borradas = self.backend.eliminar_filas(HOJAS[clave][0], claves, filas)
+            self._aplicar(clave, lambda df: df[~_coinciden(df, claves, filas)])
+            return borradas
+
+    def modificar_fila(self, clave, valores_clave, cambio, max_intentos=5):
+        """Leer-modificar-escribir una fila con control de versión.
+
+        cambio(fila_actual o None) devuelve la fila nueva (dict) o None para
+        borrarla. Si otro escritor tocó la fila entre la lectura y la escritura,
+        se vuelve a leer y se reaplica el cambio sobre su versión.
+        Devuelve (fila anterior, fila nueva).
+        """
+        hoja, claves = HOJAS[clave][0], CLAVES_FILA[clave]
+        for intento in range(max_intentos):
+            with self._locks[clave]:
+                actual = self.backend.leer_fila(hoja, claves, valores_clave)
+                rev = normalizar_clave(actual.get(COLUMNA_VERSION)) if actual else None
+                nueva = cambio(dict(actual) if actual else None)
+                if nueva is None:
+                    if actual is None:
+                        return None, None
+                    if self.backend.eliminar_si(hoja, claves, valores_clave, rev):
+                        filas = pd.DataFrame([valores_clave])
+                        self._aplicar(clave, lambda df: df[~_coinciden(df, claves, filas)])
+                        return actual, None
+                else:
+                    nueva = {**nueva, **valores_clave, COLUMNA_VERSION: _nueva_revision()}
+                    if self.backend.reemplazar_si(hoja, claves, nueva, rev):
+                        filas = self._tipar(clave, pd.DataFrame([nueva]))
+                        if actual is None:
+                            self._aplicar(clave, lambda df: pd.concat([df, filas], ignore_index=True))
+                        else:
+                            self._aplicar(clave, lambda df: _actualizar_df(df, claves, filas))
+                        return actual, nueva
+            time.sleep(random.uniform(0.05, 0.25) * (intento + 1))
+        raise ConflictoVersion(f"{hoja}: la fila {valores_clave} cambió en cada intento")
+
+    def invalidar(self, *claves):
+        """Marca hojas como vencidas (todas si no se indica ninguna) junto con
+        sus tablas derivadas; el resto del snapshot queda intacto."""
+        for clave in claves or HOJAS:
+            self._leidas.pop(clave, None)
+            for nombre in dependientes(clave):
+                self._derivadas.pop(nombre, None)
+
+    def derivada(self, nombre, claves, construir):
+        """Calcula una tabla derivada una vez por versión de sus hojas fuente."""
+        # La firma se toma antes de leer: si una hoja cambia en el medio, lo
+        # peor que pasa es recalcular una vez de más, nunca servir datos viejos
+        firma = tuple(self._versiones[clave] for clave in claves)
+        fuentes = [self.leer(clave) for clave in claves]
+        cacheada = self._derivadas.get(nombre)
+        if cacheada is not None and cacheada[0] == firma:
+            return cacheada[1]
+        valor = construir(*fuentes)
+        self._derivadas[nombre] = (firma, valor)
+        return valor
+
+
+@st.cache_resource
+def obtener_almacen():
+    return AlmacenHojas(crear_backend())
+
+
+def leer_hoja(clave, fresco=False):
+    return obtener_almacen().leer(clave, fresco=fresco)
+
+
+def registrar_superposicion(clave, funcion):
+    """funcion(df) -> df se aplica a cada lectura de la hoja `clave`."""
+    obtener_almacen().superposiciones[clave] = funcion
+
+
+def cargar_hojas(*claves):
+    """Devuelve {clave: DataFrame}, o None si alguna hoja no se pudo leer.
+    Las hojas vencidas se descargan juntas en un solo viaje."""
+    try:
+        return obtener_almacen().leer_varias(claves)
+    except Exception:
+        return None
+
+
+def precargar_hojas(*claves):
+    """Calienta el snapshot con un solo viaje antes de leer hoja por hoja.
+    Los errores se ignoran: cada lectura posterior maneja los suyos."""
+    try:
+        obtener_almacen().leer_varias(claves)
+    except Exception:
+        pass
+
+
+def escribir_hoja(clave, df):
+    obtener_almacen().escribir(clave, df)
+
+
+def agregar_filas(clave, filas):
+    """Agrega filas al final de la hoja sin reescribirla."""
+    obtener_almacen().agregar_filas(clave, filas)
+
+
+def actualizar_filas(clave, claves, filas):
+    """Pisa las columnas de `filas` en las filas que coinciden en `claves`.
+    Devuelve cuántas filas coincidieron (0 si no existía ninguna)."""
+    return obtener_almacen().actualizar_filas(clave, claves, filas)
+
+
+def eliminar_filas(clave, claves, filas):
+    """Borra las filas cuyas columnas `claves` coinciden con alguna de `filas`."""
+    return obtener_almacen().eliminar_filas(clave, claves, filas)
+
+
+def modificar_fila(clave, valores_clave, cambio):
+    """Escritura versionada de una fila (ver AlmacenHojas.modificar_fila)."""
+    return obtener_almacen().modificar_fila(clave, valores_clave, cambio)
+
+
+def invalidar_hojas(*claves):
+    obtener_almacen().invalidar(*claves)
+
+
+def recargar_desde_origen(*claves):
+    """Con el backend espejo, vuelve a copiar las hojas desde Google Sheets.
+    Con los demás backends equivale a invalidar_hojas."""
+    almacen = obtener_almacen()
+    if hasattr(almacen.backend, "traer"):
+        for clave in claves or HOJAS:
+            try:
+                almacen.backend.traer(HOJAS[clave][0])
+            except Exception:
+                if clave not in HOJAS_OPCIONALES:
+                    raise
+    almacen.invalidar(*claves)
+
+
+def tabla_derivada(*claves, extender=None):
+    """Decorador: la función recibe las hojas indicadas y su resultado se
+    comparte entre sesiones hasta que alguna de esas hojas cambie. Declara
+    además la dependencia en GRAFO_DERIVADAS.
+
+    extender(valor, clave, filas), si se indica, actualiza el resultado
+    cuando a una de las hojas sólo se le agregaron filas."""
+    def decorador(construir):
+        nombre = f"{construir.__code__.co_filename}:{construir.__qualname__}"
+        GRAFO_DERIVADAS[nombre] = claves
+        if extender is not None:
+            EXTENSIONES_DERIVADAS[nombre] = extender
+
+        @functools.wraps(construir)
+        def envoltura():
+            return obtener_almacen().derivada(nombre, claves, construir)
+        return envoltura
+    return decorador
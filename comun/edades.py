@@ -0,0 +1,105 @@
+"""Edad Master y categoría de cada nadador, por columnas.
+
+Reglamento Master: la edad que cuenta es la que el nadador cumple al 31 de
+diciembre del año de la competencia, o sea año de la competencia menos año de
+nacimiento. Por eso alcanza con el año: la tabla de edades y categorías de un
+año se arma una vez (todo el padrón junto) y se reutiliza hasta que cambien
+Nadadores o Categorias; al cambiar el año se arma la del año nuevo.
+
+Las postas se resuelven igual: la suma de edades de cada posta de Relevos,
+al año de la posta, y su categoría, en una sola pasada.
+"""
+from datetime import date
+
+import pandas as pd
+
+from comun.categorias import SIN_CATEGORIA, categorias_por_edad, categorias_relevo
+from comun.datos import tabla_derivada
+from comun.relevos import NADADORES_POSTA
+
+
+def edades_master(anios, anios_nac):
+    """Año de la competencia y año de nacimiento (alineados) -> edad Master
+    (Int64, nula si falta alguno de los dos)."""
+    anios = pd.to_numeric(pd.Series(anios), errors="coerce").astype("Int64")
+    anios_nac = pd.to_numeric(pd.Series(anios_nac), errors="coerce").astype("Int64")
+    anios_nac = anios_nac.mask(anios_nac.fillna(0) <= 0)
+    return pd.Series(anios.array - anios_nac.array, index=anios.index)
+
+
+def _anio(referencia):
+    if referencia is None or pd.isna(referencia):
+        return date.today().year
+    return referencia.year if hasattr(referencia, "year") else int(referencia)
+
+
+class PadronEdades:
+    """Año de nacimiento por codnadador; edades y categorías por año, cacheadas."""
+
+    def __init__(self, df_nadadores):
+        if df_nadadores.empty or not {"codnadador", "fechanac"} <= set(df_nadadores.columns):
+            self.anio_nac = pd.Series(dtype="Int64")
+        else:
+            df = df_nadadores.drop_duplicates("codnadador")
+            self.anio_nac = pd.Series(df["fechanac"].dt.year.astype("Int64").to_numpy(),
+                                      index=pd.Index(df["codnadador"].astype("int64"), name="codnadador"))
+        self._por_anio = {}
+
+    def al_anio(self, referencia=None):
+        """DataFrame por codnadador con 'edad' y 'categoria' al 31/12 del año
+        de referencia (un int, una fecha, o None para el año actual)."""
+        anio = _anio(referencia)
+        if anio not in self._por_anio:
+            edad = pd.Series(edades_master([anio] * len(self.anio_nac), self.anio_nac).array, index=self.anio_nac.index)
+            self._por_anio[anio] = pd.DataFrame({"edad": edad, "categoria": categorias_por_edad(edad)})
+        return self._por_anio[anio]
+
+    def edades(self, codnadadores, referencia=None, vacio=pd.NA):
+        """Serie de códigos -> Serie de edades al año de referencia."""
+        codnadadores = pd.Series(codnadadores)
+        return codnadadores.map(self.al_anio(referencia)["edad"]).astype("Int64").fillna(vacio)
+
+    def categorias(self, codnadadores, referencia=None, vacio=SIN_CATEGORIA):
+        """Serie de códigos -> Serie de categorías al año de referencia."""
+        codnadadores = pd.Series(codnadadores)
+        return codnadadores.map(self.al_anio(referencia)["categoria"]).fillna(vacio).astype(object)
+
+    def categorias_en_fechas(self, codnadadores, fechas, vacio=SIN_CATEGORIA):
+        """Códigos y fechas alineados (p. ej. cada carrera) -> categoría de
+        cada uno al año de su fecha."""
+        codnadadores = pd.Series(codnadadores)
+        anios = pd.Series(pd.to_datetime(pd.Series(fechas).to_numpy(), errors="coerce").year, index=codnadadores.index)
+        edades = edades_master(anios, codnadadores.map(self.anio_nac))
+        return categorias_por_edad(edades, vacio)
+
+    def edad(self, codnadador, referencia=None):
+        """Edad de un nadador (int), o None si no hay fecha de nacimiento."""
+        edad = self.al_anio(referencia)["edad"].get(codnadador)
+        return None if edad is None or pd.isna(edad) else int(edad)
+
+    def categoria(self, codnadador, referencia=None, vacio=SIN_CATEGORIA):
+        return self.al_anio(referencia)["categoria"].get(codnadador, vacio)
+
+
+@tabla_derivada("nadadores", "categorias")
+def padron_edades(df_nadadores, df_cat):
+    return PadronEdades(df_nadadores)
+
+
+# --- POSTAS ---
+@tabla_derivada("relevos", "nadadores", "cat_relevos")
+def edades_relevos(df_relevos, df_nadadores, df_cat):
+    """Por id_relevo: suma de edades de los cuatro (al año de la posta; los
+    nadadores sin fecha de nacimiento no suman) y su categoría ("Suma N" si
+    la suma no cae en ninguna banda)."""
+    if df_relevos.empty or not {"id_relevo", "fecha"} <= set(df_relevos.columns):
+        return pd.DataFrame({"suma_edades": pd.Series(dtype="int64"), "categoria": pd.Series(dtype=object)})
+    anio_nac = padron_edades().anio_nac
+    anio = df_relevos["fecha"].dt.year
+    suma = sum(edades_master(anio, df_relevos[col].map(anio_nac)).fillna(0) for col in NADADORES_POSTA if col in df_relevos.columns)
+    suma = pd.Series(suma, index=df_relevos.index).astype("int64")
+    reglamento = df_relevos["tipo_reglamento"].astype(object) if "tipo_reglamento" in df_relevos.columns else ["FED"] * len(suma)
+    cats = categorias_relevo(suma, reglamento)["categoria"].to_numpy()
+    categoria = pd.Series(cats, index=suma.index).where(pd.notna(cats), "Suma " + suma.astype(str))
+    resultado = pd.DataFrame({"id_relevo": df_relevos["id_relevo"], "suma_edades": suma, "categoria": categoria})
+    return resultado.drop_duplicates("id_relevo").set_index("id_relevo")
@@ -0,0 +1,160 @@
+"""Esquema declarado de cada hoja del libro.
+
+Se aplica una sola vez, cuando la hoja entra al snapshot (y a cada delta de
+filas), así las páginas reciben columnas ya tipadas: IDs enteros, códigos
+categóricos, fechas datetime y tiempos en centésimas. Ninguna página necesita
+volver a convertir en cada rerun.
+
+Los tipos son compactos porque el snapshot es uno solo para todas las
+sesiones: enteros de 32 bits, texto en strings de Arrow (no objetos de
+Python) y códigos categóricos. Además, cada columna de códigos comparte las
+mismas categorías en todas las hojas (ver unificar_codigos), así un merge
+entre Tiempos y Estilos por codestilo cruza los códigos enteros.
+"""
+import pandas as pd
+
+from comun.tiempos import a_centesimas
+
+# --- TIPOS DE COLUMNA ---
+ENTERO = "entero"    # IDs y posiciones: int32, sin dato -> 0
+NUMERO = "numero"    # límites de edad / suma: float, sin dato -> NaN
+CODIGO = "codigo"    # códigos cortos (D1, E2, M/F/X): texto sin espacios, categórico
+FECHA = "fecha"      # datetime64; ilegible -> NaT
+SOCIO = "socio"      # nro de socio / DNI como texto limpio: 12345.0 -> "12345"
+TEXTO = "texto"      # nombres y descripciones: string de Arrow, faltante -> NaN
+TIEMPO = "tiempo"    # se conserva el texto y se agrega <columna>_cs en centésimas
+
+SUFIJO_CENTESIMAS = "_cs"
+
+# String de Arrow con NaN como faltante. En pandas 3 es el "str" por defecto; en
+# 2.2 "str" sigue siendo object y convierte None/NaN en los textos "None"/"nan".
+if int(pd.__version__.split(".")[0]) >= 3:
+    TIPO_TEXTO = "str"
+else:
+    TIPO_TEXTO = "string[pyarrow_numpy]"
+
+ESQUEMAS = {
+    "nadadores": {"codnadador": ENTERO, "apellido": TEXTO, "nombre": TEXTO, "nrosocio": SOCIO,
+                  "dni": SOCIO, "fechanac": FECHA, "codgenero": CODIGO},
+    "users": {"nrosocio": SOCIO},
+    "tiempos": {"id_registro": ENTERO, "codnadador": ENTERO, "codestilo": CODIGO, "coddistancia": CODIGO,
+                "codpileta": CODIGO, "fecha": FECHA, "posicion": ENTERO, "tiempo": TIEMPO},
+    "relevos": {"id_relevo": ENTERO, "codestilo": CODIGO, "coddistancia": CODIGO, "codpileta": CODIGO,
+                "codgenero": CODIGO, "tipo_reglamento": CODIGO, "fecha": FECHA,
+                "posicion": ENTERO, "tiempo_final": TIEMPO,
+                **{f"nadador_{i}": ENTERO for i in range(1, 5)},
+                **{f"tiempo_{i}": TIEMPO for i in range(1, 5)}},
+    "categorias": {"edad_min": NUMERO, "edad_max": NUMERO},
+    "cat_relevos": {"tipo_reglamento": CODIGO, "suma_min": NUMERO, "suma_max": NUMERO},
+    "estilos": {"codestilo": CODIGO, "descripcion": TEXTO},
+    "distancias": {"coddistancia": CODIGO, "descripcion": TEXTO},
+    "piletas": {"codpileta": CODIGO, "club": TEXTO, "medida": TEXTO, "ubicacion": TEXTO},
+    "entrenamientos": {"id_entrenamiento": ENTERO, "codnadador": ENTERO, "fecha": FECHA,
+                       "codestilo": CODIGO, "coddistancia": CODIGO,
+                       "coddistancia_parcial": CODIGO, "tiempo_final": TIEMPO,
+                       **{f"parcial_{i}": TIEMPO for i in range(1, 5)}},
+    "competencias": {"nombre_evento": TEXTO, "fecha_evento": FECHA, "fecha_limite": FECHA,
+                     "cod_pileta": CODIGO},
+    "inscripciones": {"codnadador": ENTERO, "pruebas": TEXTO},
+    "rutinas": {"anio_rutina": ENTERO, "mes_rutina": ENTERO, "nro_sesion": ENTERO},
+    "seguimiento": {"codnadador": ENTERO, "fecha_realizada": FECHA},
+    "tiempos_base": {"codgenero": CODIGO, "tiempo_base": TIEMPO},
+}
+
+
+# --- CONVERSIONES ---
+def _entero(serie):
+    if serie.dtype == "int32":
+        return serie
+    return pd.to_numeric(serie, errors="coerce").fillna(0).astype("int32")
+
+
+def _numero(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie
+    return pd.to_numeric(serie, errors="coerce")
+
+
+def _codigo(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    # Texto con NaN como faltante (no pd.NA): las comparaciones siguen dando bool
+    texto = serie.astype(TIPO_TEXTO).str.strip().replace("", float("nan"))
+    return texto.astype("category")
+
+
+def _texto(serie):
+    if serie.dtype == TIPO_TEXTO:
+        return serie
+    return serie.astype(TIPO_TEXTO)
+
+
+def _fecha(serie):
+    if pd.api.types.is_datetime64_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, errors="coerce", format="mixed")
+
+
+def _socio(serie):
+    if isinstance(serie.dtype, pd.StringDtype) and not serie.isna().any():
+        return serie
+    texto = serie.astype("string").fillna("").str.split(".").str[0].str.strip()
+    return texto.astype(str)
+
+
+CONVERSIONES = {ENTERO: _entero, NUMERO: _numero, CODIGO: _codigo, TEXTO: _texto, FECHA: _fecha, SOCIO: _socio}
+
+
+def aplicar_esquema(clave, df):
+    """Devuelve df con encabezados normalizados y columnas tipadas según
+    ESQUEMAS[clave]. Las columnas que ya tienen el tipo correcto no se tocan,
+    así que reaplicarlo después de un delta sólo convierte lo que cambió."""
+    esquema = ESQUEMAS.get(clave)
+    if esquema is None or df is None:
+        return df
+    columnas = df.columns.astype(str).str.strip().str.lower()
+    if not columnas.equals(pd.Index(df.columns)):
+        df = df.set_axis(columnas, axis=1)
+    cambios = {}
+    for columna, tipo in esquema.items():
+        if columna not in df.columns:
+            continue
+        serie = df[columna]
+        if tipo == TIEMPO:
+            destino = columna + SUFIJO_CENTESIMAS
+            if destino not in df.columns or df[destino].dtype != "Int32":
+                cambios[destino] = a_centesimas(serie).set_axis(df.index)
+            tipo = TEXTO
+        convertida = CONVERSIONES[tipo](serie)
+        if convertida is not serie:
+            cambios[columna] = convertida
+    return df.assign(**cambios) if cambios else df
+
+
+def unificar_codigos(df, vocabulario):
+    """Lleva las columnas categóricas de df a las categorías compartidas de
+    vocabulario ({columna: Index ordenado}), que se amplía con los códigos
+    nuevos. Devuelve df y las columnas cuyo vocabulario creció."""
+    cambios, crecidas = {}, []
+    for columna in df.columns:
+        serie = df[columna]
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        previas = vocabulario.get(columna, pd.Index([], dtype=TIPO_TEXTO))
+        categorias = previas.union(serie.cat.categories.astype(TIPO_TEXTO)).sort_values()
+        if not categorias.equals(previas):
+            vocabulario[columna] = categorias
+            crecidas.append(columna)
+        if not serie.cat.categories.equals(categorias):
+            cambios[columna] = serie.cat.set_categories(categorias)
+    return (df.assign(**cambios) if cambios else df), crecidas
+
+
+def texto_fecha(valor, formato="%Y-%m-%d"):
+    """Fecha del snapshot lista para mostrar; "-" si falta."""
+    if valor is None or pd.isna(valor):
+        return "-"
+    try:
+        return pd.Timestamp(valor).strftime(formato)
+    except (TypeError, ValueError):
+        return str(valor)
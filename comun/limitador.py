@@ -0,0 +1,176 @@
+"""Limitador de llamadas a la API de Google Sheets, único para todo el proceso.
+
+Un token bucket compartido por todas las sesiones reparte la cuota entre tres
+colas con prioridad: primero las lecturas interactivas, después las escrituras
+y al final el trabajo de fondo (sincronización del espejo, cola de
+seguimiento). Cuando Google responde 429 el limitador frena a todos juntos
+durante un enfriamiento creciente, en lugar de que cada sesión haga su propio
+backoff y vuelvan a chocar al mismo tiempo.
+"""
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+import streamlit as st
+
+LECTURA, ESCRITURA, FONDO = 0, 1, 2
+NOMBRES_PRIORIDAD = {LECTURA: "lectura", ESCRITURA: "escritura", FONDO: "fondo"}
+
+CUOTA_POR_MINUTO = 60
+RAFAGA = 20
+ENFRIAMIENTO_INICIAL = 2.0
+ENFRIAMIENTO_MAXIMO = 64.0
+
+# Costo aproximado, en requests a la API, de cada operación del backend Sheets
+COSTOS = {
+    "leer": 1, "leer_varias": 1, "escribir": 2,
+    "agregar_filas": 2, "actualizar_filas": 3, "eliminar_filas": 3,
+    "leer_fila": 3, "reemplazar_si": 4, "eliminar_si": 3,
+}
+OPERACIONES_LECTURA = {"leer", "leer_varias", "leer_fila"}
+
+_prioridad_actual = contextvars.ContextVar("prioridad_sheets", default=None)
+
+
+@contextlib.contextmanager
+def prioridad(nivel):
+    """Las llamadas hechas dentro del bloque usan esa prioridad (p. ej. FONDO)."""
+    token = _prioridad_actual.set(nivel)
+    try:
+        yield
+    finally:
+        _prioridad_actual.reset(token)
+
+
+def es_error_cuota(error):
+    respuesta = getattr(error, "response", None)
+    if getattr(respuesta, "status_code", None) == 429:
+        return True
+    texto = str(error).lower()
+    return "429" in texto or "quota" in texto or "rate limit" in texto
+
+
+def es_error_transitorio(error):
+    """Cuota, red o error 5xx de Google: vale la pena reintentar. Cualquier
+    otro (pestaña inexistente, columna clave faltante...) va a fallar igual."""
+    if es_error_cuota(error) or isinstance(error, (ConnectionError, TimeoutError, OSError)):
+        return True
+    estado = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(estado, int) and estado >= 500
+
+
+class Limitador:
+    def __init__(self, por_minuto=CUOTA_POR_MINUTO, rafaga=RAFAGA):
+        self.ritmo = por_minuto / 60.0
+        self.capacidad = float(rafaga)
+        self._tokens = float(rafaga)
+        self._ultima = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._enfriamiento = ENFRIAMIENTO_INICIAL
+        self._espera = []
+        self._turnos = itertools.count()
+        self._cond = threading.Condition()
+        self.rechazos_429 = 0
+
+    def _recargar(self, ahora):
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultima) * self.ritmo)
+        self._ultima = ahora
+
+    def adquirir(self, costo=1, nivel=ESCRITURA):
+        """Bloquea hasta que haya cuota y no haya nadie más prioritario esperando."""
+        costo = min(float(costo), self.capacidad)
+        with self._cond:
+            turno = (nivel, next(self._turnos))
+            heapq.heappush(self._espera, turno)
+            try:
+                while True:
+                    ahora = time.monotonic()
+                    self._recargar(ahora)
+                    if self._espera[0] == turno and ahora >= self._pausa_hasta and self._tokens >= costo:
+                        self._tokens -= costo
+                        return
+                    falta = max(self._pausa_hasta - ahora, (costo - self._tokens) / self.ritmo, 0.01)
+                    self._cond.wait(timeout=falta)
+            finally:
+                self._espera.remove(turno)
+                heapq.heapify(self._espera)
+                self._cond.notify_all()
+
+    def enfriar(self):
+        """Tras un 429: nadie llama a la API hasta que pase el enfriamiento."""
+        with self._cond:
+            self.rechazos_429 += 1
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + self._enfriamiento)
+            self._enfriamiento = min(self._enfriamiento * 2, ENFRIAMIENTO_MAXIMO)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def _exito(self):
+        with self._cond:
+            self._enfriamiento = ENFRIAMIENTO_INICIAL
+
+    def ejecutar(self, funcion, costo=1, nivel=ESCRITURA, reintentos=6):
+        """Llama a funcion() respetando la cuota; reintenta sólo errores de cuota."""
+        for intento in range(reintentos):
+            self.adquirir(costo, nivel)
+            try:
+                resultado = funcion()
+            except Exception as e:
+                if not es_error_cuota(e) or intento == reintentos - 1:
+                    raise
+                self.enfriar()
+                continue
+            self._exito()
+            return resultado
+
+    def estado(self):
+        """Cuántos esperan en cada cola, cuota disponible y enfriamiento restante."""
+        with self._cond:
+            self._recargar(time.monotonic())
+            en_cola = {nombre: 0 for nombre in NOMBRES_PRIORIDAD.values()}
+            for nivel, _ in self._espera:
+                en_cola[NOMBRES_PRIORIDAD[nivel]] += 1
+            return {
+                "en_cola": en_cola,
+                "total_en_cola": len(self._espera),
+                "tokens": round(self._tokens, 1),
+                "pausa_restante": round(max(0.0, self._pausa_hasta - time.monotonic()), 1),
+                "rechazos_429": self.rechazos_429,
+            }
+
+
+class BackendLimitado:
+    """Envuelve un backend remoto: cada operación pasa por el limitador."""
+
+    def __init__(self, backend, limitador):
+        self.backend = backend
+        self.limitador = limitador
+
+    def __getattr__(self, nombre):
+        metodo = getattr(self.backend, nombre)
+        if nombre not in COSTOS:
+            return metodo
+
+        def limitado(*args, **kwargs):
+            nivel = _prioridad_actual.get()
+            if nivel is None:
+                nivel = LECTURA if nombre in OPERACIONES_LECTURA else ESCRITURA
+            return self.limitador.ejecutar(lambda: metodo(*args, **kwargs), COSTOS[nombre], nivel)
+        return limitado
+
+
+@st.cache_resource
+def obtener_limitador():
+    return Limitador()
+
+
+def intentar(operacion):
+    """(True, resultado) o (False, error). Los reintentos por cuota ya los
+    hace el limitador; acá sólo se convierte el error en respuesta."""
+    try:
+        return True, operacion()
+    except Exception as e:
+        return False, e
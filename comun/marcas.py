@@ -0,0 +1,138 @@
+"""Mejores marcas personales, mantenidas como tabla derivada de Tiempos.
+
+Una fila por (codnadador, codestilo, coddistancia, medida de la pileta) con el
+registro completo de la mejor marca. Se arma una vez por snapshot y, cuando
+desde la carga de datos sólo se agregan filas a Tiempos, se actualiza con el
+delta: se comparan las filas nuevas contra las marcas de sus mismas claves,
+sin volver a ordenar la hoja entera. Las páginas consultan por clave.
+
+Cada marca trae tiempo_cs (crudo), tiempo_norm_cs (equivalente en 50m, ver
+comun.conversion) y puntos (comun.puntos). Dentro de una misma clave los
+tiempos ordenan igual; entre piletas, normalizado=True compara las marcas de
+25m y 50m en igualdad.
+"""
+import pandas as pd
+
+from comun.conversion import conversion_piletas
+from comun.datos import tabla_derivada
+from comun.puntos import puntos_tiempos, puntuar_tiempos
+from comun.pruebas import catalogo_pruebas, separar_pruebas
+
+CLAVE_MARCA = ["codnadador", "codestilo", "coddistancia", "medida"]
+
+
+def _columna(normalizado):
+    return "tiempo_norm_cs" if normalizado else "tiempo_cs"
+
+
+def _mejores(df_tiempos):
+    """Tiempos ya normalizados -> mejor registro por CLAVE_MARCA (índice ordenado)."""
+    if df_tiempos.empty or "tiempo_cs" not in df_tiempos.columns:
+        return pd.DataFrame(columns=CLAVE_MARCA + ["tiempo_cs", "tiempo_norm_cs", "puntos"]).set_index(CLAVE_MARCA)
+    df = df_tiempos.dropna(subset=["tiempo_cs", "codestilo", "coddistancia"])
+    df = df.assign(codestilo=df["codestilo"].astype(str), coddistancia=df["coddistancia"].astype(str))
+    df = df.sort_values("tiempo_cs", kind="stable").drop_duplicates(CLAVE_MARCA, keep="first")
+    return df.set_index(CLAVE_MARCA).sort_index()
+
+
+class MarcasPersonales:
+    """Tabla de mejores marcas de solo lectura; extender() devuelve otra."""
+
+    def __init__(self, tabla, conversion):
+        self.tabla = tabla
+        self.conversion = conversion
+        self._por_prueba = {}
+
+    def extender(self, filas):
+        nuevas = _mejores(puntuar_tiempos(self.conversion.normalizar(filas)))
+        if nuevas.empty:
+            return self
+        actuales = self.tabla["tiempo_cs"].reindex(nuevas.index) if not self.tabla.empty else None
+        if actuales is None:
+            mejora = pd.Series(True, index=nuevas.index)
+        else:
+            mejora = (actuales.isna() | (nuevas["tiempo_cs"] < actuales)).fillna(True).astype(bool)
+        if not mejora.any():
+            return self
+        reemplazos = nuevas[mejora.to_numpy()]
+        tabla = pd.concat([self.tabla.drop(reemplazos.index, errors="ignore"), reemplazos]).sort_index()
+        return MarcasPersonales(tabla, self.conversion)
+
+    def mejor(self, codnadador, codestilo, coddistancia, medida=None, normalizado=False):
+        """Registro de la mejor marca (Series) o None. Sin medida, la mejor
+        entre todas las piletas."""
+        try:
+            if medida is not None:
+                return self.tabla.loc[(codnadador, str(codestilo), str(coddistancia), str(medida))]
+            candidatas = self.tabla.loc[(codnadador, str(codestilo), str(coddistancia))]
+        except KeyError:
+            return None
+        return candidatas.loc[candidatas[_columna(normalizado)].idxmin()]
+
+    def del_nadador(self, codnadador, por_pileta=False, normalizado=False):
+        """Marcas de un nadador como DataFrame (claves como columnas). Sin
+        por_pileta, una fila por estilo y distancia."""
+        try:
+            propias = self.tabla.xs(codnadador, level="codnadador", drop_level=False)
+        except KeyError:
+            return self.tabla.iloc[:0].reset_index()
+        propias = propias.reset_index()
+        if por_pileta:
+            return propias
+        propias = propias.sort_values(_columna(normalizado), kind="stable")
+        return propias.drop_duplicates(["codestilo", "coddistancia"], keep="first").reset_index(drop=True)
+
+    def de_prueba(self, codestilo, coddistancia, por_pileta=False, normalizado=False):
+        """Marcas de todos los nadadores en una prueba (una por nadador si no
+        se separa por pileta), de la más rápida a la más lenta."""
+        tabla = self.tabla.reset_index()
+        prueba = tabla[(tabla["codestilo"] == str(codestilo)) & (tabla["coddistancia"] == str(coddistancia))]
+        prueba = prueba.sort_values(_columna(normalizado), kind="stable")
+        if not por_pileta:
+            prueba = prueba.drop_duplicates("codnadador", keep="first")
+        return prueba.reset_index(drop=True)
+
+    def mejores_por_prueba(self, coddistancia=None, normalizado=False):
+        """Una marca por (nadador, estilo, distancia), la mejor entre piletas,
+        de la más rápida a la más lenta. Se arma una vez por tabla."""
+        if normalizado not in self._por_prueba:
+            tabla = self.tabla.reset_index().sort_values(_columna(normalizado), kind="stable")
+            self._por_prueba[normalizado] = tabla.drop_duplicates(["codnadador", "codestilo", "coddistancia"], keep="first").reset_index(drop=True)
+        tabla = self._por_prueba[normalizado]
+        if coddistancia is not None:
+            tabla = tabla[tabla["coddistancia"] == str(coddistancia)].reset_index(drop=True)
+        return tabla
+
+
+def _extender_marcas(marcas, clave, filas):
+    if clave == "nadadores":
+        # Un nadador nuevo todavía no tiene marcas
+        return marcas
+    # Una pileta, estilo, distancia o base nueva puede cambiar medidas, factores o puntos: se reconstruye
+    if clave != "tiempos":
+        return None
+    return marcas.extender(filas)
+
+
+@tabla_derivada("tiempos", "nadadores", "tiempos_base", "piletas", "estilos", "distancias", extender=_extender_marcas)
+def marcas_personales(df_tiempos, df_nadadores, df_base, df_piletas, df_estilos, df_distancias):
+    return MarcasPersonales(_mejores(puntos_tiempos()), conversion_piletas())
+
+
+def tiempos_de_inscripcion(inscripciones):
+    """inscripciones con codnadador y pruebas ("a, b, c") -> Serie con el
+    mejor tiempo de cada (codnadador, prueba), "" si no tiene marca."""
+    filas = inscripciones[["codnadador", "pruebas"]].assign(prueba=inscripciones["pruebas"].map(separar_pruebas))
+    filas = filas.explode("prueba").dropna(subset=["prueba"])
+    if filas.empty:
+        return pd.Series("", index=pd.MultiIndex.from_tuples([], names=["codnadador", "prueba"]), dtype=object)
+    codigos = catalogo_pruebas().codigos(filas["prueba"].unique())
+    filas = filas.merge(codigos, left_on="prueba", right_index=True, how="left")
+    marcas = marcas_personales().mejores_por_prueba()
+    if not marcas.empty:
+        filas = filas.merge(marcas[["codnadador", "codestilo", "coddistancia", "tiempo"]],
+                            on=["codnadador", "codestilo", "coddistancia"], how="left")
+    else:
+        filas = filas.assign(tiempo=None)
+    filas = filas.drop_duplicates(["codnadador", "prueba"])
+    return filas.set_index(["codnadador", "prueba"])["tiempo"].fillna("").astype(object)
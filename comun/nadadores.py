@@ -0,0 +1,77 @@
+"""Directorio de nadadores: codnadador <-> nombre para mostrar <-> nrosocio.
+
+Las páginas eligen nadadores por nombre ("APELLIDO, Nombre") y guardan por
+código. En vez de filtrar la hoja Nadadores cada vez que hay que pasar de uno
+a otro (una pasada por nadador del pool o por opción de un selectbox), los
+mapas se arman una sola vez por snapshot y cada consulta es un dict.
+"""
+import pandas as pd
+
+from comun.datos import tabla_derivada
+
+
+def _texto(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str).str.strip()
+
+
+def clave_nombre(apellido, nombre):
+    """Forma normalizada para detectar nadadores repetidos."""
+    return f"{str(apellido).strip().upper()}, {str(nombre).strip().upper()}"
+
+
+class DirectorioNadadores:
+    """Mapas de solo lectura sobre la hoja Nadadores."""
+
+    def __init__(self, df_nadadores):
+        if df_nadadores.empty or "codnadador" not in df_nadadores.columns:
+            df = pd.DataFrame(columns=["codnadador", "apellido", "nombre"])
+        else:
+            df = df_nadadores.dropna(subset=["codnadador"])
+        apellido = _texto(df["apellido"]) if "apellido" in df.columns else pd.Series("", index=df.index)
+        nombre = _texto(df["nombre"]) if "nombre" in df.columns else pd.Series("", index=df.index)
+        codigos = [int(c) for c in df["codnadador"].tolist()]
+
+        # Etiqueta de siempre en los selectores: apellido en mayúsculas, nombre tal cual
+        self.etiquetas = dict(zip(codigos, (apellido.str.upper() + ", " + nombre).tolist()))
+        self.codigos = {}
+        for cod, etiqueta in self.etiquetas.items():
+            self.codigos.setdefault(etiqueta, cod)
+        self.claves = set((apellido.str.upper() + ", " + nombre.str.upper()).tolist())
+        socios = _texto(df["nrosocio"]).tolist() if "nrosocio" in df.columns else [""] * len(codigos)
+        self.socios = {cod: s for cod, s in zip(codigos, socios) if s}
+        self.por_socio = {s: cod for cod, s in self.socios.items()}
+        generos = _texto(df["codgenero"]).str.upper().tolist() if "codgenero" in df.columns else [""] * len(codigos)
+        self.generos = dict(zip(codigos, generos))
+        self._ordenados = sorted(self.etiquetas, key=self.etiquetas.get)
+
+    def __len__(self):
+        return len(self.etiquetas)
+
+    def etiqueta(self, codnadador, vacio=""):
+        try:
+            return self.etiquetas.get(int(codnadador), vacio)
+        except (TypeError, ValueError):
+            return vacio
+
+    def codigo(self, etiqueta):
+        """Etiqueta -> codnadador (None si no existe)."""
+        return self.codigos.get(etiqueta)
+
+    def existe(self, apellido, nombre):
+        return clave_nombre(apellido, nombre) in self.claves
+
+    def ordenados(self, codigos=None):
+        """Códigos ordenados por etiqueta; con codigos, sólo esos."""
+        if codigos is None:
+            return list(self._ordenados)
+        incluidos = {int(c) for c in codigos if pd.notna(c)}
+        return [c for c in self._ordenados if c in incluidos]
+
+    def nombres(self, codigos=None):
+        """Etiquetas ordenadas (sin repetir), de todos o de los códigos dados."""
+        return list(dict.fromkeys(self.etiquetas[c] for c in self.ordenados(codigos)))
+
+
+@tabla_derivada("nadadores")
+def directorio_nadadores(df_nadadores):
+    return DirectorioNadadores(df_nadadores)
@@ -0,0 +1,253 @@
+"""Orden de salida de una posta como problema de asignación 4x4.
+
+Cada equipo es una matriz de costos nadador x tramo: el tiempo de 50m de cada
+nadador en el estilo de cada tramo. El mejor orden es la asignación de costo
+mínimo; con cuatro tramos hay 24 asignaciones, así que se evalúan todas para
+todos los equipos a la vez sobre un arreglo equipos x 24 x 4, en lugar de
+recorrer permutaciones en Python equipo por equipo.
+
+Los equipos candidatos también son arreglos: una fila de índices del pool por
+combinación, filtrada con máscaras (género) antes de evaluar.
+
+Para pools grandes no se evalúan todas las combinaciones: mejores_por_banda
+busca sólo los k mejores equipos de cada categoría (banda de suma de edades)
+por ramificación y poda. Se parte de los tríos; la cota de un trío es su
+mejor asignación con el cuarto tramo cubierto por el tiempo más rápido
+disponible en cada estilo, y un trío sólo se completa si esa cota puede
+entrar entre los k mejores de alguna banda a la que todavía puede llegar.
+Antes de mirar tiempos se poda por edades: un par o un trío sigue sólo si
+las edades más chicas y más grandes que quedan le permiten caer en alguna
+de las bandas pedidas, así buscar una sola categoría cuesta mucho menos.
+
+plan_postas arma el plan completo de un torneo sobre esa búsqueda: hasta
+`cupo` equipos por prueba y categoría, sin que nadie nade más de `limite`
+postas ni dos veces la misma prueba, buscando la mayor suma de los valores
+que le asigna la página (medallas esperadas, tiempo).
+"""
+import itertools
+
+import numpy as np
+
+SIN_TIEMPO = 999.0  # nadador sin marca en el estilo del tramo
+
+# Cada fila: posición (dentro del equipo) del nadador que nada cada tramo
+ASIGNACIONES = np.array(list(itertools.permutations(range(4))), dtype="intp")
+TRAMOS = np.arange(4)
+
+
+# --- ORDEN DE SALIDA ---
+def matriz_costos(fichas, estilos):
+    """Fichas ({codestilo: segundos}) y estilos de los cuatro tramos ->
+    arreglo (nadadores, 4) en segundos, SIN_TIEMPO donde no hay marca."""
+    costos = [[ficha.get(estilo, SIN_TIEMPO) for estilo in estilos] for ficha in fichas]
+    return np.array(costos, dtype="float64").reshape(len(fichas), len(estilos))
+
+
+def totales_por_asignacion(costos, equipos):
+    """costos (nadadores, 4) y equipos (k, 4) con índices de filas de costos
+    -> (k, 24): tiempo total de cada equipo con cada fila de ASIGNACIONES."""
+    equipos = np.asarray(equipos, dtype="intp").reshape(-1, 4)
+    nadadores = equipos[:, ASIGNACIONES]
+    return costos[nadadores, TRAMOS].sum(axis=2)
+
+
+def mejor_orden(costos, equipos):
+    """Asignación óptima de cada equipo. Devuelve (ordenes, totales): ordenes
+    (k, 4) con el índice del nadador de cada tramo y totales (k,) en segundos.
+    Ante empates queda la primera asignación, como con itertools."""
+    equipos = np.asarray(equipos, dtype="intp").reshape(-1, 4)
+    totales = totales_por_asignacion(costos, equipos)
+    mejor = totales.argmin(axis=1)
+    filas = np.arange(len(equipos))
+    return equipos[filas[:, None], ASIGNACIONES[mejor]], totales[filas, mejor]
+
+
+# --- EQUIPOS CANDIDATOS ---
+def combinaciones(n, r=4):
+    """Índices (C(n, r), r) de todos los grupos de r entre n nadadores, en el
+    mismo orden que itertools.combinations."""
+    plano = itertools.chain.from_iterable(itertools.combinations(range(n), r))
+    return np.fromiter(plano, dtype="intp").reshape(-1, r)
+
+
+def mascara_genero(equipos, generos, genero):
+    """Equipos válidos para la prueba: M y F con los cuatro de ese género,
+    X (mixta) con exactamente dos hombres."""
+    generos = np.asarray(generos, dtype=object)
+    if genero == "X":
+        return (generos == "M")[equipos].sum(axis=1) == 2
+    return (generos == genero)[equipos].all(axis=1)
+
+
+# --- MEJORES EQUIPOS POR CATEGORÍA ---
+def _sufijos(costos, edades, mascara):
+    """Para cada posición i, entre los candidatos i..n-1 que cumplen la
+    máscara: mejor tiempo de cada tramo y edades mínima y máxima."""
+    tiempos = np.where(mascara[:, None], costos, np.inf)[::-1]
+    menor = np.where(mascara, edades, np.inf)[::-1]
+    mayor = np.where(mascara, edades, -np.inf)[::-1]
+    return (np.vstack([np.minimum.accumulate(tiempos)[::-1], np.full((1, 4), np.inf)]),
+            np.append(np.minimum.accumulate(menor)[::-1], np.inf),
+            np.append(np.maximum.accumulate(mayor)[::-1], -np.inf))
+
+
+def _extremos_edades(edades, r):
+    """Para cada posición i: suma de las r edades más chicas y de las r más
+    grandes entre los candidatos i..n-1 (inf / -inf si quedan menos de r)."""
+    menor, mayor = np.full(len(edades) + 1, np.inf), np.full(len(edades) + 1, -np.inf)
+    for i in range(len(edades) - r + 1):
+        resto = np.sort(edades[i:])
+        menor[i], mayor[i] = resto[:r].sum(), resto[-r:].sum()
+    return menor, mayor
+
+
+def _alcanza(bajo, alto, minimos, maximos):
+    """Grupos x bandas: si la suma final, entre bajo y alto, puede caer en cada banda."""
+    return (bajo[:, None] <= maximos) & (alto[:, None] >= minimos)
+
+
+def _expandir(grupos, n):
+    """Cada grupo de índices con cada candidato posterior a su último."""
+    siguiente = grupos[:, -1] + 1
+    cantidades = n - siguiente
+    repetidos = np.repeat(np.arange(len(grupos)), cantidades)
+    desplazamiento = np.arange(cantidades.sum()) - np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+    return np.column_stack([grupos[repetidos], siguiente[repetidos] + desplazamiento])
+
+
+def mejores_por_banda(costos, edades, generos, genero, minimos, maximos, k=10, lote=64):
+    """Los k equipos más rápidos de cada banda [minimos[b], maximos[b]] de
+    suma de edades, con la regla de género de la prueba.
+
+    Devuelve una lista con una entrada por banda: (ordenes, totales) como en
+    mejor_orden, índices del pool, del más rápido al más lento. Los equipos
+    con un nadador sin marca en su tramo quedan afuera."""
+    generos = np.asarray(generos, dtype=object)
+    minimos, maximos = np.asarray(minimos, dtype="float64"), np.asarray(maximos, dtype="float64")
+    vacio = (np.empty((0, 4), dtype="intp"), np.empty(0))
+    mejores = [vacio] * len(minimos)
+    candidatos = np.arange(len(generos)) if genero == "X" else np.flatnonzero(generos == genero)
+    if len(candidatos) < 4 or not len(minimos):
+        return mejores
+    c_costos = np.asarray(costos, dtype="float64")[candidatos]
+    c_edades = np.asarray(edades, dtype="float64")[candidatos]
+    c_generos = generos[candidatos]
+    n = len(candidatos)
+
+    # Poda por edades antes que por tiempos: un par sigue sólo si con las dos
+    # edades más chicas o las dos más grandes que quedan alcanza alguna banda
+    pares = combinaciones(n, 2)
+    menor2, mayor2 = _extremos_edades(c_edades, 2)
+    suma, siguiente = c_edades[pares].sum(axis=1), pares[:, 1] + 1
+    ternas = _expandir(pares[_alcanza(suma + menor2[siguiente], suma + mayor2[siguiente], minimos, maximos).any(axis=1)], n)
+
+    # Clase de cuarto nadador que le falta a cada trío (en mixta: hombre o no)
+    if genero == "X":
+        hombres = (c_generos == "M")[ternas].sum(axis=1)
+        ternas, hombres = ternas[(hombres >= 1) & (hombres <= 2)], hombres[(hombres >= 1) & (hombres <= 2)]
+        clase = (hombres == 2).astype("intp")
+        mascaras = [c_generos == "M", c_generos != "M"]
+    else:
+        clase = np.zeros(len(ternas), dtype="intp")
+        mascaras = [np.ones(n, dtype=bool)]
+    sufijos = [_sufijos(c_costos, c_edades, m) for m in mascaras]
+    mejor_tramo = np.stack([s[0] for s in sufijos])
+    menor, mayor = np.stack([s[1] for s in sufijos]), np.stack([s[2] for s in sufijos])
+    siguiente = ternas[:, 2] + 1
+    suma = c_edades[ternas].sum(axis=1)
+    alcanza = _alcanza(suma + menor[clase, siguiente], suma + mayor[clase, siguiente], minimos, maximos)
+    posibles = alcanza.any(axis=1)
+    ternas, clase, siguiente, alcanza = ternas[posibles], clase[posibles], siguiente[posibles], alcanza[posibles]
+
+    # Cota: mejor asignación del trío con un cuarto "ideal" (el mejor tiempo
+    # de cada tramo entre los que pueden completarlo)
+    relleno = mejor_tramo[clase, siguiente]
+    filas = np.column_stack([ternas, n + np.arange(len(ternas))])
+    cota = totales_por_asignacion(np.vstack([c_costos, relleno]), filas).min(axis=1)
+
+    umbral = np.full(len(minimos), np.inf)
+    orden = np.argsort(cota, kind="stable")
+    orden = orden[cota[orden] < SIN_TIEMPO]
+    inicio = 0
+    while inicio < len(orden):
+        # Tandas chicas al principio (todavía no hay umbral), más grandes después
+        tanda = orden[inicio:inicio + lote]
+        inicio, lote = inicio + lote, min(2 * lote, 4096)
+        # Cotas crecientes: si ni la primera mejora ninguna banda, ya no hay nada que buscar
+        if cota[tanda[0]] >= umbral.max():
+            break
+        vivas = tanda[(alcanza[tanda] & (cota[tanda, None] < umbral)).any(axis=1)]
+        if not len(vivas):
+            continue
+        equipos = _expandir(ternas[vivas], n)
+        equipos = equipos[mascara_genero(equipos, c_generos, genero)]
+        sumas = c_edades[equipos].sum(axis=1)
+        dentro = (sumas[:, None] >= minimos) & (sumas[:, None] <= maximos)
+        banda = np.where(dentro.any(axis=1), dentro.argmax(axis=1), -1)
+        ordenes, totales = mejor_orden(c_costos, equipos)
+        validos = (banda >= 0) & (totales < SIN_TIEMPO)
+        for b in np.unique(banda[validos]):
+            nuevos = validos & (banda == b)
+            o = np.vstack([mejores[b][0], candidatos[ordenes[nuevos]]])
+            t = np.concatenate([mejores[b][1], totales[nuevos]])
+            top = np.argsort(t, kind="stable")[:k]
+            mejores[b] = (o[top], t[top])
+            if len(top) == k:
+                umbral[b] = t[top[-1]]
+    return mejores
+
+
+# --- PLAN COMPLETO DEL TORNEO ---
+def plan_postas(postas, edades, generos, valorar, limite=2, cupo=1, ancho=8, ramas=3):
+    """Arma los equipos de todas las postas de un torneo en una sola búsqueda.
+
+    postas: una por prueba y categoría, dicts con 'costos' (nadadores x
+    tramo para esa prueba), 'genero', 'minimo' y 'maximo' (banda de suma de
+    edades) y 'carrera' (la prueba: nadie puede estar dos veces en la misma,
+    aunque sea en otra categoría). valorar(posta, totales) -> valor de cada
+    equipo (mayor es mejor; los de valor <= 0 no se anotan).
+
+    Búsqueda en haz: las postas se recorren de la más valiosa a la menos y
+    cada plan parcial se abre en "sin equipo" o en los `ramas` mejores equipos
+    con los nadadores que todavía tiene libres (mejores_por_banda); quedan los
+    `ancho` planes de mayor valor. Cada posta admite hasta `cupo` equipos y
+    nadie nada más de `limite` postas. Devuelve [(posta, orden, total)].
+    """
+    edades = np.asarray(edades, dtype="float64")
+    generos = np.asarray(generos, dtype=object)
+    n = len(generos)
+    carreras = {c: i for i, c in enumerate(dict.fromkeys(p["carrera"] for p in postas))}
+    memo = {}
+
+    def candidatos(p, libres):
+        clave = (p, libres.tobytes())
+        if clave not in memo:
+            indices = np.flatnonzero(libres)
+            posta = postas[p]
+            (ordenes, totales), = mejores_por_banda(posta["costos"][indices], edades[indices], generos[indices],
+                                                    posta["genero"], [posta["minimo"]], [posta["maximo"]], ramas)
+            valores = np.asarray(valorar(p, totales), dtype="float64")
+            memo[clave] = [(indices[o], t, v) for o, t, v in zip(ordenes, totales, valores) if v > 0]
+        return memo[clave]
+
+    libres_todos = np.ones(n, dtype=bool)
+    topes = [max((v for _, _, v in candidatos(p, libres_todos)), default=0.0) for p in range(len(postas))]
+    # Estado: (valor, usos por nadador, nadadores ya anotados en cada carrera, elegidos)
+    estados = [(0.0, np.zeros(n, dtype="int64"), np.zeros((len(carreras), n), dtype=bool), ())]
+    for p in sorted((p for p in range(len(postas)) if topes[p] > 0), key=lambda p: -topes[p]):
+        carrera = carreras[postas[p]["carrera"]]
+        for _ in range(cupo):
+            hijos = {}
+            for valor, usos, ocupados, elegidos in estados:
+                hijos.setdefault(frozenset((q, tuple(o)) for q, o, _ in elegidos), (valor, usos, ocupados, elegidos))
+                for orden, total, v in candidatos(p, (usos < limite) & ~ocupados[carrera]):
+                    nuevos = elegidos + ((p, orden, total),)
+                    clave = frozenset((q, tuple(o)) for q, o, _ in nuevos)
+                    if clave in hijos:
+                        continue
+                    usos_h, ocupados_h = usos.copy(), ocupados.copy()
+                    usos_h[orden] += 1
+                    ocupados_h[carrera, orden] = True
+                    hijos[clave] = (valor + v, usos_h, ocupados_h, nuevos)
+            estados = sorted(hijos.values(), key=lambda e: -e[0])[:ancho]
+    return list(estados[0][3])
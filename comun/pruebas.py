@@ -0,0 +1,88 @@
+"""Catálogo de pruebas de competencia: etiqueta -> (codestilo, coddistancia).
+
+Las etiquetas que usan las competencias ("100m Espalda", "Posta 4x50 Libre")
+se resuelven una sola vez contra las hojas Estilos y Distancias. Los tiempos
+de inscripción (comun.marcas.tiempos_de_inscripcion) salen de un solo join
+entre las pruebas inscriptas, este catálogo y las mejores marcas.
+"""
+import re
+
+import pandas as pd
+
+from comun.datos import tabla_derivada
+
+LISTA_PRUEBAS = [
+    "50m Libre", "100m Libre", "200m Libre", "400m Libre", "800m Libre", "1500m Libre",
+    "50m Espalda", "100m Espalda", "200m Espalda",
+    "50m Pecho", "100m Pecho", "200m Pecho",
+    "50m Mariposa", "100m Mariposa", "200m Mariposa",
+    "100m Combinado", "200m Combinado", "400m Combinado",
+    "Posta 4x50 Libre", "Posta 4x50 Combinada", "Posta 4x100 Libre"
+]
+
+# Palabra que aparece en la etiqueta o en la hoja Estilos -> estilo canónico
+FAMILIAS_ESTILO = {
+    "libre": "libre", "crol": "libre", "espalda": "espalda", "pecho": "pecho",
+    "mariposa": "mariposa", "combinad": "combinado", "medley": "combinado",
+}
+
+_DISTANCIA = re.compile(r"(\d+)\s*[xX]\s*(\d+)|(\d+)")
+
+
+def familia_estilo(texto):
+    texto = str(texto).lower()
+    return next((familia for palabra, familia in FAMILIAS_ESTILO.items() if palabra in texto), None)
+
+
+def metros(texto):
+    """"100m Espalda" -> "100"; "Posta 4x50 Libre" -> "4x50"; sin número -> None."""
+    encontrado = _DISTANCIA.search(str(texto))
+    if not encontrado:
+        return None
+    if encontrado.group(1):
+        return f"{int(encontrado.group(1))}x{int(encontrado.group(2))}"
+    return str(int(encontrado.group(3)))
+
+
+class CatalogoPruebas:
+    """Etiquetas de prueba resueltas a códigos de las hojas."""
+
+    def __init__(self, estilos, distancias):
+        self.estilos = estilos
+        self.distancias = distancias
+        self.tabla = self._resolver(LISTA_PRUEBAS)
+
+    def _resolver(self, etiquetas):
+        etiquetas = list(dict.fromkeys(etiquetas))
+        return pd.DataFrame({
+            "codestilo": [self.estilos.get(familia_estilo(e)) for e in etiquetas],
+            "coddistancia": [self.distancias.get(metros(e)) for e in etiquetas],
+        }, index=pd.Index(etiquetas, name="prueba"), dtype=object)
+
+    def codigos(self, etiquetas):
+        """DataFrame indexado por etiqueta con codestilo y coddistancia (None si
+        la prueba no existe en las hojas)."""
+        etiquetas = list(dict.fromkeys(etiquetas))
+        nuevas = [e for e in etiquetas if e not in self.tabla.index]
+        tabla = pd.concat([self.tabla, self._resolver(nuevas)]) if nuevas else self.tabla
+        return tabla.loc[etiquetas]
+
+
+@tabla_derivada("estilos", "distancias")
+def catalogo_pruebas(df_estilos, df_distancias):
+    estilos, distancias = {}, {}
+    if {"codestilo", "descripcion"} <= set(df_estilos.columns):
+        for cod, desc in zip(df_estilos["codestilo"].astype(str), df_estilos["descripcion"]):
+            estilos.setdefault(familia_estilo(desc), cod)
+    if {"coddistancia", "descripcion"} <= set(df_distancias.columns):
+        for cod, desc in zip(df_distancias["coddistancia"].astype(str), df_distancias["descripcion"]):
+            distancias.setdefault(metros(desc), cod)
+    estilos.pop(None, None)
+    distancias.pop(None, None)
+    return CatalogoPruebas(estilos, distancias)
+
+
+def separar_pruebas(texto):
+    """"50m Libre, 100m Pecho" -> ["50m Libre", "100m Pecho"]."""
+    return [p.strip() for p in str(texto).split(",") if p.strip()]
+
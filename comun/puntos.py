@@ -0,0 +1,150 @@
+"""Puntos World Aquatics de cada marca individual y de cada posta.
+
+puntos = 1000 * (tiempo_base / tiempo) ** 3, truncado a entero. El tiempo base
+depende de la prueba, el género y la pileta. Salen de la hoja Tiempos_Base
+(estilo, distancia, codgenero, medida, tiempo_base) y, para lo que la hoja no
+tenga, de la tabla de abajo (pileta de 50m). Las bases que faltan se derivan:
+25m con el factor de comun.conversion, postas sumando las bases individuales y
+mixto como promedio de M y F.
+
+Los puntos se calculan para todas las filas de Tiempos y Relevos de una vez y
+quedan en el snapshot como tablas derivadas; las páginas sólo ordenan y filtran.
+"""
+import numpy as np
+import pandas as pd
+
+from comun.conversion import LARGO_CORTA, LARGO_LARGA, SIN_MEDIDA, conversion_piletas, largos, tiempos_normalizados
+from comun.datos import tabla_derivada
+from comun.nadadores import directorio_nadadores
+from comun.pruebas import familia_estilo, metros
+from comun.tiempos import a_centesimas
+
+# Bases de pileta larga (récords mundiales al cierre de 2023)
+BASES_LARGA = {
+    "M": {
+        ("libre", "50"): "00:20.91", ("libre", "100"): "00:46.86", ("libre", "200"): "01:42.00",
+        ("libre", "400"): "03:40.07", ("libre", "800"): "07:32.12", ("libre", "1500"): "14:31.02",
+        ("espalda", "50"): "00:23.55", ("espalda", "100"): "00:51.60", ("espalda", "200"): "01:51.92",
+        ("pecho", "50"): "00:25.95", ("pecho", "100"): "00:56.88", ("pecho", "200"): "02:05.48",
+        ("mariposa", "50"): "00:22.27", ("mariposa", "100"): "00:49.45", ("mariposa", "200"): "01:50.34",
+        ("combinado", "200"): "01:54.00", ("combinado", "400"): "04:02.50",
+    },
+    "F": {
+        ("libre", "50"): "00:23.61", ("libre", "100"): "00:51.71", ("libre", "200"): "01:52.85",
+        ("libre", "400"): "03:55.38", ("libre", "800"): "08:04.79", ("libre", "1500"): "15:20.48",
+        ("espalda", "50"): "00:26.98", ("espalda", "100"): "00:57.33", ("espalda", "200"): "02:03.14",
+        ("pecho", "50"): "00:29.16", ("pecho", "100"): "01:04.13", ("pecho", "200"): "02:17.55",
+        ("mariposa", "50"): "00:24.43", ("mariposa", "100"): "00:55.48", ("mariposa", "200"): "02:01.81",
+        ("combinado", "200"): "02:06.12", ("combinado", "400"): "04:25.87",
+    },
+}
+ESTILOS_COMBINADO = ["espalda", "pecho", "mariposa", "libre"]
+
+
+def _bases_largas():
+    """{(familia, metros, genero): centésimas} con postas y mixto derivados."""
+    bases = {(fam, m, g): float(cs) for g, tabla in BASES_LARGA.items()
+             for (fam, m), cs in zip(tabla, a_centesimas(list(tabla.values())))}
+    for g in BASES_LARGA:
+        for m in ["50", "100"]:
+            if ("libre", m, g) in bases:
+                bases[("libre", f"4x{m}", g)] = 4 * bases[("libre", m, g)]
+            tramos = [bases.get((fam, m, g)) for fam in ESTILOS_COMBINADO]
+            if None not in tramos:
+                bases[("combinado", f"4x{m}", g)] = sum(tramos)
+    for fam, m, g in list(bases):
+        if g == "M" and (fam, m, "F") in bases:
+            bases[(fam, m, "X")] = (bases[(fam, m, "M")] + bases[(fam, m, "F")]) / 2
+    return bases
+
+
+def generos(valores):
+    """"M", "Masculino", "f" -> "M" / "F" / "X" (vacío si no hay dato)."""
+    return pd.Series(valores, dtype=object).astype("string").str.strip().str[:1].str.upper().fillna("").astype(object)
+
+
+class TablaPuntos:
+    """Tiempo base de cada (codestilo, coddistancia, género, largo de pileta)."""
+
+    def __init__(self, df_base, conversion):
+        bases = {(fam, m, g, LARGO_LARGA): cs for (fam, m, g), cs in _bases_largas().items()}
+        if not df_base.empty and {"estilo", "distancia", "codgenero", "tiempo_base_cs"} <= set(df_base.columns):
+            filas = df_base.dropna(subset=["tiempo_base_cs"])
+            medida = filas["medida"] if "medida" in filas.columns else pd.Series(str(LARGO_LARGA), index=filas.index)
+            for fam, m, g, largo, cs in zip(filas["estilo"].map(familia_estilo), filas["distancia"].map(metros),
+                                            generos(filas["codgenero"]), largos(medida).fillna(LARGO_LARGA),
+                                            filas["tiempo_base_cs"]):
+                bases[(fam, m, g, int(largo))] = float(cs)
+        self.bases = {}
+        for est, fam in conversion.familias.items():
+            for dist, m in conversion.metros.items():
+                factor = conversion.factores.get(f"{est}|{dist}", 1.0)
+                for g in ["M", "F", "X"]:
+                    larga = bases.get((fam, m, g, LARGO_LARGA))
+                    corta = bases.get((fam, m, g, LARGO_CORTA), larga / factor if larga else None)
+                    if larga: self.bases[f"{est}|{dist}|{g}|{LARGO_LARGA}"] = larga
+                    if corta: self.bases[f"{est}|{dist}|{g}|{LARGO_CORTA}"] = corta
+
+    def puntuar(self, df, genero, columna="tiempo_cs"):
+        """df con codestilo, coddistancia, largo y la columna de tiempo ->
+        mismo df con 'puntos' (Int32, nulo si no hay base o tiempo)."""
+        if df.empty or columna not in df.columns:
+            return df.assign(puntos=pd.Series(pd.NA, index=df.index, dtype="Int32"))
+        # Pileta desconocida: se puntúa como 50m
+        largo = df["largo"].fillna(LARGO_LARGA).astype("int64").astype(str) if "largo" in df.columns else str(LARGO_LARGA)
+        clave = (df["codestilo"].astype(str) + "|" + df["coddistancia"].astype(str) + "|"
+                 + generos(genero).set_axis(df.index).astype(str) + "|" + largo)
+        base = clave.map(self.bases).astype("float64")
+        tiempo = df[columna].astype("Float64").to_numpy(dtype="float64", na_value=np.nan)
+        puntos = np.floor(1000 * (base.to_numpy() / tiempo) ** 3)
+        return df.assign(puntos=pd.Series(puntos, index=df.index).astype("Int32"))
+
+
+@tabla_derivada("tiempos_base", "piletas", "estilos", "distancias")
+def tabla_puntos(df_base, df_piletas, df_estilos, df_distancias):
+    return TablaPuntos(df_base, conversion_piletas())
+
+
+# --- PUNTOS DE CADA FILA ---
+def puntuar_tiempos(df):
+    """Filas de Tiempos ya normalizadas (comun.conversion) -> con 'puntos'."""
+    return tabla_puntos().puntuar(df, df["codnadador"].map(directorio_nadadores().generos))
+
+
+def _extender_puntos_tiempos(tabla, clave, filas):
+    if clave == "nadadores":
+        # Un nadador nuevo todavía no tiene marcas
+        return tabla
+    if clave != "tiempos":
+        return None
+    return pd.concat([tabla, puntuar_tiempos(conversion_piletas().normalizar(filas))], ignore_index=True)
+
+
+@tabla_derivada("tiempos", "nadadores", "tiempos_base", "piletas", "estilos", "distancias",
+                extender=_extender_puntos_tiempos)
+def puntos_tiempos(df_tiempos, df_nadadores, df_base, df_piletas, df_estilos, df_distancias):
+    """Tiempos con tiempo_norm_cs y puntos."""
+    return puntuar_tiempos(tiempos_normalizados())
+
+
+def _puntuar_relevos(df):
+    conversion = conversion_piletas()
+    if "codpileta" in df.columns:
+        medida = df["codpileta"].astype(str).map(conversion.medidas).fillna(SIN_MEDIDA)
+    else:
+        medida = pd.Series(SIN_MEDIDA, index=df.index)
+    df = df.assign(medida=medida, largo=largos(medida).set_axis(df.index))
+    genero = df["codgenero"] if "codgenero" in df.columns else pd.Series("", index=df.index)
+    return tabla_puntos().puntuar(df, genero, "tiempo_final_cs")
+
+
+def _extender_puntos_relevos(tabla, clave, filas):
+    if clave != "relevos":
+        return None
+    return pd.concat([tabla, _puntuar_relevos(filas)], ignore_index=True)
+
+
+@tabla_derivada("relevos", "tiempos_base", "piletas", "estilos", "distancias", extender=_extender_puntos_relevos)
+def puntos_relevos(df_relevos, df_base, df_piletas, df_estilos, df_distancias):
+    """Relevos con medida, largo y puntos de la posta."""
+    return _puntuar_relevos(df_relevos)
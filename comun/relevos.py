@@ -0,0 +1,68 @@
+"""Historial de postas indexado por la formación (los cuatro nadadores).
+
+Para saber si cuatro nadadores ya nadaron juntos no hace falta recorrer
+Relevos: una vez por snapshot se ordenan los cuatro códigos de cada posta y
+se guarda, para cada cuarteto (opcionalmente con estilo y reglamento), la
+posición de su mejor registro. Cada consulta es una búsqueda en un dict.
+"""
+import numpy as np
+import pandas as pd
+
+from comun.datos import tabla_derivada
+
+NADADORES_POSTA = [f"nadador_{i}" for i in range(1, 5)]
+
+
+class HistorialPostas:
+    """Mejor posta registrada por cuarteto; las filas son las de Relevos."""
+
+    def __init__(self, df_relevos):
+        if df_relevos.empty or not set(NADADORES_POSTA) <= set(df_relevos.columns):
+            self.filas = df_relevos.iloc[:0]
+            self._cuartetos = np.empty((0, 4), dtype="int64")
+        else:
+            completas = (df_relevos[NADADORES_POSTA] > 0).all(axis=1)
+            filas = df_relevos[completas]
+            if "tiempo_final_cs" in filas.columns:
+                filas = filas.sort_values("tiempo_final_cs", kind="stable", na_position="last")
+            self.filas = filas.reset_index(drop=True)
+            self._cuartetos = np.sort(self.filas[NADADORES_POSTA].to_numpy(dtype="int64"), axis=1)
+        self._indices = {}
+
+    def _texto(self, columna):
+        if columna not in self.filas.columns:
+            return [None] * len(self.filas)
+        return [None if pd.isna(v) else str(v) for v in self.filas[columna].astype(object)]
+
+    def _indice(self, campos):
+        """{clave: posición del mejor registro}; se arma la primera vez que se pide."""
+        if campos not in self._indices:
+            columnas = [map(tuple, self._cuartetos.tolist())] + [self._texto(c) for c in campos]
+            indice = {}
+            # Las filas ya están ordenadas por tiempo: la primera de cada clave es la mejor
+            for pos, clave in enumerate(zip(*columnas)):
+                indice.setdefault(clave if campos else clave[0], pos)
+            self._indices[campos] = indice
+        return self._indices[campos]
+
+    def mejor(self, codnadadores, codestilo=None, tipo_reglamento=None):
+        """Mejor posta de esos cuatro nadadores (en cualquier orden), o None."""
+        cuarteto = tuple(sorted(int(c) for c in codnadadores))
+        filtros = {"codestilo": codestilo, "tipo_reglamento": tipo_reglamento}
+        campos = tuple(c for c, v in filtros.items() if v is not None)
+        clave = (cuarteto, *(str(filtros[c]) for c in campos)) if campos else cuarteto
+        pos = self._indice(campos).get(clave)
+        return None if pos is None else self.filas.iloc[pos]
+
+    def mejores(self, cuartetos):
+        """Arreglo (k, 4) de códigos -> lista con la mejor posta de cada
+        cuarteto (en cualquier orden), o None."""
+        indice = self._indice(())
+        ordenados = np.sort(np.asarray(cuartetos, dtype="int64").reshape(-1, 4), axis=1)
+        posiciones = [indice.get(tuple(c)) for c in ordenados.tolist()]
+        return [None if pos is None else self.filas.iloc[pos] for pos in posiciones]
+
+
+@tabla_derivada("relevos")
+def historial_postas(df_relevos):
+    return HistorialPostas(df_relevos)
@@ -0,0 +1,81 @@
+"""Tiempos de carrera como enteros en centésimas.
+
+Acepta los formatos que aparecen en las hojas: "mm:ss.cc", "ss.cc", "mm:ss",
+"mm:ss:cc" y "mm.ss.cc", además de números sueltos (segundos). Un tiempo en
+cero o ilegible queda como nulo (pd.NA), nunca como un valor centinela.
+
+Todo trabaja por columnas: una hoja completa se convierte en una pasada, sin
+una llamada de Python por fila.
+"""
+import numpy as np
+import pandas as pd
+
+_PATRON = (
+    r"^\s*(?:(?P<min>\d+):|(?P<min_punto>\d+)\.(?=\d+[.:]\d))?"
+    r"(?P<seg>\d+)(?:[.,:](?P<cent>\d{1,2}))?\s*$"
+)
+
+
+# --- TEXTO -> CENTÉSIMAS ---
+def _canonicos(textos):
+    """Tiempos "mm:ss.cc" de ancho fijo: se leen los bytes como una matriz de
+    dígitos, una sola operación de NumPy para toda la columna."""
+    crudo = np.frombuffer("".join(textos).encode("ascii"), dtype=np.uint8)
+    d = crudo.reshape(-1, 8).astype(np.int32) - ord("0")
+    return (d[:, 0] * 10 + d[:, 1]) * 6000 + (d[:, 3] * 10 + d[:, 4]) * 100 + d[:, 6] * 10 + d[:, 7]
+
+
+def _generales(texto):
+    partes = texto.str.extract(_PATRON)
+    minutos = pd.to_numeric(partes["min"].fillna(partes["min_punto"]), errors="coerce").fillna(0)
+    segundos = pd.to_numeric(partes["seg"], errors="coerce")
+    # "35.2" son 35 segundos y 20 centésimas
+    centesimas = pd.to_numeric(partes["cent"].str.ljust(2, "0"), errors="coerce").fillna(0)
+    return (minutos * 6000 + segundos * 100 + centesimas).to_numpy(dtype="float64", na_value=np.nan)
+
+
+def a_centesimas(valores):
+    """Serie de tiempos -> Serie Int32 de centésimas (nulo si no hay tiempo)."""
+    serie = pd.Series(valores)
+    texto = serie.astype("string").str.strip()
+    total = np.full(len(texto), np.nan)
+    canonico = texto.str.fullmatch(r"[0-9]{2}:[0-9]{2}\.[0-9]{2}").fillna(False).to_numpy(dtype=bool)
+    if canonico.any():
+        total[canonico] = _canonicos(texto[canonico].tolist())
+    # El resto (formatos sueltos, números, basura) pasa por la expresión regular
+    otros = ~canonico & texto.notna().to_numpy()
+    if otros.any():
+        total[otros] = _generales(texto[otros])
+    total[total <= 0] = np.nan
+    return pd.Series(total, index=serie.index).round().astype("Int32")
+
+
+def centesimas(valor):
+    """Un solo tiempo -> int en centésimas, o None."""
+    resultado = a_centesimas([valor]).iloc[0]
+    return None if pd.isna(resultado) else int(resultado)
+
+
+# --- CENTÉSIMAS -> TEXTO ---
+def _dos_cifras(numeros):
+    return pd.Series(numeros).astype(str).str.zfill(2).to_numpy(dtype=object)
+
+
+def a_texto(valores, vacio=""):
+    """Serie de centésimas -> Serie de textos "mm:ss.cc" (vacio si falta)."""
+    serie = pd.to_numeric(pd.Series(valores), errors="coerce").astype("Float64").round()
+    nulos = serie.isna().to_numpy()
+    enteros = serie.fillna(0).astype("int64").to_numpy()
+    minutos, resto = np.divmod(enteros, 6000)
+    segundos, cent = np.divmod(resto, 100)
+    texto = _dos_cifras(minutos) + ":" + _dos_cifras(segundos) + "." + _dos_cifras(cent)
+    return pd.Series(np.where(nulos, vacio, texto), index=serie.index, dtype=object)
+
+
+def texto_tiempo(valor, vacio="-"):
+    """Un valor en centésimas -> "mm:ss.cc" (vacio si falta)."""
+    if valor is None or pd.isna(valor):
+        return vacio
+    minutos, resto = divmod(int(round(valor)), 6000)
+    segundos, cent = divmod(resto, 100)
+    return f"{minutos:02d}:{segundos:02d}.{cent:02d}"
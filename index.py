@@ -1,8 +1,8 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
-import pandas as pd
 import time
 
+from comun.datos import cargar_hojas
+
 # --- 1. CONFIGURACIÓN DEL ÍCONO (ENLACE GITHUB RAW) ---
 # Usamos el enlace RAW directo de GitHub. Esto es lo más compatible que existe.
 # Asegúrate de que el archivo 'escudo.png' esté en la raíz de tu repo.
@@ -39,22 +39,10 @@ if "ver_nadador_especifico" not in st.session_state: st.session_state.ver_nadado
 if "show_login_form" not in st.session_state: st.session_state.show_login_form = False 
 
 # --- 3. CONEXIÓN ---
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-@st.cache_data(ttl="1h")
 def cargar_tablas_login():
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "users": conn.read(worksheet="User")
-        }
-    except: return None
+    return cargar_hojas("nadadores", "users")
 
 # --- 4. FUNCIONES LOGIN / LOGOUT ---
-def limpiar_socio(valor):
-    if pd.isna(valor): return ""
-    return str(valor).split('.')[0].strip()
-
 def validar_socio():
     raw_input = st.session_state.input_socio
     socio_limpio = raw_input.split("-")[0].strip()
@@ -65,17 +53,15 @@ def validar_socio():
 
     db = cargar_tablas_login()
     if db:
-        df_u = db['users'].copy()
-        df_n = db['nadadores'].copy()
-        
-        df_u['nrosocio_str'] = df_u['nrosocio'].apply(limpiar_socio)
-        df_n['nrosocio_str'] = df_n['nrosocio'].apply(limpiar_socio)
+        # nrosocio llega limpio desde el snapshot (12345.0 -> "12345")
+        df_u = db['users']
+        df_n = db['nadadores']
         
-        usuario = df_u[df_u['nrosocio_str'] == socio_limpio]
+        usuario = df_u[df_u['nrosocio'] == socio_limpio]
         
         if not usuario.empty:
             perfil = usuario.iloc[0]['perfil'].upper()
-            datos = df_n[df_n['nrosocio_str'] == socio_limpio]
+            datos = df_n[df_n['nrosocio'] == socio_limpio]
             
             if not datos.empty:
                 st.session_state.role = perfil
@@ -1,8 +1,11 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 from datetime import datetime, date
 
+from comun.datos import actualizar_filas, agregar_filas, cargar_hojas, obtener_almacen, recargar_desde_origen
+from comun.limitador import obtener_limitador
+from comun.nadadores import clave_nombre, directorio_nadadores
+
 # --- 1. CONFIGURACIÓN E INTERFAZ ---
 st.set_page_config(page_title="Carga - Natación", layout="wide", initial_sidebar_state="collapsed")
 
@@ -21,7 +24,21 @@ if not st.session_state.get("admin_unlocked", False):
 
 st.title("📥 Panel de Carga y Gestión")
 
-conn = st.connection("gsheets", type=GSheetsConnection)
+# Estado del limitador compartido de la API (todas las sesiones del servidor)
+estado_api = obtener_limitador().estado()
+st.caption(f"API Sheets · en cola: {estado_api['total_en_cola']} "
+           f"(lectura {estado_api['en_cola']['lectura']}, escritura {estado_api['en_cola']['escritura']}, fondo {estado_api['en_cola']['fondo']}) "
+           f"· cuota disponible: {estado_api['tokens']} · 429 recibidos: {estado_api['rechazos_429']}")
+# Con el espejo: escrituras que Sheets rechazó sin remedio (no se reintentan)
+descartadas = getattr(obtener_almacen().backend, "descartadas", [])
+if descartadas:
+    with st.expander(f"⚠️ {len(descartadas)} escrituras no llegaron a Google Sheets", expanded=False):
+        st.caption("Quedaron guardadas en la base local, pero Sheets las rechazó (p. ej. pestaña o columna clave inexistente). Corregir la hoja y volver a cargarlas.")
+        st.dataframe(pd.DataFrame(descartadas), hide_index=True, use_container_width=True)
+if st.button("🔄 Traer cambios hechos directo en Google Sheets"):
+    # Único refresco total: vuelve a leer todas las hojas (con el espejo, las copia de nuevo)
+    recargar_desde_origen()
+    st.rerun()
 
 # --- 2. INICIALIZAR COLAS EN SESSION STATE ---
 if "cola_nadadores" not in st.session_state: st.session_state.cola_nadadores = []
@@ -29,46 +46,25 @@ if "cola_users" not in st.session_state: st.session_state.cola_users = []
 if "cola_tiempos" not in st.session_state: st.session_state.cola_tiempos = []
 if "cola_relevos" not in st.session_state: st.session_state.cola_relevos = []
 
-def refrescar_datos():
-    st.cache_data.clear()
-    st.rerun()
-
 # --- 3. CARGA DE METADATOS ---
-@st.cache_data(ttl="1h")
-def cargar_referencias():
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "users": conn.read(worksheet="User"), 
-            "tiempos": conn.read(worksheet="Tiempos"),
-            "relevos": conn.read(worksheet="Relevos"),
-            "estilos": conn.read(worksheet="Estilos"),
-            "distancias": conn.read(worksheet="Distancias"),
-            "piletas": conn.read(worksheet="Piletas"),
-            "cat_relevos": conn.read(worksheet="Categorias_Relevos")
-        }
-    except: return None
-
-data = cargar_referencias()
+data = cargar_hojas("nadadores", "users", "tiempos", "relevos", "estilos", "distancias", "piletas", "cat_relevos")
 if not data: st.stop()
 
 # Pre-procesamiento
-df_nad = data['nadadores'].copy()
-df_nad['Nombre Completo'] = df_nad['apellido'].astype(str).str.strip().str.upper() + ", " + df_nad['nombre'].astype(str).str.strip().str.upper()
-set_nadadores_existentes = set(df_nad['Nombre Completo'].unique())
+df_nad = data['nadadores']
+directorio = directorio_nadadores()
+set_nadadores_existentes = set(directorio.claves)
 
-# Validación de socios existentes (Limpieza previa para evitar float o vacíos)
-df_users_clean = data['users'].copy()
-df_users_clean['nrosocio'] = pd.to_numeric(df_users_clean['nrosocio'], errors='coerce') # Forzar numérico
-df_users_clean = df_users_clean.dropna(subset=['nrosocio']) # Borrar vacíos
-set_socios_existentes = set(df_users_clean['nrosocio'].astype(int).astype(str).unique()) # Set de strings limpios
+# Validación de socios existentes (el esquema ya deja nrosocio como texto limpio)
+socios_users = data['users']['nrosocio']
+set_socios_existentes = set(socios_users[socios_users != ""].unique())
 
-df_t = data['tiempos'].copy()
+df_t = data['tiempos'].copy(deep=False)
 df_t['hash_validacion'] = df_t['codnadador'].astype(str) + "_" + df_t['codestilo'].astype(str) + "_" + df_t['coddistancia'].astype(str) + "_" + df_t['fecha'].astype(str)
 set_tiempos_existentes = set(df_t['hash_validacion'].unique())
 
-lista_nombres = sorted(df_nad['Nombre Completo'].dropna().unique())
-df_pil = data['piletas'].copy()
+lista_nombres = directorio.nombres()
+df_pil = data['piletas'].copy(deep=False)
 col_club_pil = 'club' if 'club' in df_pil.columns else df_pil.columns[1] 
 df_pil['Detalle'] = df_pil[col_club_pil].astype(str) + " (" + df_pil['medida'].astype(str) + ")"
 lista_piletas = df_pil['Detalle'].unique()
@@ -91,24 +87,25 @@ if total > 0:
         try:
             with st.spinner("Sincronizando con la nube..."):
                 if st.session_state.cola_nadadores:
-                    conn.update(worksheet="Nadadores", data=pd.concat([data['nadadores'], pd.DataFrame(st.session_state.cola_nadadores)], ignore_index=True))
+                    agregar_filas("nadadores", pd.DataFrame(st.session_state.cola_nadadores))
                     st.session_state.cola_nadadores = []
                 
                 if st.session_state.cola_users:
                     df_new_users = pd.DataFrame(st.session_state.cola_users)
-                    conn.update(worksheet="User", data=pd.concat([data['users'], df_new_users], ignore_index=True))
+                    agregar_filas("users", df_new_users)
                     st.session_state.cola_users = []
 
                 if st.session_state.cola_tiempos:
-                    conn.update(worksheet="Tiempos", data=pd.concat([data['tiempos'], pd.DataFrame(st.session_state.cola_tiempos)], ignore_index=True))
+                    agregar_filas("tiempos", pd.DataFrame(st.session_state.cola_tiempos))
                     st.session_state.cola_tiempos = []
                 
                 if st.session_state.cola_relevos:
-                    conn.update(worksheet="Relevos", data=pd.concat([data['relevos'], pd.DataFrame(st.session_state.cola_relevos)], ignore_index=True))
+                    agregar_filas("relevos", pd.DataFrame(st.session_state.cola_relevos))
                     st.session_state.cola_relevos = []
                 
                 st.success("✅ ¡Base de Datos Actualizada!")
-                refrescar_datos()
+                # Las filas subidas ya están en el snapshot: el rerun no vuelve a leer Sheets
+                st.rerun()
         except Exception as e: st.error(f"Error: {str(e)}")
     
     if col_s2.button("🗑️ Borrar Cola (Descartar)", use_container_width=True):
@@ -171,7 +168,7 @@ if seccion_activa == "👤 Nuevo Nadador":
             if st.form_submit_button("Guardar Ficha", use_container_width=True):
                 # Validamos usando n_socio (la caja grande)
                 if n_nom and n_ape and n_gen and n_socio and n_dni:
-                    nombre_completo_nuevo = f"{n_ape.strip().upper()}, {n_nom.strip().upper()}"
+                    nombre_completo_nuevo = clave_nombre(n_ape, n_nom)
                     socio_str = str(n_socio).strip()
 
                     # Validaciones
@@ -231,7 +228,7 @@ elif seccion_activa == "⏱️ Individuales":
             st.write("")
             if st.form_submit_button("Guardar Tiempo", use_container_width=True):
                 if t_nad and t_est and t_dis and t_pil:
-                    id_nad = df_nad[df_nad['Nombre Completo'] == t_nad]['codnadador'].values[0]
+                    id_nad = directorio.codigo(t_nad)
                     id_est = data['estilos'][data['estilos']['descripcion'] == t_est]['codestilo'].values[0]
                     id_dis = data['distancias'][data['distancias']['descripcion'] == t_dis]['coddistancia'].values[0]
                     fecha_str = v_fec.strftime('%Y-%m-%d')
@@ -271,11 +268,8 @@ elif seccion_activa == "🏊‍♂️ Relevos":
         # Filtro estricto que limpia la columna género y la convierte a lista para evitar errores del selectbox
         ld = []
         if r_gen in ["M", "F"]:
-            mask_gen = df_nad['codgenero'].astype(str).str.strip().str.upper()
-            if r_gen == "M":
-                ld = df_nad[mask_gen.isin(['M', 'MASCULINO'])]['Nombre Completo'].dropna().sort_values().tolist()
-            else:
-                ld = df_nad[mask_gen.isin(['F', 'FEMENINO'])]['Nombre Completo'].dropna().sort_values().tolist()
+            generos_ok = ['M', 'MASCULINO'] if r_gen == "M" else ['F', 'FEMENINO']
+            ld = directorio.nombres([c for c, g in directorio.generos.items() if g in generos_ok])
         elif r_gen == "X":
             ld = lista_nombres 
         
@@ -324,8 +318,7 @@ elif seccion_activa == "🏊‍♂️ Relevos":
                         # Extraer IDs asegurando tipo int y previendo nulos
                         ids_n = []
                         for n in r_n:
-                            idx = df_nad[df_nad['Nombre Completo'] == n]['codnadador'].values[0]
-                            ids_n.append(int(idx))
+                            ids_n.append(int(directorio.codigo(n)))
 
                         id_pil_rel = df_pil[df_pil['Detalle'] == r_pil]['codpileta'].values[0]
 
@@ -347,25 +340,16 @@ elif seccion_activa == "🏊‍♂️ Relevos":
 elif seccion_activa == "🔑 Gestión Permisos":
     st.subheader("🛠️ Modificar Perfil de Usuario")
     
-    # 1. Limpieza de Tabla Users (Filtrar NaN y convertir a Int -> Str)
-    df_users = data['users'].copy()
-    df_users['nrosocio'] = pd.to_numeric(df_users['nrosocio'], errors='coerce') # Force NaN si no es numero
-    df_users = df_users.dropna(subset=['nrosocio']) # Eliminar vacíos
-    df_users['nrosocio'] = df_users['nrosocio'].astype(int).astype(str) # 12345.0 -> 12345 -> "12345"
-
-    # 2. Limpieza de Tabla Nadadores (Mismo proceso para coincidir en el merge)
-    df_nad_info = df_nad[['nrosocio', 'Nombre Completo', 'dni']].copy()
-    df_nad_info['nrosocio'] = pd.to_numeric(df_nad_info['nrosocio'], errors='coerce')
-    df_nad_info = df_nad_info.dropna(subset=['nrosocio'])
-    df_nad_info['nrosocio'] = df_nad_info['nrosocio'].astype(int).astype(str)
-    
-    # 3. Merge Limpio
-    df_merged = df_nad_info.merge(df_users, on='nrosocio', how='inner')
+    # 1. Users y Nadadores ya traen nrosocio como texto limpio ("12345"); sólo se descartan vacíos
+    df_users = data['users'][data['users']['nrosocio'] != ""]
+
+    # 2. Socios que además tienen ficha de nadador: el directorio resuelve nrosocio -> nombre sin merge
+    socios_con_ficha = [s for s in df_users['nrosocio'].unique() if s in directorio.por_socio]
     
     with st.container(border=True):
         st.info("Busque un socio para cambiar su nivel de acceso (N = Nadador, M = Maestro).")
         
-        lista_socios_display = sorted([f"{row['Nombre Completo']} (Socio: {row['nrosocio']})" for _, row in df_merged.iterrows()])
+        lista_socios_display = sorted([f"{directorio.etiqueta(directorio.por_socio[s])} (Socio: {s})" for s in socios_con_ficha])
         
         sel_socio = st.selectbox("Buscar Nadador/Usuario:", lista_socios_display, index=None, placeholder="Escriba nombre...")
         
@@ -386,19 +370,14 @@ elif seccion_activa == "🔑 Gestión Permisos":
             if st.button("💾 Actualizar Permisos", type="primary"):
                 if nuevo_perfil_code != perfil_actual:
                     try:
-                        # Actualizar en el DF original (el que subimos a Sheets)
-                        # Nota: data['users'] puede tener basura, asi que buscamos donde coincida el numero (como float o int)
-                        
-                        # Estrategia segura: Convertir la columna del DF original temporalmente para encontrar el index
-                        idx_match = data['users'][pd.to_numeric(data['users']['nrosocio'], errors='coerce') == int(nro_socio_sel)].index
+                        # Sólo se envía la celda del perfil; la clave compara 123, 123.0 y "123" como iguales
+                        cambio = pd.DataFrame([{"nrosocio": int(nro_socio_sel), "perfil": nuevo_perfil_code}])
                         
-                        if not idx_match.empty:
-                            data['users'].at[idx_match[0], 'perfil'] = nuevo_perfil_code
-                            conn.update(worksheet="User", data=data['users'])
+                        if actualizar_filas("users", ["nrosocio"], cambio):
                             st.success(f"✅ Perfil actualizado a '{nuevo_perfil_code}' para el socio {nro_socio_sel}.")
-                            refrescar_datos()
+                            st.rerun()
                         else:
-                            st.error("Error: No se encontró el índice original para actualizar.")
+                            st.error("Error: No se encontró el socio en la hoja de usuarios.")
                     except Exception as e:
                         st.error(f"Error al actualizar: {e}")
                 else:
@@ -1,11 +1,15 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 import altair as alt
 from datetime import datetime, timedelta, timezone, date
-import time
 import uuid
-import random
+
+from comun.categorias import orden_categorias
+from comun.cola_escritura import marcar_realizada
+from comun.datos import cargar_hojas, leer_hoja, modificar_fila, precargar_hojas
+from comun.edades import padron_edades
+from comun.limitador import intentar
+from comun.marcas import tiempos_de_inscripcion
 
 # --- CONFIGURACIÓN ---
 st.set_page_config(page_title="Inicio", layout="centered")
@@ -20,115 +24,64 @@ if "show_login_form" not in st.session_state:
 if "admin_unlocked" not in st.session_state: 
     st.session_state.admin_unlocked = False
 
-# --- CONEXIÓN ---
-conn = st.connection("gsheets", type=GSheetsConnection)
-
 # --- OPTIMIZACIÓN DE CARGA DE DATOS (FIX ERROR 429) ---
-# Separamos los datos estáticos de los dinámicos para no saturar la API
+# Todas las hojas salen del snapshot compartido (comun.datos): cada una se
+# descarga una sola vez por proceso y por refresco, sin copias por página.
 
-@st.cache_data(ttl="1h")
 def cargar_datos_generales():
     """Carga datos pesados que no cambian frecuentemente."""
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "tiempos": conn.read(worksheet="Tiempos"),
-            "relevos": conn.read(worksheet="Relevos"),
-            "categorias": conn.read(worksheet="Categorias"),
-            "estilos": conn.read(worksheet="Estilos"),
-            "distancias": conn.read(worksheet="Distancias")
-        }
-    except: return None
+    return cargar_hojas("nadadores", "tiempos", "relevos", "categorias", "estilos", "distancias")
 
-@st.cache_data(ttl="10m")
 def cargar_datos_rutinas():
     """Carga solo las rutinas y el seguimiento, que cambian seguido."""
-    try:
-        return {
-            "rutinas": conn.read(worksheet="Rutinas"),
-            "seguimiento": conn.read(worksheet="Rutinas_Seguimiento")
-        }
-    except: return None
+    return cargar_hojas("rutinas", "seguimiento")
 
 # --- FUNCIONES DE INSCRIPCIÓN RÁPIDA ---
-@st.cache_data(ttl="5s")
 def cargar_datos_inscripcion_inicio():
     try:
+        # Fechas e IDs ya vienen tipados desde el snapshot (comun.esquemas)
         try:
-            df_comp = conn.read(worksheet="Competencias").copy()
-            if not df_comp.empty:
-                df_comp['fecha_evento'] = pd.to_datetime(df_comp['fecha_evento'], errors='coerce')
-                df_comp['fecha_limite'] = pd.to_datetime(df_comp['fecha_limite'], errors='coerce')
+            df_comp = leer_hoja("competencias")
         except: df_comp = pd.DataFrame()
             
         try:
-            df_ins = conn.read(worksheet="Inscripciones").copy()
-            if not df_ins.empty:
-                df_ins['codnadador'] = pd.to_numeric(df_ins['codnadador'], errors='coerce').fillna(0).astype(int)
+            df_ins = leer_hoja("inscripciones")
         except: df_ins = pd.DataFrame()
             
         try:
-            df_pil = conn.read(worksheet="Piletas").copy()
+            df_pil = leer_hoja("piletas")
         except: df_pil = pd.DataFrame()
 
         return df_comp, df_ins, df_pil
     except:
         return None, None, None
 
-def actualizar_con_retry_inicio(worksheet, data, max_retries=5):
-    for i in range(max_retries):
-        try:
-            conn.update(worksheet=worksheet, data=data)
-            return True, None 
-        except Exception as e:
-            if "429" in str(e) or "quota" in str(e):
-                time.sleep((2 ** i) + random.uniform(0, 1))
-                continue 
-            else:
-                return False, e
-    return False, "Error de conexión."
-
-def leer_dataset_fresco_inicio(worksheet):
-    try: return conn.read(worksheet=worksheet, ttl=0).copy()
-    except: return None
-
 def gestionar_inscripcion_inicio(id_comp, id_nadador, lista_pruebas):
-    df_ins = leer_dataset_fresco_inicio("Inscripciones")
-    if df_ins is None: df_ins = pd.DataFrame(columns=["id_inscripcion", "id_competencia", "codnadador", "pruebas", "fecha_inscripcion"])
-    if not df_ins.empty: df_ins['codnadador'] = pd.to_numeric(df_ins['codnadador'], errors='coerce').fillna(0).astype(int)
-
-    pruebas_str = ", ".join(lista_pruebas)
-    mask = (df_ins['id_competencia'] == id_comp) & (df_ins['codnadador'] == id_nadador)
+    clave = {"id_competencia": id_comp, "codnadador": int(id_nadador)}
     
-    if not df_ins[mask].empty:
-        df_ins.loc[mask, 'pruebas'] = pruebas_str
-        df_ins.loc[mask, 'fecha_inscripcion'] = datetime.now().strftime("%Y-%m-%d")
-        msg = "Modificado."
-    else:
-        nuevo = {"id_inscripcion": str(uuid.uuid4()), "id_competencia": id_comp, "codnadador": int(id_nadador), "pruebas": pruebas_str, "fecha_inscripcion": datetime.now().strftime("%Y-%m-%d")}
-        df_ins = pd.concat([df_ins, pd.DataFrame([nuevo])], ignore_index=True)
-        msg = "Inscripto."
-
-    exito, _ = actualizar_con_retry_inicio("Inscripciones", df_ins)
+    def inscribir(fila):
+        # Escritura versionada: si otro la modificó recién, se reaplica sobre su versión
+        base = fila or {"id_inscripcion": str(uuid.uuid4()), **clave}
+        return {**base, "pruebas": ", ".join(lista_pruebas), "fecha_inscripcion": datetime.now().strftime("%Y-%m-%d")}
+    
+    exito, resultado = intentar(lambda: modificar_fila("inscripciones", clave, inscribir))
     if exito: 
-        cargar_datos_inscripcion_inicio.clear()
-        return True, msg
+        anterior, _ = resultado
+        return True, "Modificado." if anterior else "Inscripto."
     return False, "Error."
 
 def eliminar_inscripcion_inicio(id_comp, id_nadador):
-    df_ins = leer_dataset_fresco_inicio("Inscripciones")
-    if df_ins is None: return False, "Error."
-    if not df_ins.empty: df_ins['codnadador'] = pd.to_numeric(df_ins['codnadador'], errors='coerce').fillna(0).astype(int)
-    
-    df_ins = df_ins[~((df_ins['id_competencia'] == id_comp) & (df_ins['codnadador'] == id_nadador))]
-    exito, _ = actualizar_con_retry_inicio("Inscripciones", df_ins)
+    clave = {"id_competencia": id_comp, "codnadador": int(id_nadador)}
+    exito, _ = intentar(lambda: modificar_fila("inscripciones", clave, lambda fila: None))
     if exito: 
-        cargar_datos_inscripcion_inicio.clear()
         return True, "Baja exitosa."
     return False, "Error."
 
 # Función unificadora para mantener compatibilidad con el código existente
 def get_db():
+    # En frío, todas las hojas de la página llegan en un único viaje a la API
+    precargar_hojas("nadadores", "tiempos", "relevos", "categorias", "estilos", "distancias",
+                    "rutinas", "seguimiento", "competencias", "inscripciones", "piletas")
     general = cargar_datos_generales()
     rutinas = cargar_datos_rutinas()
     
@@ -143,30 +96,6 @@ def get_db():
 db = get_db()
 
 # --- FUNCIONES AUXILIARES ---
-def calcular_cat_exacta(edad, df_cat):
-    try:
-        for _, r in df_cat.iterrows():
-            if r['edad_min'] <= edad <= r['edad_max']: return r['nombre_cat']
-        return "-"
-    except: return "-"
-
-def calcular_categoria_grafico(anio_nac):
-    anio_actual = datetime.now().year
-    edad = anio_actual - anio_nac
-    if edad < 20: return "Juvenil"
-    elif 20 <= edad <= 24: return "PRE"
-    elif 25 <= edad <= 29: return "A"
-    elif 30 <= edad <= 34: return "B"
-    elif 35 <= edad <= 39: return "C"
-    elif 40 <= edad <= 44: return "D"
-    elif 45 <= edad <= 49: return "E"
-    elif 50 <= edad <= 54: return "F"
-    elif 55 <= edad <= 59: return "G"
-    elif 60 <= edad <= 64: return "H"
-    elif 65 <= edad <= 69: return "I"
-    elif 70 <= edad <= 74: return "J"
-    else: return "K+"
-
 def intentar_desbloqueo():
     try:
         sec_user = st.secrets["admin"]["usuario"]
@@ -183,69 +112,18 @@ def intentar_desbloqueo():
 
 def guardar_seguimiento_inicio(id_rutina, id_nadador):
     try:
-        df_seg = conn.read(worksheet="Rutinas_Seguimiento", ttl=0)
-        
         # OBTENER HORA ARGENTINA (UTC-3)
         ahora_arg = datetime.now(timezone.utc) - timedelta(hours=3)
         hora_str = ahora_arg.strftime("%Y-%m-%d %H:%M:%S")
         
-        nuevo_registro = pd.DataFrame([{
-            "id_rutina": id_rutina,
-            "codnadador": int(id_nadador),
-            "fecha_realizada": hora_str
-        }])
-        df_final = pd.concat([df_seg, nuevo_registro], ignore_index=True)
-        conn.update(worksheet="Rutinas_Seguimiento", data=df_final)
-        
-        cargar_datos_rutinas.clear()
+        # La marca queda en la cola de escritura y se ve enseguida en las lecturas
+        marcar_realizada(id_rutina, int(id_nadador), hora_str)
         
         return True
     except Exception as e:
         st.error(f"Error al guardar: {e}")
         return False
 
-# FUNCIONES PARA BUSCAR TIEMPOS EN INSCRIPCIONES (COMO EN AGENDA)
-def tiempo_a_seg(t_str):
-    try:
-        partes = str(t_str).replace('.', ':').split(':')
-        return float(partes[0]) * 60 + float(partes[1]) + (float(partes[2])/100 if len(partes)>2 else 0)
-    except: return 999999.0
-
-def buscar_mejor_tiempo(prueba, df_t_nadador):
-    if df_t_nadador.empty: return ""
-    p_lower = prueba.lower()
-    
-    dist_k = ""
-    if "50m" in p_lower or " 50" in p_lower: dist_k = "50"
-    if "100m" in p_lower or " 100" in p_lower: dist_k = "100"
-    if "200m" in p_lower or " 200" in p_lower: dist_k = "200"
-    if "400m" in p_lower or " 400" in p_lower: dist_k = "400"
-    if "800m" in p_lower or " 800" in p_lower: dist_k = "800"
-    if "1500m" in p_lower or " 1500" in p_lower: dist_k = "1500"
-    if "4x50" in p_lower: dist_k = "4x50"
-    if "4x100" in p_lower: dist_k = "4x100"
-    
-    est_k = []
-    if "libre" in p_lower or "crol" in p_lower: est_k = ["libre", "crol"]
-    elif "espalda" in p_lower: est_k = ["espalda"]
-    elif "pecho" in p_lower: est_k = ["pecho"]
-    elif "mariposa" in p_lower: est_k = ["mariposa"]
-    elif "combinado" in p_lower or "medley" in p_lower: est_k = ["combinado", "medley"]
-    
-    if not dist_k or not est_k: return ""
-    
-    try:
-        mask_dist = df_t_nadador['dist_desc'].str.lower().str.contains(dist_k, na=False)
-        mask_est = df_t_nadador['estilo_desc'].str.lower().apply(lambda x: any(k in str(x) for k in est_k))
-        
-        matches = df_t_nadador[mask_dist & mask_est]
-        if not matches.empty:
-            best = matches.loc[matches['segundos'].idxmin()]
-            return best['tiempo']
-    except:
-        return ""
-    return ""
-
 # --- VISUALIZACIÓN ---
 
 # BANNER TÍTULO
@@ -367,13 +245,12 @@ if db and st.session_state.user_id:
     user_id = st.session_state.user_id
     me = db['nadadores'][db['nadadores']['codnadador'] == user_id].iloc[0]
     
-    try: edad = datetime.now().year - pd.to_datetime(me['fechanac']).year
-    except: edad = 0
-    cat = calcular_cat_exacta(edad, db['categorias'])
+    # Edad y categoría al 31/12 del año en curso, de la tabla por año de comun.edades
+    padron = padron_edades()
+    edad = padron.edad(user_id) or 0
+    cat = padron.categoria(user_id)
     
-    df_t = db['tiempos'].copy(); df_r = db['relevos'].copy()
-    df_t['posicion'] = pd.to_numeric(df_t['posicion'], errors='coerce').fillna(0).astype(int)
-    df_r['posicion'] = pd.to_numeric(df_r['posicion'], errors='coerce').fillna(0).astype(int)
+    df_t = db['tiempos']; df_r = db['relevos']
     
     mis_oros = len(df_t[(df_t['codnadador']==user_id)&(df_t['posicion']==1)]) + len(df_r[((df_r['nadador_1']==user_id)|(df_r['nadador_2']==user_id)|(df_r['nadador_3']==user_id)|(df_r['nadador_4']==user_id))&(df_r['posicion']==1)])
     mis_platas = len(df_t[(df_t['codnadador']==user_id)&(df_t['posicion']==2)]) + len(df_r[((df_r['nadador_1']==user_id)|(df_r['nadador_2']==user_id)|(df_r['nadador_3']==user_id)|(df_r['nadador_4']==user_id))&(df_r['posicion']==2)])
@@ -509,21 +386,6 @@ if db and st.session_state.user_id:
                             vista_eventos.append((row, esta, ins_user))
             
             if vista_eventos:
-                # PREPARAMOS EL HISTORIAL DE TIEMPOS DEL NADADOR
-                df_t_nadador = pd.DataFrame()
-                df_t_base = db.get('tiempos')
-                df_estilos = db.get('estilos')
-                df_dist = db.get('distancias')
-                
-                if df_t_base is not None and not df_t_base.empty:
-                    df_t_nadador = df_t_base[df_t_base['codnadador'] == user_id].copy()
-                    if not df_t_nadador.empty:
-                        if df_estilos is not None and not df_estilos.empty:
-                            df_t_nadador = df_t_nadador.merge(df_estilos.rename(columns={'descripcion': 'estilo_desc'}), on='codestilo', how='left')
-                        if df_dist is not None and not df_dist.empty:
-                            df_t_nadador = df_t_nadador.merge(df_dist.rename(columns={'descripcion': 'dist_desc'}), on='coddistancia', how='left')
-                        df_t_nadador['segundos'] = df_t_nadador['tiempo'].apply(lambda x: tiempo_a_seg(x) if pd.notnull(x) else 999999.0)
-
                 st.markdown("<h5 style='text-align: center; color: #E30613; margin-bottom: 15px;'>🏆 MIS TORNEOS E INSCRIPCIONES</h5>", unsafe_allow_html=True)
                 
                 for row, esta, ins_user in vista_eventos:
@@ -568,9 +430,12 @@ if db and st.session_state.user_id:
                         
                         if esta:
                             # TARJETA INFORMATIVA CON CHIPS + MEJORES TIEMPOS
+                            # Mejores tiempos de todas sus pruebas en un solo join (comun.pruebas)
+                            try: semillas = tiempos_de_inscripcion(pd.DataFrame({'codnadador': [user_id], 'pruebas': [", ".join(prev)]}))
+                            except: semillas = pd.Series(dtype=object)
                             chips_html = ""
                             for p in prev:
-                                mejor_tiempo = buscar_mejor_tiempo(p, df_t_nadador)
+                                mejor_tiempo = semillas.get((user_id, p), "")
                                 tiempo_badge = f" <span style='color:#FFD700; font-family:monospace; font-weight:bold;'>({mejor_tiempo})</span>" if mejor_tiempo else ""
                                 chips_html += f"<span style='background-color:#444; color:#fff; padding:4px 10px; border-radius:15px; font-size:12px; margin-right:6px; margin-bottom:6px; display:inline-block; border:1px solid #555;'>{p}{tiempo_badge}</span>"
                             
@@ -724,14 +589,14 @@ if db and st.session_state.user_id:
     """, unsafe_allow_html=True)
     
     # 5. GRÁFICOS
-    df_n = db['nadadores'].copy()
-    df_n['Anio'] = pd.to_datetime(df_n['fechanac'], errors='coerce').dt.year
-    df_n['Categoria'] = df_n['Anio'].apply(calcular_categoria_grafico)
+    df_n = db['nadadores'].copy(deep=False)
+    # Categoría de todo el padrón, ya resuelta para el año en curso
+    df_n['Categoria'] = padron_edades().categorias(df_n['codnadador'])
     colors = alt.Scale(domain=['M', 'F'], range=['#1f77b4', '#FF69B4'])
     
     t_c, t_g = st.tabs(["Categorías Master", "Género"])
     with t_c:
-        orden = ["Juvenil", "PRE", "A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K+"]
+        orden = orden_categorias()
         st.altair_chart(alt.Chart(df_n).mark_bar(cornerRadius=3).encode(x=alt.X('Categoria', sort=orden, title=None), y=alt.Y('count()', title=None), color=alt.Color('codgenero', legend=None, scale=colors)).properties(height=200), use_container_width=True)
     with t_g:
         base = alt.Chart(df_n).encode(theta=alt.Theta("count()", stack=True))
@@ -1,10 +1,14 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
-from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
 
+from comun.datos import cargar_hojas
+from comun.edades import edades_relevos, padron_edades
+from comun.esquemas import texto_fecha
+from comun.marcas import marcas_personales
+from comun.tiempos import texto_tiempo
+
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Base de Datos", layout="centered")
 
@@ -67,80 +71,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-conn = st.connection("gsheets", type=GSheetsConnection)
-
 # --- 2. CARGA DE DATOS ---
-@st.cache_data(ttl="15m")
-def cargar_visualizacion():
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "tiempos": conn.read(worksheet="Tiempos"),
-            "relevos": conn.read(worksheet="Relevos"),
-            "estilos": conn.read(worksheet="Estilos"),
-            "distancias": conn.read(worksheet="Distancias"),
-            "piletas": conn.read(worksheet="Piletas"),
-            "categorias": conn.read(worksheet="Categorias"),
-            "cat_relevos": conn.read(worksheet="Categorias_Relevos")
-        }
-    except Exception as e: return None
-
-data = cargar_visualizacion()
+data = cargar_hojas("nadadores", "tiempos", "relevos", "estilos", "distancias", "piletas", "categorias", "cat_relevos", "tiempos_base")
 if not data: st.stop()
 
 # --- 3. PROCESAMIENTO GLOBAL ---
-df_nad = data['nadadores'].copy()
+df_nad = data['nadadores'].copy(deep=False)
 df_nad['Nombre Completo'] = df_nad['apellido'].astype(str).str.upper() + ", " + df_nad['nombre'].astype(str)
 dict_id_nombre = df_nad.set_index('codnadador')['Nombre Completo'].to_dict()
-df_nad['anio_nac'] = pd.to_datetime(df_nad['fechanac'], errors='coerce').dt.year.fillna(0).astype(int)
-dict_id_anionac = df_nad.set_index('codnadador')['anio_nac'].to_dict()
-
-def tiempo_a_segundos(t_str):
-    try:
-        if not isinstance(t_str, str) or ":" not in t_str: return None
-        p = t_str.replace('.', ':').split(':')
-        val = float(p[0])*60 + float(p[1]) + (float(p[2])/100 if len(p)>2 else 0)
-        return val
-    except: return None
-
-def seg_a_tiempo(seg):
-    if seg is None or pd.isna(seg): return "-"
-    try:
-        m = int(seg // 60)
-        s = int(seg % 60)
-        c = int((seg % 1) * 100)
-        return f"{m:02d}:{s:02d}.{c:02d}"
-    except: return "-"
-
-def asignar_cat(edad):
-    try:
-        for _, r in data['categorias'].iterrows():
-            if r['edad_min'] <= edad <= r['edad_max']: return r['nombre_cat']
-        return "-"
-    except: return "-"
+# Edades Master por año y categoría de cada posta, resueltas una vez para todo el padrón (comun.edades)
+padron = padron_edades()
+grupos_relevo = edades_relevos()['categoria']
 
-def calcular_grupo_relevo(row_rel, df_cats):
-    try:
-        suma_edades = 0
-        anio_competencia = pd.to_datetime(row_rel['fecha']).year
-        for k in range(1, 5):
-            nid = row_rel[f'nadador_{k}']
-            anio_nac = dict_id_anionac.get(nid, 0)
-            if anio_nac > 0:
-                suma_edades += (anio_competencia - anio_nac)
-        
-        reglamento = row_rel.get('tipo_reglamento', 'FED') 
-        filtro = df_cats[
-            (df_cats['tipo_reglamento'] == reglamento) & 
-            (df_cats['suma_min'] <= suma_edades) & 
-            (df_cats['suma_max'] >= suma_edades)
-        ]
-        if not filtro.empty: return filtro.iloc[0]['descripcion']
-        return f"Suma {suma_edades}"
+def calcular_grupo_relevo(row_rel):
+    try: return grupos_relevo.get(row_rel['id_relevo'], "-")
     except: return "-"
 
 # --- UNIFICACIÓN DE DATOS ---
-df_full = data['tiempos'].copy()
+nombres_estilo = dict(zip(data['estilos']['codestilo'].astype(str), data['estilos']['descripcion']))
+nombres_distancia = dict(zip(data['distancias']['coddistancia'].astype(str), data['distancias']['descripcion']))
+
+df_full = data['tiempos'].copy(deep=False)
 
 if 'club' in df_full.columns: df_full = df_full.drop(columns=['club'])
 
@@ -158,10 +109,8 @@ else: df_full['sede'] = '-'
 
 if 'medida' not in df_full.columns: df_full['medida'] = '-'
 
-# Lógica Medallero
-df_t_c = data['tiempos'].copy(); df_r_c = data['relevos'].copy()
-df_t_c['posicion'] = pd.to_numeric(df_t_c['posicion'], errors='coerce').fillna(0).astype(int)
-df_r_c['posicion'] = pd.to_numeric(df_r_c['posicion'], errors='coerce').fillna(0).astype(int)
+# Lógica Medallero (posicion ya viene entera desde el snapshot)
+df_t_c = data['tiempos']; df_r_c = data['relevos']
 
 med_ind = df_t_c[df_t_c['posicion'].isin([1,2,3])].groupby(['codnadador', 'posicion']).size().unstack(fill_value=0)
 dfs_rel = [df_r_c[['nadador_'+str(i), 'posicion']].rename(columns={'nadador_'+str(i):'codnadador'}) for i in range(1,5)]
@@ -172,7 +121,8 @@ for p in [1,2,3]:
     if p not in medallero.columns: medallero[p] = 0
 medallero = medallero.rename(columns={1: 'Oro', 2: 'Plata', 3: 'Bronce'})
 
-df_view = df_nad.merge(medallero, left_on='codnadador', right_index=True, how='left').fillna(0)
+df_view = df_nad.merge(medallero, left_on='codnadador', right_index=True, how='left')
+df_view[['Oro', 'Plata', 'Bronce']] = df_view[['Oro', 'Plata', 'Bronce']].fillna(0)
 df_view['Total'] = df_view['Oro'] + df_view['Plata'] + df_view['Bronce']
 
 
@@ -186,16 +136,10 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
     info = df_nad[df_nad['codnadador'] == target_id].iloc[0]
     
     # Datos básicos nadador
-    try: 
-        nac = pd.to_datetime(info['fechanac'])
-        anio_nacimiento_nadador = nac.year
-        edad_actual = datetime.now().year - anio_nacimiento_nadador
-        nac_str = nac.strftime('%d/%m/%Y')
-    except: 
-        anio_nacimiento_nadador = 0
-        edad_actual = 0; nac_str = "-"
-    
-    cat_actual = asignar_cat(edad_actual)
+    try: nac_str = info['fechanac'].strftime('%d/%m/%Y')
+    except: nac_str = "-"
+    edad_actual = padron.edad(target_id) or 0
+    cat_actual = padron.categoria(target_id)
     
     row_m = df_view[df_view['codnadador'] == target_id]
     if not row_m.empty:
@@ -222,8 +166,11 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
     # --- MEJORES MARCAS ---
     if not mis_t.empty:
         st.subheader("✨ Mejores Marcas (PB)")
-        mis_t['segundos'] = mis_t['tiempo'].apply(tiempo_a_segundos)
-        pbs = mis_t.loc[mis_t.groupby(['Estilo', 'Distancia'])['segundos'].idxmin()].sort_values(['Estilo', 'segundos'])
+        # Mejor marca por estilo y distancia, de la tabla mantenida en comun.marcas
+        pbs = marcas_personales().del_nadador(target_id)
+        pbs['Estilo'] = pbs['codestilo'].map(nombres_estilo)
+        pbs['Distancia'] = pbs['coddistancia'].map(nombres_distancia)
+        pbs = pbs.sort_values(['Estilo', 'tiempo_cs'])
         
         for estilo in pbs['Estilo'].unique():
             st.markdown(f"<div class='pb-style-header'>{estilo}</div>", unsafe_allow_html=True)
@@ -231,7 +178,7 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
                 st.markdown(f"""
                 <div class="pb-row">
                     <span class="pb-dist">{r['Distancia']}</span>
-                    <span class="pb-time">{r['tiempo']}</span>
+                    <span class="pb-time">{r['tiempo']}{f" <small>· {int(r['puntos'])} pts</small>" if pd.notna(r['puntos']) else ""}</span>
                 </div>""", unsafe_allow_html=True)
         st.divider()
 
@@ -252,19 +199,16 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
             df_graph = mis_t[(mis_t['Estilo'] == g_est) & (mis_t['Distancia'] == g_dist)].sort_values('fecha')
             
             # Calcular Promedio
-            promedio_seg = df_graph['segundos'].mean()
-            tiempo_promedio = seg_a_tiempo(promedio_seg)
+            tiempo_promedio = texto_tiempo(df_graph['tiempo_cs'].mean())
             
             st.markdown(f"**⏱️ Tiempo Promedio:** {tiempo_promedio}")
 
             # Calcular categoría histórica para tooltip
-            df_graph['fecha_dt'] = pd.to_datetime(df_graph['fecha'])
-            if anio_nacimiento_nadador > 0:
-                df_graph['cat_hist'] = df_graph['fecha_dt'].apply(lambda x: asignar_cat(x.year - anio_nacimiento_nadador))
-            else: df_graph['cat_hist'] = "-"
+            df_graph['fecha_dt'] = df_graph['fecha']
+            df_graph['cat_hist'] = padron.categorias_en_fechas(pd.Series(target_id, index=df_graph.index), df_graph['fecha_dt'])
 
             # Eje Y: Tiempo (Fake date para plot)
-            df_graph['TimeObj'] = pd.to_datetime('2024-01-01') + pd.to_timedelta(df_graph['segundos'], unit='s')
+            df_graph['TimeObj'] = pd.to_datetime('2024-01-01') + pd.to_timedelta(df_graph['tiempo_cs'].astype('float64') * 10, unit='ms')
             
             fig = px.line(df_graph, x='fecha', y='TimeObj', markers=True, template="plotly_dark",
                           hover_data={
@@ -308,10 +252,7 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
         medida_txt = r.get('medida', '-')
         
         # Calcular categoría en esa fecha
-        try:
-            anio_carrera = pd.to_datetime(r['fecha']).year
-            edad_en_carrera = anio_carrera - anio_nacimiento_nadador
-            cat_torneo = asignar_cat(edad_en_carrera)
+        try: cat_torneo = padron.categoria(target_id, r['fecha'])
         except: cat_torneo = "-"
 
         # MODIFICADO: Fuente 14px en fecha/sede y 13px en categoría
@@ -320,7 +261,7 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
             <div style="display:flex; justify-content:space-between; align-items: flex-start;">
                 <div style="flex:1;">
                     <div style="font-weight:bold; color:white; font-size:15px;">{r['Distancia']} {r['Estilo']}</div>
-                    <div style="font-size:14px; color:#aaa; margin-top:2px;">📅 {r['fecha']} • {sede_txt} ({medida_txt})</div>
+                    <div style="font-size:14px; color:#aaa; margin-top:2px;">📅 {texto_fecha(r['fecha'])} • {sede_txt} ({medida_txt})</div>
                 </div>
                 <div style="text-align: right; min-width: 100px;">
                     <div style="font-family:monospace; font-weight:bold; color:#4CAF50; font-size:18px;">{r['tiempo']}</div>
@@ -333,7 +274,7 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
 
     # 5. MIS RELEVOS
     st.subheader("🏊‍♂️ Mis Relevos")
-    mr_base = data['relevos'].copy()
+    mr_base = data['relevos'].copy(deep=False)
     cond_rel = (mr_base['nadador_1'] == target_id) | (mr_base['nadador_2'] == target_id) | (mr_base['nadador_3'] == target_id) | (mr_base['nadador_4'] == target_id)
     mis_relevos = mr_base[cond_rel].copy()
     
@@ -354,7 +295,7 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
         mis_relevos = mis_relevos.sort_values('fecha', ascending=False)
         
         for _, r in mis_relevos.iterrows():
-            grupo_txt = calcular_grupo_relevo(r, data['cat_relevos'])
+            grupo_txt = calcular_grupo_relevo(r)
             html_grid = ""
             for k in range(1, 5):
                 nid = r[f'nadador_{k}']
@@ -388,7 +329,7 @@ def render_tab_ficha(target_id, unique_key_suffix=""):
                     </div>
                 </div>
                 <div class="relay-meta" style="margin-top:-3px; margin-bottom:8px;">
-                    <span>📅 {r['fecha']} • {sede_r} ({r['medida']})</span>
+                    <span>📅 {texto_fecha(r['fecha'])} • {sede_r} ({r['medida']})</span>
                 </div>
                 <div class="swimmer-grid">{html_grid}</div>
             </div>""", unsafe_allow_html=True)
@@ -401,9 +342,8 @@ def render_tab_padron():
     if filtro: df_show = df_show[df_show['Nombre Completo'].str.contains(filtro.upper())]
 
     for _, row in df_show.head(25).iterrows():
-        try: edad = datetime.now().year - pd.to_datetime(row['fechanac']).year
-        except: edad = 0
-        cat = asignar_cat(edad)
+        edad = padron.edad(row['codnadador']) or 0
+        cat = padron.categoria(row['codnadador'])
         o, p, b, t = int(row.get('Oro',0)), int(row.get('Plata',0)), int(row.get('Bronce',0)), int(row.get('Total',0))
         
         st.markdown(f"""
@@ -428,7 +368,7 @@ def render_tab_padron():
 
 def render_tab_relevos_general():
     st.markdown("### Historial de Postas")
-    mr_all = data['relevos'].copy()
+    mr_all = data['relevos'].copy(deep=False)
     if not mr_all.empty:
         mr_all = mr_all.merge(data['estilos'], on='codestilo', how='left')
         mr_all = mr_all.merge(data['distancias'], on='coddistancia', how='left')
@@ -451,7 +391,7 @@ def render_tab_relevos_general():
         if fg_gen != "Todos": mr_all = mr_all[mr_all['codgenero'] == fg_gen]
         
         for _, r in mr_all.sort_values('fecha', ascending=False).head(20).iterrows():
-            grupo_txt = calcular_grupo_relevo(r, data['cat_relevos'])
+            grupo_txt = calcular_grupo_relevo(r)
             html_grid = ""
             for k in range(1, 5):
                 nid = r[f'nadador_{k}']
@@ -484,7 +424,7 @@ def render_tab_relevos_general():
                     </div>
                 </div>
                 <div class="relay-meta" style="margin-top:-3px; margin-bottom:8px;">
-                    <span>📅 {r['fecha']} • {sede_r} ({r['medida']})</span>
+                    <span>📅 {texto_fecha(r['fecha'])} • {sede_r} ({r['medida']})</span>
                 </div>
                 <div class="swimmer-grid">{html_grid}</div>
             </div>""", unsafe_allow_html=True)
@@ -1,8 +1,16 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
-from datetime import datetime
-import itertools
+import numpy as np
+
+from comun.categorias import bandas_relevos, categoria_relevo, categorias_relevo
+from comun.datos import cargar_hojas, tabla_derivada
+from comun.edades import padron_edades
+from comun.esquemas import texto_fecha
+from comun.marcas import marcas_personales
+from comun.nadadores import directorio_nadadores
+from comun.postas import SIN_TIEMPO, matriz_costos, mejores_por_banda, plan_postas, totales_por_asignacion
+from comun.relevos import historial_postas
+from comun.tiempos import texto_tiempo
 
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Simulador Pro - NOB", layout="wide")
@@ -13,36 +21,24 @@ if "role" not in st.session_state or not st.session_state.role:
 
 st.markdown("<h3 style='text-align: center; color: #E30613;'>🔴⚫ SIMULADOR DE ESTRATEGIA - NOB</h3>", unsafe_allow_html=True)
 
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-# --- FUNCIÓN DE TIEMPO ---
-def tiempo_a_seg(t_str):
-    try:
-        partes = str(t_str).replace('.', ':').split(':')
-        return float(partes[0]) * 60 + float(partes[1]) + (float(partes[2])/100 if len(partes)>2 else 0)
-    except: return 999.0
-
 # --- 3. CARGA DE DATOS ---
-@st.cache_data(ttl="15m")
+@tabla_derivada("nadadores")
+def preparar_nadadores_sim(df_nadadores):
+    df_n = df_nadadores.copy(deep=False)
+    df_n['Nombre Completo'] = df_n['codnadador'].map(directorio_nadadores().etiquetas)
+    return df_n
+
+def mejores_50_sim():
+    # Mejor marca en 50m por nadador y estilo, de la tabla mantenida en comun.marcas.
+    # Las de pileta corta se comparan por su equivalente en 50m (comun.conversion)
+    df_t = marcas_personales().mejores_por_prueba('D1', normalizado=True)
+    return df_t.assign(segundos_calc=df_t['tiempo_norm_cs'].astype('float64') / 100)
+
 def cargar_datos_sim():
+    data = cargar_hojas("nadadores", "tiempos", "relevos", "cat_relevos", "piletas", "estilos", "distancias", "categorias")
+    if not data: return None, None, None
     try:
-        data = {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "tiempos": conn.read(worksheet="Tiempos"),
-            "relevos": conn.read(worksheet="Relevos"),
-            "cat_relevos": conn.read(worksheet="Categorias_Relevos"),
-            "piletas": conn.read(worksheet="Piletas")
-        }
-        df_n = data['nadadores'].copy()
-        df_n['Nombre Completo'] = df_n['apellido'].astype(str).str.upper() + ", " + df_n['nombre'].astype(str)
-        df_n['Edad_Master'] = datetime.now().year - pd.to_datetime(df_n['fechanac']).dt.year
-        
-        # Filtrar mejores tiempos en 50m
-        df_t = data['tiempos'][data['tiempos']['coddistancia'] == 'D1'].copy()
-        df_t['segundos_calc'] = df_t['tiempo'].apply(tiempo_a_seg)
-        df_t = df_t.sort_values(by=['codnadador', 'codestilo', 'segundos_calc'], ascending=[True, True, True])
-        df_t_50_best = df_t.drop_duplicates(subset=['codnadador', 'codestilo'], keep='first')
-        
+        df_n, df_t_50_best = preparar_nadadores_sim(), mejores_50_sim()
         return data, df_n, df_t_50_best
     except Exception as e:
         return None, None, None
@@ -51,29 +47,56 @@ data, df_nad, df_tiempos_50 = cargar_datos_sim()
 if not data: st.stop()
 
 dict_piletas = data['piletas'].set_index('codpileta').to_dict('index')
+directorio = directorio_nadadores()
+# Marcas de 50m por código, armadas una vez: el pool se resuelve por dict, sin filtrar la hoja.
+# Las edades Master salen de la tabla por año de comun.edades
+dict_t50 = {int(cod): dict(zip(g['codestilo'], g['segundos_calc'])) for cod, g in df_tiempos_50.groupby('codnadador')}
+padron = padron_edades()
+
+def ficha_sim(nombre):
+    """Marcas de 50m por estilo más género y edad del nadador (por etiqueta)."""
+    cod = directorio.codigo(nombre)
+    return {**dict_t50.get(cod, {}), 'gen': directorio.generos.get(cod, ""), 'edad': padron.edad(cod) or 0}
 
 # --- 4. FUNCIONES TÉCNICAS ADICIONALES ---
 def seg_a_tiempo(seg):
     if seg >= 900: return "S/T"
-    return f"{int(seg // 60):02d}:{int(seg % 60):02d}.{int((seg % 1) * 100):02d}"
+    return texto_tiempo(seg * 100)
 
 def get_cat_info(suma, reg):
-    regs = data['cat_relevos'][data['cat_relevos']['tipo_reglamento'] == reg]
-    for _, r in regs.iterrows():
-        if r['suma_min'] <= suma <= r['suma_max']: 
-            return r['descripcion'], r['suma_min']
+    descripcion, suma_min = categoria_relevo(suma, reg)
+    if descripcion: return descripcion, suma_min
     return f"Suma {int(suma)}", suma
 
+# Tiempo de podio de referencia por género y techo de suma de edades
+REFERENCIAS_PODIO = {"M": {119: 112, 159: 115, 199: 119, 239: 130}, "F": {119: 132, 159: 135, 199: 145, 239: 165}, "X": {119: 120, 159: 124, 199: 128, 239: 145}}
+
+def meta_podio(suma_edades, genero):
+    """Tiempo de podio de referencia (segundos) para esa suma, o None."""
+    benchmarks = REFERENCIAS_PODIO.get(genero, {})
+    cat_techo = next((l for l in sorted(benchmarks) if suma_edades <= l), 999)
+    return benchmarks.get(cat_techo)
+
 def analizar_competitividad(tiempo_seg, suma_edades, genero):
-    benchmarks = {"M": {119: 112, 159: 115, 199: 119, 239: 130}, "F": {119: 132, 159: 135, 199: 145, 239: 165}, "X": {119: 120, 159: 124, 199: 128, 239: 145}}
-    limites = sorted(benchmarks.get(genero, {}).keys())
-    cat_techo = next((l for l in limites if suma_edades <= l), 999)
-    if cat_techo in benchmarks.get(genero, {}):
-        meta = benchmarks[genero][cat_techo]
+    meta = meta_podio(suma_edades, genero)
+    if meta is not None:
         if tiempo_seg <= meta: return f"🔥 **NIVEL PODIO.** Tiempo de referencia: {seg_a_tiempo(meta)}."
         elif tiempo_seg <= meta + 10: return f"✨ **COMPETITIVO.** Cerca de marcas de podio."
     return ""
 
+def texto_estilo_antecedente(ant, sin_estilo):
+    """Estilo nadado en una posta del historial, para mostrarlo en las observaciones."""
+    estilo_val = ant.get('estilo', ant.get('prueba', ant.get('codestilo', '')))
+    estilo_str = str(estilo_val).strip().upper()
+    if 'COMB' in estilo_str or 'MEDLEY' in estilo_str: return "Combinado (Medley)"
+    elif 'LIBR' in estilo_str or 'CROL' in estilo_str or 'E4' in estilo_str: return "Libre (Crol)"
+    elif estilo_str and estilo_str != 'NAN': return estilo_val
+    return sin_estilo
+
+def buscar_antecedente(nombres):
+    """Mejor posta que esos cuatro nadadores ya nadaron juntos (búsqueda por cuarteto), o None."""
+    return historial_postas().mejor([directorio.codigo(n) for n in nombres])
+
 def render_tarjeta_resumen(tiempo, categoria, suma, dark=False):
     bg = "#1e1e1e" if dark else "#f0f2f6"
     text = "#ffffff" if dark else "#31333F"
@@ -129,6 +152,10 @@ def guardar_equipo_borrador(equipo_dict):
     if "pool_opt_g" in st.session_state:
         st.session_state.current_pool = [n for n in st.session_state.pool_opt_g if n not in equipo_dict['eq']]
 
+def guardar_plan_borrador(equipos):
+    for equipo_dict in equipos:
+        guardar_equipo_borrador(equipo_dict)
+
 def eliminar_equipo_borrador(index):
     equipo_recuperado = st.session_state.equipos_borrador.pop(index)
     if "pool_opt_g" in st.session_state:
@@ -164,11 +191,11 @@ if btn_manual:
         st.error("⛔ **Error:** Nadador repetido. El equipo debe tener 4 integrantes distintos.")
     else:
         with st.spinner("Calculando..."):
-            m_loc = {n: {r['codestilo']: r['segundos_calc'] for _, r in df_tiempos_50[df_tiempos_50['codnadador'] == df_nad[df_nad['Nombre Completo'] == n]['codnadador'].iloc[0]].iterrows()} for n in n_sel}
+            m_loc = {n: ficha_sim(n) for n in n_sel}
             
             tiempos_p = [m_loc[n_sel[i]].get(legs[i][1], 999.0) for i in range(4)]
             total = sum(tiempos_p)
-            se = sum([df_nad[df_nad['Nombre Completo'] == n]['Edad_Master'].iloc[0] for n in n_sel])
+            se = sum([m_loc[n]['edad'] for n in n_sel])
             cat_n, _ = get_cat_info(se, s_reg_m)
 
             with res_manual_container:
@@ -184,27 +211,17 @@ if btn_manual:
                 comp = analizar_competitividad(total, se, s_gen)
                 if comp: obs_lista.append(comp)
                 
-                ids_a = sorted([int(df_nad[df_nad['Nombre Completo'] == n]['codnadador'].iloc[0]) for n in n_sel])
-                hist = data['relevos'][data['relevos'].apply(lambda r: sorted([int(r['nadador_1']), int(r['nadador_2']), int(r['nadador_3']), int(r['nadador_4'])]) == ids_a if pd.notnull(r['nadador_1']) else False, axis=1)]
-                if not hist.empty:
-                    ant = hist.sort_values('tiempo_final').iloc[0]
+                ant = buscar_antecedente(n_sel)
+                if ant is not None:
                     ip = dict_piletas.get(ant['codpileta'], {"club": "Sede ?", "medida": "-"})
+                    estilo_texto = texto_estilo_antecedente(ant, "esa formación")
                     
-                    # Detectar el estilo nadado en el antecedente
-                    estilo_val = ant.get('estilo', ant.get('prueba', ant.get('codestilo', '')))
-                    estilo_str = str(estilo_val).strip().upper()
-                    if 'COMB' in estilo_str or 'MEDLEY' in estilo_str: estilo_texto = "Combinado (Medley)"
-                    elif 'LIBR' in estilo_str or 'CROL' in estilo_str or 'E4' in estilo_str: estilo_texto = "Libre (Crol)"
-                    elif estilo_str and estilo_str != 'NAN': estilo_texto = estilo_val
-                    else: estilo_texto = "esa formación"
-                    
-                    obs_lista.append(f"⏱️ **ANTECEDENTE:** Marcaron **{ant['tiempo_final']}** nadando **{estilo_texto}** en {ip['club']} ({ip['medida']}) el {ant['fecha']}.")
+                    obs_lista.append(f"⏱️ **ANTECEDENTE:** Marcaron **{ant['tiempo_final']}** nadando **{estilo_texto}** en {ip['club']} ({ip['medida']}) el {texto_fecha(ant['fecha'])}.")
                 
-                mejor_t, mejor_o = total, n_sel
-                for p in itertools.permutations(n_sel):
-                    tp = sum([m_loc[p[idx]].get(legs[idx][1], 999.0) for idx in range(4)])
-                    if tp < (mejor_t - 0.05): mejor_t, mejor_o = tp, p
-                if mejor_t < total:
+                # Las 24 asignaciones de la formación elegida, en una sola operación
+                costos_m = matriz_costos([m_loc[n] for n in n_sel], [l[1] for l in legs])
+                mejor_t = totales_por_asignacion(costos_m, [[0, 1, 2, 3]]).min()
+                if mejor_t < (total - 0.05):
                     obs_lista.append(f"💡 **ORDEN:** Bajan a **{seg_a_tiempo(mejor_t)}** alternando orden de salida.")
 
                 if obs_lista:
@@ -213,6 +230,8 @@ if btn_manual:
                     for item in obs_lista: st.info(item)
 
 # --- 6. SIMULADOR POR GRUPO ---
+TOP_POR_CATEGORIA = 10  # formaciones que se buscan (y muestran) por categoría
+
 st.divider()
 
 c_title, c_btn = st.columns([0.8, 0.2])
@@ -228,7 +247,7 @@ with c_btn:
         st.rerun()
 
 with st.container(border=True):
-    lista_nadadores_completa = sorted(df_nad['Nombre Completo'].tolist())
+    lista_nadadores_completa = directorio.nombres()
     
     nadadores_en_borrador = set()
     for equipo in st.session_state.equipos_borrador:
@@ -254,30 +273,47 @@ with st.container(border=True):
     o_gen_sel = c3.radio("Género Prueba", ["Masculino (M)", "Femenino (F)", "Mixto (2M-2F)"], horizontal=True)
     o_gen = "X" if "Mixto" in o_gen_sel else ("M" if "(M)" in o_gen_sel else "F")
 
+    # Búsqueda dirigida: sólo los equipos cuya suma de edades cae en la categoría elegida
+    bandas = bandas_relevos().get(str(o_reg))
+    opciones_cat = ["Todas"] + (list(bandas.etiquetas) if bandas is not None else [])
+    o_cat = st.selectbox("Categoría (suma de edades)", opciones_cat, key="o_cat_g")
+
 if st.button("🪄 Generar Estrategia Óptima", type="primary", use_container_width=True):
     if len(pool) < 4: st.warning("Seleccione al menos 4 nadadores del pool disponible.")
     else:
         with st.spinner("Calculando..."):
-            m_map = {n: {r['codestilo']: r['segundos_calc'] for _, r in df_tiempos_50[df_tiempos_50['codnadador'] == df_nad[df_nad['Nombre Completo'] == n]['codnadador'].iloc[0]].iterrows()} for n in pool}
-            for n in pool: m_map[n].update({'gen': df_nad[df_nad['Nombre Completo'] == n]['codgenero'].iloc[0], 'edad': df_nad[df_nad['Nombre Completo'] == n]['Edad_Master'].iloc[0]})
+            m_map = {n: ficha_sim(n) for n in pool}
             legs_o = [("E2", "Espalda"), ("E3", "Pecho"), ("E1", "Mariposa"), ("E4", "Crol")] if "Medley" in o_tipo else [("E4", "Crol")]*4
             
-            combis = [c for c in itertools.combinations(pool, 4) if (o_gen=="M" and all(m_map[n]['gen']=="M" for n in c)) or (o_gen=="F" and all(m_map[n]['gen']=="F" for n in c)) or (o_gen=="X" and [m_map[n]['gen'] for n in c].count("M")==2)]
-            
-            resultados = []
-            for c in combis:
-                mt, mo = 999.0, None
-                for p in itertools.permutations(c):
-                    tp = sum([m_map[p[idx]].get(legs_o[idx][0], 999.0) for idx in range(4)])
-                    if tp < mt: mt, mo = tp, p
-                if mo:
-                    se = sum([m_map[n]['edad'] for n in mo])
-                    cn, s_min = get_cat_info(se, o_reg)
-                    resultados.append({'eq': mo, 't': mt, 'cat': cn, 'se': se, 's_min': s_min})
-
-            if not resultados: st.info("No se encontraron combinaciones válidas.")
+            # El pool como arreglos (matriz nadador x tramo, género, edad); se buscan
+            # sólo los mejores equipos de cada banda de suma de edades (comun.postas)
+            costos = matriz_costos([m_map[n] for n in pool], [l[0] for l in legs_o])
+            generos = np.array([m_map[n]['gen'] for n in pool], dtype=object)
+            edades = np.array([m_map[n]['edad'] for n in pool], dtype="int64")
+            if bandas is not None and len(bandas):
+                minimos, maximos = bandas.indice.left.to_numpy(), bandas.indice.right.to_numpy()
+                if o_cat != "Todas":
+                    elegida = list(bandas.etiquetas).index(o_cat)
+                    minimos, maximos = minimos[elegida:elegida + 1], maximos[elegida:elegida + 1]
+            else:
+                # Reglamento sin bandas cargadas: una sola, cada equipo queda como "Suma N"
+                minimos, maximos = [0], [np.inf]
+            por_banda = mejores_por_banda(costos, edades, generos, o_gen, minimos, maximos, TOP_POR_CATEGORIA)
+            ordenes = np.vstack([o for o, _ in por_banda])
+            totales = np.concatenate([t for _, t in por_banda])
+
+            if not len(ordenes): st.info("No se encontraron combinaciones válidas.")
             else:
-                df_res = pd.DataFrame(resultados).sort_values(by=['s_min', 't'])
+                df_res = pd.DataFrame({'eq': [tuple(pool[i] for i in o) for o in ordenes.tolist()],
+                                       't': totales, 'se': edades[ordenes].sum(axis=1)})
+                # Categoría de todos los equipos en una sola consulta a las bandas del reglamento
+                cats = categorias_relevo(df_res['se'], [o_reg] * len(df_res))
+                df_res['cat'] = cats['categoria'].where(cats['categoria'].notna(), "Suma " + df_res['se'].astype(int).astype(str))
+                df_res['s_min'] = cats['suma_min'].fillna(df_res['se'])
+                df_res = df_res.sort_values(by=['s_min', 't'])
+                # Antecedente de cada formación candidata: una búsqueda por cuarteto en el historial
+                codigos = np.array([directorio.codigo(n) or 0 for n in pool], dtype="int64")
+                df_res['ant'] = pd.Series(historial_postas().mejores(codigos[ordenes[df_res.index]]), index=df_res.index, dtype=object)
                 for cat_nombre, group in df_res.groupby('cat', sort=False):
                     st.markdown(f"### 🚩 {cat_nombre.upper()}")
                     for idx, row in group.head(2).iterrows():
@@ -299,22 +335,12 @@ if st.button("🪄 Generar Estrategia Óptima", type="primary", use_container_wi
                                 obs_lista_g.append(comp_g)
                                 
                             # 2. Historial de los 4 nadadores
-                            ids_eq = sorted([int(df_nad[df_nad['Nombre Completo'] == n]['codnadador'].iloc[0]) for n in row['eq']])
-                            hist_g = data['relevos'][data['relevos'].apply(lambda r: sorted([int(r['nadador_1']), int(r['nadador_2']), int(r['nadador_3']), int(r['nadador_4'])]) == ids_eq if pd.notnull(r['nadador_1']) else False, axis=1)]
-                            
-                            if not hist_g.empty:
-                                ant_g = hist_g.sort_values('tiempo_final').iloc[0]
+                            ant_g = row['ant']
+                            if ant_g is not None:
                                 ip_g = dict_piletas.get(ant_g['codpileta'], {"club": "Sede ?", "medida": "-"})
+                                estilo_texto_g = texto_estilo_antecedente(ant_g, "juntos")
                                 
-                                # Detectar el estilo nadado en el antecedente
-                                estilo_val_g = ant_g.get('estilo', ant_g.get('prueba', ant_g.get('codestilo', '')))
-                                estilo_str_g = str(estilo_val_g).strip().upper()
-                                if 'COMB' in estilo_str_g or 'MEDLEY' in estilo_str_g: estilo_texto_g = "Combinado (Medley)"
-                                elif 'LIBR' in estilo_str_g or 'CROL' in estilo_str_g or 'E4' in estilo_str_g: estilo_texto_g = "Libre (Crol)"
-                                elif estilo_str_g and estilo_str_g != 'NAN': estilo_texto_g = estilo_val_g
-                                else: estilo_texto_g = "juntos"
-                                
-                                obs_lista_g.append(f"⏱️ **YA NADARON JUNTOS:** Tienen un registro oficial de **{ant_g['tiempo_final']}** nadando **{estilo_texto_g}** en {ip_g['club']} ({ip_g['medida']}) el {ant_g['fecha']}.")
+                                obs_lista_g.append(f"⏱️ **YA NADARON JUNTOS:** Tienen un registro oficial de **{ant_g['tiempo_final']}** nadando **{estilo_texto_g}** en {ip_g['club']} ({ip_g['medida']}) el {texto_fecha(ant_g['fecha'])}.")
                             
                             # Renderizar observaciones si hay alguna
                             if obs_lista_g:
@@ -341,7 +367,103 @@ if st.button("🪄 Generar Estrategia Óptima", type="primary", use_container_wi
                                 args=(equipo_guardar,)
                             )
 
-# --- 7. GRILLA DE EQUIPOS GUARDADOS (BORRADOR) ---
+                    # El resto de las formaciones, con su antecedente si ya nadaron juntos
+                    otras = group.iloc[2:]
+                    if not otras.empty:
+                        with st.expander(f"Ver otras {len(otras)} formaciones"):
+                            st.dataframe(pd.DataFrame({
+                                'Equipo': [" / ".join(n.split(',')[0] for n in eq) for eq in otras['eq']],
+                                'Tiempo': [seg_a_tiempo(t) for t in otras['t']],
+                                'Suma': otras['se'].astype(int).to_numpy(),
+                                'Ya nadaron juntos': [f"{a['tiempo_final']} ({texto_fecha(a['fecha'])})" if a is not None else "-" for a in otras['ant']],
+                            }), hide_index=True, use_container_width=True)
+
+# --- 7. PLAN COMPLETO DEL TORNEO ---
+PRUEBAS_PLAN = {
+    "Libre M": ("Libre (Crol)", "M"), "Libre F": ("Libre (Crol)", "F"), "Libre Mixto": ("Libre (Crol)", "X"),
+    "Medley M": ("Combinado (Medley)", "M"), "Medley F": ("Combinado (Medley)", "F"), "Medley Mixto": ("Combinado (Medley)", "X"),
+}
+
+def medallas_esperadas(totales, suma_min, genero):
+    """1 si el tiempo es de podio, 0.5 si está a menos de 10s, 0 si no."""
+    meta = meta_podio(suma_min, genero)
+    if meta is None: return np.zeros(len(totales))
+    return np.where(totales <= meta, 1.0, np.where(totales <= meta + 10, 0.5, 0.0))
+
+st.divider()
+st.subheader("🗓️ Plan completo del torneo")
+st.caption("Arma todas las postas de una vez con el pool y el reglamento de arriba, en lugar de elegir equipo por equipo.")
+with st.container(border=True):
+    c1, c2, c3 = st.columns(3)
+    p_pruebas = c1.multiselect("Pruebas", list(PRUEBAS_PLAN), default=list(PRUEBAS_PLAN), key="plan_pruebas")
+    p_limite = c2.number_input("Máximo de postas por nadador", min_value=1, max_value=6, value=2, key="plan_limite")
+    p_cupo = c3.number_input("Equipos por prueba y categoría", min_value=1, max_value=3, value=1, key="plan_cupo")
+    p_objetivo = st.radio("Objetivo", ["Medallas esperadas", "Más equipos, más rápidos"], horizontal=True, key="plan_objetivo")
+
+if st.button("🗓️ Armar Plan Completo", use_container_width=True):
+    bandas_p = bandas_relevos().get(str(o_reg))
+    if len(pool) < 4: st.warning("Seleccione al menos 4 nadadores del pool disponible.")
+    elif bandas_p is None or not len(bandas_p): st.warning("El reglamento elegido no tiene categorías de relevo cargadas.")
+    elif not p_pruebas: st.warning("Elija al menos una prueba.")
+    else:
+        with st.spinner("Armando el plan..."):
+            m_map = {n: ficha_sim(n) for n in pool}
+            generos_p = np.array([m_map[n]['gen'] for n in pool], dtype=object)
+            edades_p = np.array([m_map[n]['edad'] for n in pool], dtype="int64")
+            postas_plan = []
+            for nombre_prueba in p_pruebas:
+                tipo_p, gen_p = PRUEBAS_PLAN[nombre_prueba]
+                legs_p = [("E2", "Espalda"), ("E3", "Pecho"), ("E1", "Mariposa"), ("E4", "Crol")] if "Medley" in tipo_p else [("E4", "Crol")]*4
+                costos_p = matriz_costos([m_map[n] for n in pool], [l[0] for l in legs_p])
+                for lo, hi, cat_p in zip(bandas_p.indice.left, bandas_p.indice.right, bandas_p.etiquetas):
+                    postas_plan.append({"costos": costos_p, "genero": gen_p, "minimo": lo, "maximo": hi, "carrera": nombre_prueba,
+                                        "categoria": cat_p, "legs": legs_p})
+
+            # Objetivos lexicográficos. La velocidad aporta a lo sumo `eps` por equipo y
+            # eps * (máximo de equipos del plan) < 1, así que nunca compensa un escalón:
+            # - Medallas esperadas: 10 por medalla (pasos de 0.5 = 5); equipos y velocidad sólo desempatan.
+            # - Más equipos, más rápidos: 1 por equipo anotado; la velocidad desempata entre planes con igual cantidad.
+            eps = 1 / (len(postas_plan) * int(p_cupo) + 1)
+            def valorar(p, totales):
+                totales = np.asarray(totales, dtype="float64")
+                velocidad = eps * (1 - totales / SIN_TIEMPO)
+                if p_objetivo == "Medallas esperadas":
+                    posta = postas_plan[p]
+                    return 10 * medallas_esperadas(totales, posta["minimo"], posta["genero"]) + velocidad
+                return 1 + velocidad
+
+            plan = plan_postas(postas_plan, edades_p, generos_p, valorar, limite=int(p_limite), cupo=int(p_cupo))
+
+        if not plan: st.info("No se pudo armar ningún equipo con ese pool.")
+        else:
+            filas_plan, equipos_plan = [], []
+            for p, orden, total in sorted(plan, key=lambda e: (p_pruebas.index(postas_plan[e[0]]["carrera"]), postas_plan[e[0]]["minimo"], e[2])):
+                posta = postas_plan[p]
+                eq = tuple(pool[i] for i in orden)
+                se = int(edades_p[orden].sum())
+                medallas = medallas_esperadas(np.array([total]), posta["minimo"], posta["genero"])[0]
+                filas_plan.append({
+                    'Prueba': posta["carrera"], 'Categoría': posta["categoria"],
+                    'Equipo': " / ".join(n.split(',')[0] for n in eq),
+                    'Tiempo': seg_a_tiempo(total), 'Suma': se,
+                    'Nivel': "🔥 Podio" if medallas == 1 else ("✨ Competitivo" if medallas else "-"),
+                })
+                equipos_plan.append({'etiqueta': f"{posta['carrera'].upper()} - {posta['categoria'].upper()}", 'eq': eq, 't': float(total),
+                                     'cat': posta["categoria"], 'se': se, 'estilos': [l[1] for l in posta["legs"]]})
+            df_plan = pd.DataFrame(filas_plan)
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Postas", len(df_plan))
+            m2.metric("Nivel podio", int((df_plan['Nivel'] == "🔥 Podio").sum()))
+            m3.metric("Nadadores usados", len({n for e in equipos_plan for n in e['eq']}))
+            st.dataframe(df_plan, hide_index=True, use_container_width=True)
+
+            usos = pd.Series([n for e in equipos_plan for n in e['eq']]).value_counts()
+            with st.expander("Postas por nadador"):
+                st.dataframe(pd.DataFrame({'Nadador': usos.index, 'Postas': usos.to_numpy()}), hide_index=True, use_container_width=True)
+
+            st.button("💾 Pasar el plan al Borrador", key="save_plan_draft", on_click=guardar_plan_borrador, args=(equipos_plan,), use_container_width=True)
+
+# --- 8. GRILLA DE EQUIPOS GUARDADOS (BORRADOR) ---
 if st.session_state.equipos_borrador:
     st.divider()
     st.subheader("📋 Equipos Confirmados (Borrador)")
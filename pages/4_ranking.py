@@ -1,7 +1,10 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 
+from comun.datos import cargar_hojas
+from comun.marcas import marcas_personales
+from comun.tiempos import texto_tiempo
+
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Ranking NOB", layout="centered", initial_sidebar_state="collapsed")
 
@@ -12,37 +15,16 @@ if "role" not in st.session_state or st.session_state.role not in ["M", "P"]:
 
 st.title("🏆 Ranking Histórico")
 
-conn = st.connection("gsheets", type=GSheetsConnection)
-
 # --- 3. CARGA DE DATOS ---
-@st.cache_data(ttl="1h")
-def cargar_datos_ranking():
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "tiempos": conn.read(worksheet="Tiempos"),
-            "estilos": conn.read(worksheet="Estilos"),
-            "distancias": conn.read(worksheet="Distancias"),
-            "piletas": conn.read(worksheet="Piletas")
-        }
-    except: return None
-
-data = cargar_datos_ranking()
+data = cargar_hojas("nadadores", "tiempos", "estilos", "distancias", "piletas", "tiempos_base")
 if not data: st.stop()
 
 # --- 4. PROCESAMIENTO ---
-def tiempo_a_seg(t_str):
-    try:
-        if isinstance(t_str, str):
-            partes = t_str.replace('.', ':').split(':')
-            if len(partes) == 3: return float(partes[0])*60 + float(partes[1]) + float(partes[2])/100
-            elif len(partes) == 2: return float(partes[0])*60 + float(partes[1])
-            else: return float(t_str)
-        return float(t_str)
-    except: return 999999
-
-# --- UNIFICACIÓN LIMPIA (IGNORANDO 'CLUB' DE TIEMPOS) ---
-df = data['tiempos'].copy()
+# Mejor marca de cada nadador por estilo y distancia (tabla mantenida en comun.marcas).
+# Equiparando piletas, las marcas de 25m compiten por su equivalente en 50m
+equiparar = st.session_state.get("rank_equiparar", True)
+col_orden = 'tiempo_norm_cs' if equiparar else 'tiempo_cs'
+df = marcas_personales().mejores_por_prueba(normalizado=equiparar).drop(columns=['medida'])
 
 # 1. Eliminar 'club' de Tiempos si existe (para evitar conflictos y 'nan')
 if 'club' in df.columns:
@@ -68,8 +50,7 @@ df = df.rename(columns=cols_map)
 
 # 4. Cálculo de campos finales
 df['Nadador'] = df['Apellido'].astype(str).str.upper() + ", " + df['Nombre'].astype(str)
-df['Segundos'] = df['tiempo'].apply(tiempo_a_seg)
-df['Año'] = pd.to_datetime(df['fecha']).dt.year
+df['Año'] = df['fecha'].dt.year
 
 # Asegurar valores por defecto para que no falle la tarjeta
 if 'sede' not in df.columns: df['sede'] = 'Sede desconocida'
@@ -78,6 +59,10 @@ if 'medida' not in df.columns: df['medida'] = '-'
 # --- 5. FILTROS ---
 st.markdown("### 🔍 Filtrar Ranking")
 
+# Los puntos (comun.puntos) ya vienen en cada marca: permiten comparar pruebas distintas
+orden = st.radio("Ordenar por", ["Tiempo", "Puntos", "Puntos (todas las pruebas)"], horizontal=True, key="rank_orden")
+todas_pruebas = orden == "Puntos (todas las pruebas)"
+
 c1, c2, c3 = st.columns(3)
 
 lista_estilos = sorted(df['Estilo'].unique()) if 'Estilo' in df.columns else []
@@ -92,12 +77,15 @@ for i, e in enumerate(lista_estilos):
 for i, d in enumerate(lista_distancias):
     if "50" in str(d): idx_distancia = i; break
 
-with c1: f_estilo = st.selectbox("Estilo", lista_estilos, index=idx_estilo)
-with c2: f_distancia = st.selectbox("Distancia", lista_distancias, index=idx_distancia)
+with c1: f_estilo = st.selectbox("Estilo", lista_estilos, index=idx_estilo, disabled=todas_pruebas)
+with c2: f_distancia = st.selectbox("Distancia", lista_distancias, index=idx_distancia, disabled=todas_pruebas)
 with c3: f_genero = st.selectbox("Género", lista_generos)
+st.toggle("Equiparar pileta de 25m a 50m", value=True, key="rank_equiparar", help="Convierte las marcas de pileta corta a su equivalente en pileta larga antes de ordenar.")
 
 # Aplicar filtros básicos
-if 'Estilo' in df.columns and 'Distancia' in df.columns:
+if todas_pruebas:
+    df_filtrado = df.copy()
+elif 'Estilo' in df.columns and 'Distancia' in df.columns:
     df_filtrado = df[
         (df['Estilo'] == f_estilo) & 
         (df['Distancia'] == f_distancia)
@@ -109,13 +97,15 @@ if f_genero != "Todos":
     df_filtrado = df_filtrado[df_filtrado['codgenero'] == f_genero]
 
 # --- LÓGICA DE RANKING (MEJORES MARCAS ÚNICAS) ---
-# 1. Ordenamos por tiempo (el más rápido primero)
-df_filtrado = df_filtrado.sort_values('Segundos', ascending=True)
-
-# 2. Eliminamos duplicados por nadador, quedándonos solo con el primero (su mejor tiempo)
-df_filtrado = df_filtrado.drop_duplicates(subset=['codnadador'], keep='first')
+# 1. Ya hay una sola marca por nadador y prueba (su mejor tiempo): sólo se ordena
+if orden == "Tiempo":
+    df_filtrado = df_filtrado.sort_values(col_orden, ascending=True)
+else:
+    df_filtrado = df_filtrado.sort_values('puntos', ascending=False, na_position='last')
+    # Entre pruebas distintas queda la marca de más puntos de cada nadador
+    if todas_pruebas: df_filtrado = df_filtrado.drop_duplicates('codnadador')
 
-# 3. Tomamos los primeros 50
+# 2. Tomamos los primeros 50
 df_ranking = df_filtrado.head(50).reset_index(drop=True)
 
 # --- 6. VISUALIZACIÓN ---
@@ -140,6 +130,9 @@ else:
         sede_val = str(row.get('sede', 'Sede desconocida'))
         
         pileta_badge = "25m" if "25" in medida_val else ("50m" if "50" in medida_val else medida_val)
+        pts_txt = f" • 🏅 {int(row['puntos'])} pts" if pd.notna(row.get('puntos')) else ""
+        prueba_txt = f"{row.get('Distancia', '')} {row.get('Estilo', '')} • " if todas_pruebas else ""
+        equiv_txt = f'<div style="font-size:11px; font-weight:normal; opacity:0.7;">≈ {texto_tiempo(row["tiempo_norm_cs"])} en 50m</div>' if equiparar and pileta_badge == "25m" else ""
 
         st.markdown(f"""
         <style>
@@ -168,10 +161,10 @@ else:
             <div class="rank-info">
                 <div class="rank-name">{row['Nadador']}</div>
                 <div class="rank-meta">
-                    {sede_val} • {row['Año']} 
+                    {prueba_txt}{sede_val} • {row['Año']}{pts_txt} 
                     <span class="tag-pool" style="border: 1px solid {text_color};">{pileta_badge}</span>
                 </div>
             </div>
-            <div class="rank-time">{row['tiempo']}</div>
+            <div class="rank-time">{row['tiempo']}{equiv_txt}</div>
         </div>
         """, unsafe_allow_html=True)
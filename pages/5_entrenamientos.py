@@ -1,11 +1,15 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
-from datetime import datetime, date
+from datetime import date
 import plotly.express as px
 import time
 import numpy as np
 
+from comun.datos import agregar_filas, cargar_hojas
+from comun.esquemas import texto_fecha
+from comun.nadadores import directorio_nadadores
+from comun.tiempos import a_texto, centesimas, texto_tiempo
+
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Entrenamientos", layout="centered")
 
@@ -24,24 +28,6 @@ if "form_reset_id" not in st.session_state:
 def reset_carga():
     st.session_state.form_reset_id += 1
 
-# --- FUNCIONES AUXILIARES ---
-def a_segundos(t_str):
-    """Convierte MM:SS.CC a segundos (float)"""
-    try:
-        if not t_str or str(t_str).lower() in ['nan', 'none', '', '00:00.00']: return None
-        m, rest = t_str.split(':')
-        s, c = rest.split('.')
-        return int(m) * 60 + int(s) + int(c) / 100
-    except: return None
-
-def fmt_mm_ss(seconds):
-    """Genera etiquetas de eje Y en formato MM:SS.CC"""
-    if seconds is None or np.isnan(seconds): return ""
-    m = int(seconds // 60)
-    s = int(seconds % 60)
-    c = int(round((seconds - int(seconds)) * 100))
-    return f"{m:02d}:{s:02d}.{c:02d}"
-
 st.title("⏱️ Centro de Entrenamiento")
 
 # --- CSS PERSONALIZADO ---
@@ -104,45 +90,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-@st.cache_data(ttl="5m")
-def cargar_entrenamientos():
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "entrenamientos": conn.read(worksheet="Entrenamientos"),
-            "estilos": conn.read(worksheet="Estilos"),
-            "distancias": conn.read(worksheet="Distancias")
-        }
-    except: return None
-
-db = cargar_entrenamientos()
+db = cargar_hojas("nadadores", "entrenamientos", "estilos", "distancias")
 if not db: st.stop()
 
-# --- PROCESAMIENTO ROBUSTO DE DATOS ---
-df_nad = db['nadadores'].copy()
-df_ent = db['entrenamientos'].copy()
-df_est = db['estilos'].copy()
-df_dist = db['distancias'].copy()
-
-# Normalizar columnas (minúsculas y sin espacios)
-df_nad.columns = df_nad.columns.str.strip().str.lower()
-df_ent.columns = df_ent.columns.str.strip().str.lower()
-df_est.columns = df_est.columns.str.strip().str.lower()
-df_dist.columns = df_dist.columns.str.strip().str.lower()
-
-# Normalizar claves de cruce (IDs)
-for df in [df_ent, df_est, df_dist]:
-    if 'codestilo' in df.columns:
-        df['codestilo'] = df['codestilo'].astype(str).str.strip()
-    if 'coddistancia' in df.columns:
-        df['coddistancia'] = df['coddistancia'].astype(str).str.strip()
+# --- DATOS ---
+# El snapshot ya normaliza encabezados y códigos (comun.esquemas): sin copias ni limpieza por rerun
+df_nad = db['nadadores']
+df_ent = db['entrenamientos']
+df_est = db['estilos']
+df_dist = db['distancias']
 
 # Preparar datos de usuario
-nad_info = df_nad[df_nad['codnadador'].astype(str) == str(mi_id)]
-mi_nom_comp = f"{nad_info.iloc[0]['apellido'].upper()}, {nad_info.iloc[0]['nombre']}" if not nad_info.empty else mi_nombre
-lista_noms = sorted((df_nad['apellido'].astype(str).str.upper() + ", " + df_nad['nombre'].astype(str)).unique().tolist())
+directorio = directorio_nadadores()
+mi_nom_comp = directorio.etiqueta(mi_id, mi_nombre)
+lista_noms = directorio.nombres()
 list_dist_total = [d for d in df_dist['descripcion'].unique() if "25" not in d and "4x" not in d.lower()]
 
 # --- DEFINICIÓN DE PESTAÑAS SEGÚN ROL ---
@@ -164,7 +125,7 @@ with tab_cargar:
         
         # En la carga usamos lista_noms completa (todos los nadadores)
         n_in = c2.selectbox("Nadador", [mi_nom_comp] if rol=="N" else lista_noms, index=0 if rol=="N" else None)
-        id_nad_target = mi_id if rol=="N" else (df_nad[(df_nad['apellido'].str.upper() + ", " + df_nad['nombre']) == n_in].iloc[0]['codnadador'] if n_in else None)
+        id_nad_target = mi_id if rol=="N" else (directorio.codigo(n_in) if n_in else None)
         
         c3, c4 = st.columns(2)
         est_val = c3.selectbox("Estilo", df_est['descripcion'].unique(), index=None)
@@ -182,9 +143,9 @@ with tab_cargar:
             if not df_ent.empty:
                 existe = df_ent[
                     (df_ent['codnadador'].astype(str) == str(id_nad_target)) & 
-                    (df_ent['fecha'].astype(str) == fecha_str) & 
-                    (df_ent['codestilo'].astype(str) == str(id_est)) &
-                    (df_ent['coddistancia'].astype(str) == str(id_dt))
+                    (df_ent['fecha'] == pd.Timestamp(f_val)) & 
+                    (df_ent['codestilo'] == id_est) &
+                    (df_ent['coddistancia'] == id_dt)
                 ]
                 if not existe.empty: duplicado = True
             
@@ -234,59 +195,56 @@ with tab_cargar:
                 submitted = st.form_submit_button("💾 GUARDAR REGISTRO", use_container_width=True)
                 
                 if submitted:
-                    s_final = (mf*60) + sf + (cf/100)
-                    if s_final == 0:
+                    # Todo el cálculo en centésimas enteras
+                    cs_final = (mf*6000) + (sf*100) + cf
+                    if cs_final == 0:
                         st.error("⚠️ El tiempo final es obligatorio.")
                     else:
                         lp_final = [] 
-                        s_parciales_norm = 0
+                        cs_parciales_norm = 0
                         tipo_detectado = "INDIVIDUALES"
                         
-                        raw_secs = []
-                        for p_str in lp:
-                            sec = a_segundos(p_str)
-                            if sec is not None and sec > 0:
-                                raw_secs.append(sec)
+                        raw_cs = [c for c in (centesimas(p_str) for p_str in lp) if c]
                         
-                        if raw_secs:
-                            sum_raw = sum(raw_secs)
-                            last_raw = raw_secs[-1]
-                            is_increasing = all(x < y for x, y in zip(raw_secs, raw_secs[1:]))
-                            tolerance = 2.0 
+                        if raw_cs:
+                            sum_raw = sum(raw_cs)
+                            last_raw = raw_cs[-1]
+                            is_increasing = all(x < y for x, y in zip(raw_cs, raw_cs[1:]))
+                            tolerance = 200 
                             
                             es_acumulado = False
                             
-                            if abs(sum_raw - s_final) <= tolerance:
+                            if abs(sum_raw - cs_final) <= tolerance:
                                 es_acumulado = False
                                 tipo_detectado = "INDIVIDUALES"
-                            elif is_increasing and abs(last_raw - s_final) <= tolerance:
+                            elif is_increasing and abs(last_raw - cs_final) <= tolerance:
                                 es_acumulado = True
                                 tipo_detectado = "CRONOMETRADOS (Acumulados)"
-                            elif is_increasing and sum_raw > (s_final * 1.5):
+                            elif is_increasing and sum_raw > (cs_final * 1.5):
                                 es_acumulado = True
                                 tipo_detectado = "CRONOMETRADOS (Acumulados)"
                             else:
                                 es_acumulado = False
                                 tipo_detectado = "INDIVIDUALES"
 
-                            norm_secs = []
+                            norm_cs = []
                             if es_acumulado:
                                 prev = 0
-                                for curr in raw_secs:
+                                for curr in raw_cs:
                                     diff = curr - prev
-                                    if diff <= 0: diff = 0.01 
-                                    norm_secs.append(diff)
+                                    if diff <= 0: diff = 1 
+                                    norm_cs.append(diff)
                                     prev = curr
                             else:
-                                norm_secs = raw_secs
+                                norm_cs = raw_cs
                             
-                            lp_final = [fmt_mm_ss(s) for s in norm_secs]
-                            s_parciales_norm = sum(norm_secs)
+                            lp_final = a_texto(norm_cs).tolist()
+                            cs_parciales_norm = sum(norm_cs)
                             
                             st.info(f"ℹ️ Detección automática: **{tipo_detectado}**. Se guardaron como tramos individuales.")
 
-                            if abs(s_parciales_norm - s_final) > 1.0:
-                                st.warning(f"⚠️ Atención: La suma de los parciales ({fmt_mm_ss(s_parciales_norm)}) difiere del Tiempo Final ({fmt_mm_ss(s_final)}).")
+                            if abs(cs_parciales_norm - cs_final) > 100:
+                                st.warning(f"⚠️ Atención: La suma de los parciales ({texto_tiempo(cs_parciales_norm)}) difiere del Tiempo Final ({texto_tiempo(cs_final)}).")
                         else:
                             lp_final = []
 
@@ -307,8 +265,8 @@ with tab_cargar:
                                     "parcial_3": lp_final[2], "parcial_4": lp_final[3],
                                     "observaciones": ""
                                 }])
-                                conn.update(worksheet="Entrenamientos", data=pd.concat([db['entrenamientos'], row], ignore_index=True))
-                                st.success("✅ Guardado."); time.sleep(1); reset_carga(); st.cache_data.clear(); st.rerun()
+                                agregar_filas("entrenamientos", row)
+                                st.success("✅ Guardado."); time.sleep(1); reset_carga(); st.rerun()
                             except Exception as e: st.error(f"Error: {e}")
 
 # ==============================================================================
@@ -321,15 +279,13 @@ with tab_ver:
     if rol in ["M", "P"]:
         # FILTRO INTELIGENTE:
         if not df_ent.empty:
-            ids_con_historia = df_ent['codnadador'].unique().astype(str)
-            df_nad_con_historia = df_nad[df_nad['codnadador'].astype(str).isin(ids_con_historia)]
-            lista_noms_filtrada = sorted((df_nad_con_historia['apellido'].astype(str).str.upper() + ", " + df_nad_con_historia['nombre'].astype(str)).unique().tolist())
+            lista_noms_filtrada = directorio.nombres(df_ent['codnadador'].unique())
         else:
             lista_noms_filtrada = []
 
         sel_n = st.selectbox("Consultar Historial de:", lista_noms_filtrada, index=None, key="h_nad")
         if sel_n: 
-            target_id = df_nad[(df_nad['apellido'].str.upper() + ", " + df_nad['nombre']) == sel_n].iloc[0]['codnadador']
+            target_id = directorio.codigo(sel_n)
     
     if target_id:
         df_h = df_ent[df_ent['codnadador'].astype(str) == str(target_id)].copy()
@@ -341,7 +297,7 @@ with tab_ver:
             st.markdown("<div class='section-title'>⏱️ Promedios y Ritmos Históricos</div>", unsafe_allow_html=True)
             
             df_stats = df_h.copy()
-            df_stats['seg_final'] = df_stats['tiempo_final'].apply(a_segundos)
+            df_stats['cs_final'] = df_stats['tiempo_final_cs']
 
             def get_dist(text):
                 try: 
@@ -352,17 +308,17 @@ with tab_ver:
             df_stats['dist_num'] = df_stats['descripcion_y'].apply(get_dist)
             
             # Solo consideramos distancias >= 50m con tiempo válido
-            df_stats = df_stats[(df_stats['dist_num'] >= 50) & (df_stats['seg_final'].notna())]
+            df_stats = df_stats[(df_stats['dist_num'] >= 50) & (df_stats['cs_final'].notna())]
 
             if not df_stats.empty:
                 stats_grouped = df_stats.groupby(['descripcion_x', 'descripcion_y', 'dist_num']).agg(
                     veces=('id_entrenamiento', 'count'),
-                    promedio_seg=('seg_final', 'mean')
+                    promedio_cs=('cs_final', 'mean')
                 ).reset_index()
 
                 # LÓGICA DE RITMO SEGÚN DISTANCIA
                 stats_grouped['dist_ritmo'] = np.where(stats_grouped['dist_num'] == 50, 25, 50)
-                stats_grouped['ritmo_seg'] = stats_grouped['promedio_seg'] / (stats_grouped['dist_num'] / stats_grouped['dist_ritmo'])
+                stats_grouped['ritmo_cs'] = stats_grouped['promedio_cs'] / (stats_grouped['dist_num'] / stats_grouped['dist_ritmo'])
                 stats_grouped = stats_grouped.sort_values(['descripcion_x', 'dist_num'])
 
                 # Renderizar tarjetas lado a lado
@@ -381,11 +337,11 @@ with tab_ver:
                             <div style="display: flex; gap: 20px; align-items: center; text-align: right;">
                                 <div>
                                     <div style="font-size: 11px; color: #aaa; margin-bottom: 2px; letter-spacing: 0.5px;">TIEMPO MEDIO</div>
-                                    <div class="final-time" style="background: transparent; padding: 0; color: #eee;">{fmt_mm_ss(row['promedio_seg'])}</div>
+                                    <div class="final-time" style="background: transparent; padding: 0; color: #eee;">{texto_tiempo(row['promedio_cs'], '')}</div>
                                 </div>
                                 <div style="border-left: 1px solid #444; padding-left: 20px;">
                                     <div style="font-size: 11px; color: #888; margin-bottom: 2px; text-transform: uppercase;">{label_ritmo}</div>
-                                    <div style="font-family: 'Courier New', monospace; font-size: 18px; font-weight: bold; color: #E30613;">{fmt_mm_ss(row['ritmo_seg'])}</div>
+                                    <div style="font-family: 'Courier New', monospace; font-size: 18px; font-weight: bold; color: #E30613;">{texto_tiempo(row['ritmo_cs'], '')}</div>
                                 </div>
                             </div>
                         </div>
@@ -451,14 +407,14 @@ with tab_ver:
             # --- GRÁFICO EVOLUCIÓN ---
             if f_est != "Todos" and f_dist != "Todos" and len(df_filt) >= 2:
                 st.markdown("<div class='section-title'>📈 Evolución</div>", unsafe_allow_html=True)
-                df_filt['seg'] = df_filt['tiempo_final'].apply(a_segundos)
-                df_filt['fecha_dt'] = pd.to_datetime(df_filt['fecha'])
+                df_filt['cs'] = df_filt['tiempo_final_cs'].astype('float64')
+                df_filt['fecha_dt'] = df_filt['fecha']
                 
-                min_val, max_val = df_filt['seg'].min(), df_filt['seg'].max()
+                min_val, max_val = df_filt['cs'].min(), df_filt['cs'].max()
                 tick_vals = np.linspace(min_val, max_val, 5) if max_val > min_val else [min_val]
-                tick_text = [fmt_mm_ss(v) for v in tick_vals]
+                tick_text = a_texto(tick_vals).tolist()
 
-                fig = px.line(df_filt.sort_values('fecha_dt'), x='fecha_dt', y='seg', markers=True, 
+                fig = px.line(df_filt.sort_values('fecha_dt'), x='fecha_dt', y='cs', markers=True, 
                               color_discrete_sequence=['#E30613'], custom_data=['tiempo_final'])
                 
                 fig.update_traces(hovertemplate='📅 %{x|%d/%m/%Y}<br>⏱️ %{customdata[0]}<extra></extra>')
@@ -473,7 +429,7 @@ with tab_ver:
             # --- LISTADO ---
             st.markdown("<div class='section-title'>📋 Registros</div>", unsafe_allow_html=True)
             for _, r in df_filt.sort_values(['fecha', 'id_entrenamiento'], ascending=False).iterrows():
-                f_fmt = datetime.strptime(str(r['fecha']), '%Y-%m-%d').strftime('%d/%m/%Y')
+                f_fmt = texto_fecha(r['fecha'], '%d/%m/%Y')
                 ps = [r.get(f'parcial_{i}') for i in range(1, 5)]
                 p_validos = [p for p in ps if p and str(p).lower() not in ['nan', 'none', '', '00:00.00']]
                 
@@ -496,13 +452,12 @@ with tab_ver:
                 """, unsafe_allow_html=True)
 
                 if p_validos and st.checkbox(f"Analizar tramos", key=f"chk_{r['id_entrenamiento']}"):
-                    p_seg = [a_segundos(p) for p in p_validos]
-                    p_labels = [fmt_mm_ss(s) for s in p_seg]
+                    p_cs = [int(c) for c in (r.get(f'parcial_{i}_cs') for i in range(1, 5)) if pd.notna(c)]
                     
                     df_bar = pd.DataFrame({
-                        'Tramo': [f"P{i+1}" for i in range(len(p_seg))],
-                        'Segundos': p_seg,
-                        'Etiqueta': p_labels
+                        'Tramo': [f"P{i+1}" for i in range(len(p_cs))],
+                        'Segundos': [c / 100 for c in p_cs],
+                        'Etiqueta': a_texto(p_cs).tolist()
                     })
 
                     fig_bar = px.bar(df_bar, x='Tramo', y='Segundos', text='Etiqueta',
@@ -548,7 +503,7 @@ if rol == "M":
                     # Filtrar por la prueba seleccionada
                     df_eq_filt = df_global[(df_global['descripcion_x'] == f_est_eq) & (df_global['descripcion_y'] == f_dist_eq)].copy()
                     
-                    df_eq_filt['seg_final'] = df_eq_filt['tiempo_final'].apply(a_segundos)
+                    df_eq_filt['cs_final'] = df_eq_filt['tiempo_final_cs']
                     
                     def get_dist_eq(text):
                         try: 
@@ -557,24 +512,24 @@ if rol == "M":
                             return 0
                             
                     dist_num_eq = get_dist_eq(f_dist_eq)
-                    df_eq_filt = df_eq_filt[df_eq_filt['seg_final'].notna()]
+                    df_eq_filt = df_eq_filt[df_eq_filt['cs_final'].notna()]
                     
                     if not df_eq_filt.empty:
                         # Agrupar por nadador calculando su promedio para esta prueba
                         stats_eq = df_eq_filt.groupby(['codnadador', 'apellido', 'nombre']).agg(
-                            promedio_seg=('seg_final', 'mean')
+                            promedio_cs=('cs_final', 'mean')
                         ).reset_index()
                         
                         # Calcular ritmo según distancia
                         if dist_num_eq >= 50:
                             dist_ritmo_eq = 25 if dist_num_eq == 50 else 50
-                            stats_eq['ritmo_seg'] = stats_eq['promedio_seg'] / (dist_num_eq / dist_ritmo_eq)
+                            stats_eq['ritmo_cs'] = stats_eq['promedio_cs'] / (dist_num_eq / dist_ritmo_eq)
                         else:
                             dist_ritmo_eq = dist_num_eq
-                            stats_eq['ritmo_seg'] = stats_eq['promedio_seg']
+                            stats_eq['ritmo_cs'] = stats_eq['promedio_cs']
                             
                         # Ordenar del más rápido al más lento
-                        stats_eq = stats_eq.sort_values('promedio_seg')
+                        stats_eq = stats_eq.sort_values('promedio_cs')
                         
                         st.write(f"**Resultados para {f_est_eq} | {f_dist_eq}**")
                         
@@ -593,11 +548,11 @@ if rol == "M":
                                     <div style="display: flex; gap: 20px; align-items: center; text-align: right;">
                                         <div>
                                             <div style="font-size: 11px; color: #aaa; margin-bottom: 2px; letter-spacing: 0.5px;">TIEMPO MEDIO</div>
-                                            <div class="final-time" style="background: transparent; padding: 0; color: #eee;">{fmt_mm_ss(row_eq['promedio_seg'])}</div>
+                                            <div class="final-time" style="background: transparent; padding: 0; color: #eee;">{texto_tiempo(row_eq['promedio_cs'], '')}</div>
                                         </div>
                                         <div style="border-left: 1px solid #444; padding-left: 20px;">
                                             <div style="font-size: 11px; color: #888; margin-bottom: 2px; text-transform: uppercase;">{label_ritmo_eq}</div>
-                                            <div style="font-family: 'Courier New', monospace; font-size: 18px; font-weight: bold; color: #E30613;">{fmt_mm_ss(row_eq['ritmo_seg'])}</div>
+                                            <div style="font-family: 'Courier New', monospace; font-size: 18px; font-weight: bold; color: #E30613;">{texto_tiempo(row_eq['ritmo_cs'], '')}</div>
                                         </div>
                                     </div>
                                 </div>
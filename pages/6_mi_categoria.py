@@ -1,9 +1,12 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
-from datetime import date
 import plotly.express as px
-import numpy as np
+
+from comun.categorias import SIN_CATEGORIA
+from comun.datos import cargar_hojas
+from comun.edades import padron_edades
+from comun.marcas import marcas_personales
+from comun.tiempos import a_texto
 
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Mi Categoría", layout="centered")
@@ -54,88 +57,33 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- CONEXIÓN Y DATOS ---
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-@st.cache_data(ttl="5m")
-def cargar_datos():
-    try:
-        return {
-            "nadadores": conn.read(worksheet="Nadadores"),
-            "tiempos": conn.read(worksheet="Tiempos"),  # Tabla OFICIAL de Tiempos
-            "estilos": conn.read(worksheet="Estilos"),
-            "distancias": conn.read(worksheet="Distancias"),
-            "categorias": conn.read(worksheet="Categorias")
-        }
-    except: return None
-
-db = cargar_datos()
+db = cargar_hojas("nadadores", "tiempos", "estilos", "distancias", "categorias", "piletas", "tiempos_base")
 if not db: st.stop()
 
 # --- FUNCIONES AUXILIARES ---
 
-def calcular_edad_fina(fecha_nac):
-    """Calcula la edad al 31 de diciembre del año actual."""
-    if pd.isna(fecha_nac): return None
-    try:
-        nac = pd.to_datetime(fecha_nac, errors='coerce')
-        if pd.isna(nac): return None
-        hoy = date.today()
-        return hoy.year - nac.year
-    except: return None
-
-def asignar_categoria(edad, df_cat):
-    """Busca la categoría correspondiente a la edad en la tabla de referencia."""
-    if edad is None: return "S/D"
-    # Filtrar rango de edad
-    match = df_cat[(df_cat['edad_min'] <= edad) & (df_cat['edad_max'] >= edad)]
-    if not match.empty:
-        return match.iloc[0]['nombre_cat'] # Usamos 'nombre_cat' de tu tabla
-    return "Sin Categoría"
-
-def a_segundos(t_str):
-    try:
-        if not t_str or str(t_str).lower() in ['nan', 'none', '', '00:00.00']: return None
-        # Maneja formato MM:SS.CC
-        parts = str(t_str).split(':')
-        if len(parts) == 2:
-            m = int(parts[0])
-            s_parts = parts[1].split('.')
-            s = int(s_parts[0])
-            c = int(s_parts[1]) if len(s_parts) > 1 else 0
-            return (m * 60) + s + (c / 100)
-        # Manejo opcional de formato solo segundos (SS.CC)
-        elif len(parts) == 1:
-             return float(parts[0])
-        return None
-    except: return None
-
-def fmt_mm_ss(seconds):
-    if seconds is None or np.isnan(seconds): return ""
-    m = int(seconds // 60)
-    s = int(seconds % 60)
-    c = int(round((seconds - int(seconds)) * 100))
-    return f"{m:02d}:{s:02d}.{c:02d}"
+def asignar_categoria(categorias, edades):
+    """Sin banda -> "Sin Categoría"; sin fecha de nacimiento -> "S/D"."""
+    categorias = categorias.where(categorias != SIN_CATEGORIA, "Sin Categoría")
+    return categorias.where(edades.notna(), "S/D")
 
 # --- PROCESAMIENTO DE DATOS ---
-df_nad = db['nadadores'].copy()
-df_cat = db['categorias'].copy()
+# Encabezados y tipos ya normalizados en el snapshot (comun.esquemas)
+df_cat = db['categorias']
 
 # 1. EXCLUSIÓN DE NADADOR 66
-df_nad = df_nad[df_nad['codnadador'].astype(str) != '66']
+df_nad = db['nadadores'][db['nadadores']['codnadador'] != 66]
 
-# Normalizar columnas para evitar errores de espacios/mayúsculas
-df_nad.columns = df_nad.columns.str.strip().str.lower()
-df_cat.columns = df_cat.columns.str.strip().str.lower()
-
-# 2. Calcular Edad y Categoría para todos
+# 2. Edad y Categoría al 31/12 para todos, de la tabla por año de comun.edades
+padron = padron_edades()
 if 'fechanac' in df_nad.columns:
-    df_nad['edad_calculada'] = df_nad['fechanac'].apply(calcular_edad_fina)
+    df_nad['edad_calculada'] = padron.edades(df_nad['codnadador'])
 else:
     st.error("Error: No se encuentra la columna 'fechanac' en la tabla Nadadores.")
     st.stop()
 
 if 'nombre_cat' in df_cat.columns:
-    df_nad['categoria_actual'] = df_nad['edad_calculada'].apply(lambda x: asignar_categoria(x, df_cat))
+    df_nad['categoria_actual'] = asignar_categoria(padron.categorias(df_nad['codnadador']), df_nad['edad_calculada'])
 else:
     st.error("Error: No se encuentra la columna 'nombre_cat' en la tabla Categorias.")
     st.stop()
@@ -179,6 +127,12 @@ if target_categoria and target_genero:
         (df_nad['codgenero'] == target_genero)
     ].copy()
     
+    # Mejor puntaje de cada rival entre todas sus pruebas (puntos ya calculados en sus marcas)
+    marcas = marcas_personales().mejores_por_prueba()
+    mejores_puntos = marcas.groupby('codnadador')['puntos'].max() if not marcas.empty else pd.Series(dtype="Int32")
+    rivales['puntos'] = rivales['codnadador'].map(mejores_puntos)
+    rivales = rivales.sort_values('puntos', ascending=False, na_position='last')
+
     ids_rivales = rivales['codnadador'].tolist()
     
     # --- MOSTRAR PADRÓN ---
@@ -191,13 +145,14 @@ if target_categoria and target_genero:
             clase = "swimmer-card is-me" if es_yo else "swimmer-card"
             yo_lbl = " (TÚ)" if es_yo else ""
             edad_txt = int(row['edad_calculada']) if pd.notna(row['edad_calculada']) else "-"
+            pts_txt = f" | 🏅 {int(row['puntos'])} pts" if pd.notna(row['puntos']) else ""
             
             with cols[i % 2]:
                 st.markdown(f"""
                 <div class="{clase}">
                     <div class="card-info">
                         <div class="card-name">{row['apellido'].upper()}, {row['nombre']}{yo_lbl}</div>
-                        <div class="card-sub">Edad: {edad_txt} | {row['categoria_actual']}</div>
+                        <div class="card-sub">Edad: {edad_txt} | {row['categoria_actual']}{pts_txt}</div>
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
@@ -209,8 +164,7 @@ if target_categoria and target_genero:
         st.markdown("<div class='section-title'>📊 Tiempos promedios de la categoría</div>", unsafe_allow_html=True)
         
         # 1. Cargar Tiempos y filtrar
-        df_tiempos = db['tiempos'].copy()
-        df_tiempos = df_tiempos[df_tiempos['codnadador'].isin(ids_rivales)]
+        df_tiempos = db['tiempos'][db['tiempos']['codnadador'].isin(ids_rivales)]
         
         if not df_tiempos.empty:
             # 2. Unir con Estilos y Distancias
@@ -239,8 +193,9 @@ if target_categoria and target_genero:
                 ].copy()
                 
                 # 5. Procesar tiempos (PROMEDIO)
-                data_chart['segundos'] = data_chart['tiempo'].apply(a_segundos)
-                data_chart = data_chart[data_chart['segundos'] > 0]
+                # tiempo_cs viene en centésimas desde el snapshot (nulo si no hay tiempo)
+                data_chart = data_chart.dropna(subset=['tiempo_cs'])
+                data_chart['segundos'] = data_chart['tiempo_cs'].astype('float64') / 100
                 
                 if not data_chart.empty:
                     # Promedio por nadador
@@ -249,7 +204,7 @@ if target_categoria and target_genero:
                     # Pegar nombres
                     avg_times = avg_times.merge(rivales[['codnadador', 'apellido', 'nombre']], on='codnadador')
                     avg_times['Atleta'] = avg_times['apellido'].str.upper() + " " + avg_times['nombre'].str[0] + "."
-                    avg_times['Etiqueta'] = avg_times['segundos'].apply(fmt_mm_ss)
+                    avg_times['Etiqueta'] = a_texto(avg_times['segundos'] * 100)
                     
                     # Colores
                     def get_color(cod):
@@ -1,10 +1,14 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 from datetime import datetime, date
-import random
 import uuid
 
+from comun.edades import padron_edades
+from comun.datos import eliminar_filas, leer_hoja, modificar_fila, precargar_hojas
+from comun.limitador import intentar
+from comun.marcas import tiempos_de_inscripcion
+from comun.pruebas import LISTA_PRUEBAS
+
 # ==========================================
 # 1. CONFIGURACIÓN
 # ==========================================
@@ -24,147 +28,54 @@ if "active_usr_tab" not in st.session_state: st.session_state.active_usr_tab = N
 if "active_coach_tab" not in st.session_state: st.session_state.active_coach_tab = None
 
 # ==========================================
-# 3. CONEXIÓN Y DATOS
+# 3. DATOS
 # ==========================================
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-LISTA_PRUEBAS = [
-    "50m Libre", "100m Libre", "200m Libre", "400m Libre", "800m Libre", "1500m Libre",
-    "50m Espalda", "100m Espalda", "200m Espalda",
-    "50m Pecho", "100m Pecho", "200m Pecho",
-    "50m Mariposa", "100m Mariposa", "200m Mariposa",
-    "100m Combinado", "200m Combinado", "400m Combinado",
-    "Posta 4x50 Libre", "Posta 4x50 Combinada", "Posta 4x100 Libre"
-]
+# LISTA_PRUEBAS y su traducción a códigos viven en comun.pruebas
 
 # ==========================================
 # 4. FUNCIONES AUXILIARES
 # ==========================================
 
-def actualizar_con_retry(worksheet, data, max_retries=5):
-    """Manejo robusto de la API con reintentos."""
-    for i in range(max_retries):
-        try:
-            conn.update(worksheet=worksheet, data=data)
-            return True, None 
-        except Exception as e:
-            if "429" in str(e) or "quota" in str(e):
-                import time
-                time.sleep((2 ** i) + random.uniform(0, 1))
-                continue 
-            else:
-                return False, e
-    return False, "Tiempo de espera agotado."
-
-def calcular_categoria_master(anio_nac):
-    """Calcula la categoría Master completa."""
-    if pd.isna(anio_nac) or anio_nac == "": return "-"
-    try:
-        edad = datetime.now().year - int(anio_nac)
-        if edad < 20: return "Juvenil"
-        elif 20 <= edad <= 24: return "Pre-Master"
-        elif 25 <= edad <= 29: return "Master A"
-        elif 30 <= edad <= 34: return "Master B"
-        elif 35 <= edad <= 39: return "Master C"
-        elif 40 <= edad <= 44: return "Master D"
-        elif 45 <= edad <= 49: return "Master E"
-        elif 50 <= edad <= 54: return "Master F"
-        elif 55 <= edad <= 59: return "Master G"
-        elif 60 <= edad <= 64: return "Master H"
-        elif 65 <= edad <= 69: return "Master I"
-        elif 70 <= edad <= 74: return "Master J"
-        elif 75 <= edad <= 79: return "Master K"
-        else: return "Master K+"
-    except: return "-"
-
-def tiempo_a_seg(t_str):
-    """Convierte string de tiempo a segundos para buscar el menor (mejor tiempo)"""
-    try:
-        partes = str(t_str).replace('.', ':').split(':')
-        return float(partes[0]) * 60 + float(partes[1]) + (float(partes[2])/100 if len(partes)>2 else 0)
-    except: return 9999.0
-
-@st.cache_data(ttl="5s")
 def cargar_datos_agenda():
     """Carga todas las tablas necesarias."""
+    precargar_hojas("competencias", "inscripciones", "nadadores", "piletas", "tiempos", "estilos", "distancias", "categorias")
     try:
         try:
-            df_comp = conn.read(worksheet="Competencias").copy()
+            # Fechas, códigos e IDs ya vienen tipados desde el snapshot (comun.esquemas)
+            df_comp = leer_hoja("competencias").copy(deep=False)
             if not df_comp.empty:
-                if 'fecha_evento' in df_comp.columns: df_comp['fecha_evento'] = pd.to_datetime(df_comp['fecha_evento']).dt.date
-                if 'fecha_limite' in df_comp.columns: df_comp['fecha_limite'] = pd.to_datetime(df_comp['fecha_limite']).dt.date
+                if 'fecha_evento' in df_comp.columns: df_comp['fecha_evento'] = df_comp['fecha_evento'].dt.date
+                if 'fecha_limite' in df_comp.columns: df_comp['fecha_limite'] = df_comp['fecha_limite'].dt.date
                 if 'pruebas_habilitadas' not in df_comp.columns: df_comp['pruebas_habilitadas'] = ""
                 if 'max_pruebas' not in df_comp.columns: df_comp['max_pruebas'] = 10
         except:
             df_comp = pd.DataFrame(columns=["id_competencia", "nombre_evento", "fecha_evento", "hora_inicio", "cod_pileta", "fecha_limite", "costo", "descripcion", "pruebas_habilitadas", "max_pruebas"])
 
         try:
-            df_ins = conn.read(worksheet="Inscripciones").copy()
-            if not df_ins.empty: df_ins['codnadador'] = pd.to_numeric(df_ins['codnadador'], errors='coerce').fillna(0).astype(int)
+            df_ins = leer_hoja("inscripciones")
         except:
             df_ins = pd.DataFrame(columns=["id_inscripcion", "id_competencia", "codnadador", "pruebas", "fecha_inscripcion"])
 
         try:
-            df_nad = conn.read(worksheet="Nadadores").copy()
-            df_nad['codnadador'] = pd.to_numeric(df_nad['codnadador'], errors='coerce').fillna(0).astype(int)
-            df_nad['fechanac'] = pd.to_datetime(df_nad['fechanac'], errors='coerce')
+            df_nad = leer_hoja("nadadores")
         except:
             df_nad = pd.DataFrame(columns=["codnadador", "nombre", "apellido", "fechanac", "codgenero"])
 
-        try: df_pil = conn.read(worksheet="Piletas").copy()
+        try: df_pil = leer_hoja("piletas")
         except: df_pil = pd.DataFrame(columns=["codpileta", "club", "medida", "ubicacion"])
 
-        try: df_tiempos = conn.read(worksheet="Tiempos").copy()
+        try: df_tiempos = leer_hoja("tiempos")
         except: df_tiempos = pd.DataFrame()
         
-        try: df_estilos = conn.read(worksheet="Estilos").copy()
+        try: df_estilos = leer_hoja("estilos")
         except: df_estilos = pd.DataFrame()
         
-        try: df_dist = conn.read(worksheet="Distancias").copy()
+        try: df_dist = leer_hoja("distancias")
         except: df_dist = pd.DataFrame()
 
         return df_comp, df_ins, df_nad, df_pil, df_tiempos, df_estilos, df_dist
     except: return None, None, None, None, None, None, None
 
-def leer_dataset_fresco(worksheet):
-    try: return conn.read(worksheet=worksheet, ttl=0).copy()
-    except: return None
-
-def buscar_mejor_tiempo(prueba, df_t_nadador):
-    if df_t_nadador.empty: return ""
-    p_lower = prueba.lower()
-    
-    dist_k = ""
-    if "50m" in p_lower or " 50" in p_lower: dist_k = "50"
-    if "100m" in p_lower or " 100" in p_lower: dist_k = "100"
-    if "200m" in p_lower or " 200" in p_lower: dist_k = "200"
-    if "400m" in p_lower or " 400" in p_lower: dist_k = "400"
-    if "800m" in p_lower or " 800" in p_lower: dist_k = "800"
-    if "1500m" in p_lower or " 1500" in p_lower: dist_k = "1500"
-    if "4x50" in p_lower: dist_k = "4x50"
-    if "4x100" in p_lower: dist_k = "4x100"
-    
-    est_k = []
-    if "libre" in p_lower or "crol" in p_lower: est_k = ["libre", "crol"]
-    elif "espalda" in p_lower: est_k = ["espalda"]
-    elif "pecho" in p_lower: est_k = ["pecho"]
-    elif "mariposa" in p_lower: est_k = ["mariposa"]
-    elif "combinado" in p_lower or "medley" in p_lower: est_k = ["combinado", "medley"]
-    
-    if not dist_k or not est_k: return ""
-    
-    try:
-        mask_dist = df_t_nadador['dist_desc'].str.lower().str.contains(dist_k, na=False)
-        mask_est = df_t_nadador['estilo_desc'].str.lower().apply(lambda x: any(k in str(x) for k in est_k))
-        
-        matches = df_t_nadador[mask_dist & mask_est]
-        if not matches.empty:
-            best = matches.loc[matches['segundos'].idxmin()]
-            return best['tiempo']
-    except:
-        return ""
-    return ""
-
 def set_flash_message(mensaje, tipo="success"):
     st.session_state.flash_msg = {"texto": mensaje, "tipo": tipo}
 
@@ -172,11 +83,6 @@ def set_flash_message(mensaje, tipo="success"):
 # 5. FUNCIONES CRUD (USANDO CALLBACKS)
 # ==========================================
 def guardar_competencia(id_comp, nombre, fecha_ev, hora, cod_pil, fecha_lim, costo, desc, lista_pruebas_hab, max_pru=10):
-    df_comp = leer_dataset_fresco("Competencias")
-    if df_comp is None: df_comp = pd.DataFrame(columns=["id_competencia", "nombre_evento", "fecha_evento", "hora_inicio", "cod_pileta", "fecha_limite", "costo", "descripcion", "pruebas_habilitadas", "max_pruebas"])
-    if 'pruebas_habilitadas' not in df_comp.columns: df_comp['pruebas_habilitadas'] = ""
-    if 'max_pruebas' not in df_comp.columns: df_comp['max_pruebas'] = 10
-
     str_pruebas = ", ".join(lista_pruebas_hab) if lista_pruebas_hab else ""
     nuevo = {
         "id_competencia": id_comp if id_comp else str(uuid.uuid4()),
@@ -191,59 +97,38 @@ def guardar_competencia(id_comp, nombre, fecha_ev, hora, cod_pil, fecha_lim, cos
         "max_pruebas": int(max_pru)
     }
 
-    if id_comp and not df_comp.empty and id_comp in df_comp['id_competencia'].values:
-        idx = df_comp.index[df_comp['id_competencia'] == id_comp].tolist()[0]
-        for k, v in nuevo.items(): df_comp.at[idx, k] = v
-        msg = "✅ Evento actualizado correctamente."
-    else:
-        df_comp = pd.concat([df_comp, pd.DataFrame([nuevo])], ignore_index=True)
-        msg = "✅ Evento creado exitosamente."
-
-    exito, _ = actualizar_con_retry("Competencias", df_comp)
-    if exito: st.cache_data.clear(); return True, msg
-    return False, "Error al guardar."
+    # Las columnas que falten en la hoja (pruebas_habilitadas, max_pruebas) las agrega el backend
+    clave = {"id_competencia": nuevo["id_competencia"]}
+    exito, resultado = intentar(lambda: modificar_fila("competencias", clave, lambda fila: {**(fila or {}), **nuevo}))
+    if not exito: return False, "Error al guardar."
+    anterior, _ = resultado
+    return True, "✅ Evento actualizado correctamente." if anterior else "✅ Evento creado exitosamente."
 
 def eliminar_competencia(id_comp):
-    df_comp = leer_dataset_fresco("Competencias")
-    df_ins = leer_dataset_fresco("Inscripciones")
-    if df_comp is None: return False, "Error."
-    df_comp = df_comp[df_comp['id_competencia'] != id_comp]
-    if df_ins is not None and not df_ins.empty:
-        df_ins = df_ins[df_ins['id_competencia'] != id_comp]
-        actualizar_con_retry("Inscripciones", df_ins)
+    clave = {"id_competencia": id_comp}
+    intentar(lambda: eliminar_filas("inscripciones", ["id_competencia"], pd.DataFrame([clave])))
     
-    exito, _ = actualizar_con_retry("Competencias", df_comp)
-    if exito: st.cache_data.clear(); return True, "Eliminado."
+    exito, _ = intentar(lambda: modificar_fila("competencias", clave, lambda fila: None))
+    if exito: return True, "Eliminado."
     return False, "Error."
 
 def gestionar_inscripcion(id_comp, id_nadador, lista_pruebas):
-    df_ins = leer_dataset_fresco("Inscripciones")
-    if df_ins is None: df_ins = pd.DataFrame(columns=["id_inscripcion", "id_competencia", "codnadador", "pruebas", "fecha_inscripcion"])
-    if not df_ins.empty: df_ins['codnadador'] = pd.to_numeric(df_ins['codnadador'], errors='coerce').fillna(0).astype(int)
+    clave = {"id_competencia": id_comp, "codnadador": int(id_nadador)}
 
-    pruebas_str = ", ".join(lista_pruebas)
-    mask = (df_ins['id_competencia'] == id_comp) & (df_ins['codnadador'] == id_nadador)
-    
-    if not df_ins[mask].empty:
-        df_ins.loc[mask, 'pruebas'] = pruebas_str
-        df_ins.loc[mask, 'fecha_inscripcion'] = datetime.now().strftime("%Y-%m-%d")
-        msg = "✏️ Inscripción modificada."
-    else:
-        nuevo = {"id_inscripcion": str(uuid.uuid4()), "id_competencia": id_comp, "codnadador": int(id_nadador), "pruebas": pruebas_str, "fecha_inscripcion": datetime.now().strftime("%Y-%m-%d")}
-        df_ins = pd.concat([df_ins, pd.DataFrame([nuevo])], ignore_index=True)
-        msg = "✅ Inscripción confirmada."
-    exito, _ = actualizar_con_retry("Inscripciones", df_ins)
-    if exito: st.cache_data.clear(); return True, msg
-    return False, "Error al procesar inscripción."
+    def inscribir(fila):
+        # Escritura versionada: si otro la modificó recién, se reaplica sobre su versión
+        base = fila or {"id_inscripcion": str(uuid.uuid4()), **clave}
+        return {**base, "pruebas": ", ".join(lista_pruebas), "fecha_inscripcion": datetime.now().strftime("%Y-%m-%d")}
+
+    exito, resultado = intentar(lambda: modificar_fila("inscripciones", clave, inscribir))
+    if not exito: return False, "Error al procesar inscripción."
+    anterior, _ = resultado
+    return True, "✏️ Inscripción modificada." if anterior else "✅ Inscripción confirmada."
 
 def eliminar_inscripcion(id_comp, id_nadador):
-    df_ins = leer_dataset_fresco("Inscripciones")
-    if df_ins is None: return False, "Error."
-    if not df_ins.empty: df_ins['codnadador'] = pd.to_numeric(df_ins['codnadador'], errors='coerce').fillna(0).astype(int)
-    
-    df_ins = df_ins[~((df_ins['id_competencia'] == id_comp) & (df_ins['codnadador'] == id_nadador))]
-    exito, _ = actualizar_con_retry("Inscripciones", df_ins)
-    if exito: st.cache_data.clear(); return True, "Baja exitosa."
+    clave = {"id_competencia": id_comp, "codnadador": int(id_nadador)}
+    exito, _ = intentar(lambda: modificar_fila("inscripciones", clave, lambda fila: None))
+    if exito: return True, "Baja exitosa."
     return False, "Error."
 
 # --- LOGICA DE CALLBACKS PARA ESTABILIDAD DE PANTALLA ---
@@ -330,23 +215,10 @@ def cb_set_sort(c_id, col):
 
 df_competencias, df_inscripciones, df_nadadores, df_piletas, df_tiempos, df_estilos, df_distancias = cargar_datos_agenda()
 
-mi_cat_actual = "-"
-if df_nadadores is not None and not df_nadadores.empty:
-    mi_row = df_nadadores[df_nadadores['codnadador'] == mi_id]
-    if not mi_row.empty:
-        mi_anio = pd.to_datetime(mi_row.iloc[0]['fechanac']).year
-        mi_cat_actual = calcular_categoria_master(mi_anio)
-
-df_t_global = pd.DataFrame()
-if df_tiempos is not None and not df_tiempos.empty:
-    df_t_global = df_tiempos.copy()
-    if not df_estilos.empty:
-        df_t_global = df_t_global.merge(df_estilos.rename(columns={'descripcion': 'estilo_desc'}), on='codestilo', how='left')
-    if not df_distancias.empty:
-        df_t_global = df_t_global.merge(df_distancias.rename(columns={'descripcion': 'dist_desc'}), on='coddistancia', how='left')
-        
-    df_t_global['segundos'] = df_t_global['tiempo'].apply(lambda x: tiempo_a_seg(x) if pd.notnull(x) else 9999.0)
-    df_t_global['codnadador'] = pd.to_numeric(df_t_global['codnadador'], errors='coerce').fillna(0).astype(int)
+# Edades y categorías Master de todo el padrón, armadas una vez por año (comun.edades)
+try: padron = padron_edades()
+except: padron = None
+
 
 st.title("📅 Agenda de Torneos")
 st.markdown(f"Usuario: **{mi_nombre}**")
@@ -425,9 +297,13 @@ font-weight:bold; height:fit-content;">{badge}</span>
         d_full = pd.DataFrame()
         if not f_ins.empty:
             d_full = f_ins.merge(df_nadadores, on="codnadador", how="left")
-            d_full['Anio'] = d_full['fechanac'].dt.year
-            d_full['Cat'] = d_full['Anio'].apply(calcular_categoria_master)
+            # Categoría al 31/12 del año del torneo
+            d_full['Cat'] = padron.categorias(d_full['codnadador'], row['fecha_evento']) if padron else "-"
+            mi_cat_torneo = padron.categoria(mi_id, row['fecha_evento']) if padron else "-"
             d_full['Nombre'] = d_full['apellido'] + ", " + d_full['nombre']
+            # Mejor tiempo de cada inscripto en cada prueba: un solo join (comun.pruebas)
+            try: semillas = tiempos_de_inscripcion(d_full)
+            except: semillas = pd.Series(dtype=object)
 
         # === A. LISTA PÚBLICA DE INSCRIPTOS ===
         with st.expander("📋 Ver Lista de Inscriptos"):
@@ -475,8 +351,6 @@ font-weight:bold; height:fit-content;">{badge}</span>
                         else:
                             borde_estilo = "border-left: 4px solid #E30613; background-color: #383940;"
 
-                        df_t_nadador = df_t_global[df_t_global['codnadador'] == r_pub['codnadador']] if not df_t_global.empty else pd.DataFrame()
-
                         cat_chip = f"<span style='font-size: 12px; font-weight: bold; background-color: #555; padding: 3px 8px; border-radius: 4px; color: #fff; margin-left: 5px;'>{r_pub['Cat']}</span>"
                         gen_chip = f"<span style='font-size: 12px; font-weight: bold; background-color: #555; padding: 3px 8px; border-radius: 4px; color: #fff; margin-left: 5px;'>Gen. {r_pub['codgenero']}</span>"
                         
@@ -487,11 +361,11 @@ font-weight:bold; height:fit-content;">{badge}</span>
 
                         chips_html = ""
                         for p in pruebas_lista:
-                            mejor_tiempo = buscar_mejor_tiempo(p, df_t_nadador)
+                            mejor_tiempo = semillas.get((r_pub['codnadador'], p), "")
                             
                             mostrar_tiempo = False
                             if rol in ["M", "P"]: mostrar_tiempo = True
-                            elif es_yo or str(r_pub['Cat']) == str(mi_cat_actual): mostrar_tiempo = True
+                            elif es_yo or str(r_pub['Cat']) == str(mi_cat_torneo): mostrar_tiempo = True
                             
                             if mejor_tiempo and mostrar_tiempo:
                                 tiempo_badge = f" <span style='color:#FFD700; font-family:monospace; font-weight:bold;'>({mejor_tiempo})</span>"
@@ -671,7 +545,7 @@ else:
     hoy = date.today()
     df_view = df_competencias.copy()
     if not df_view.empty:
-        df_view['fecha_dt'] = pd.to_datetime(df_view['fecha_evento']).dt.date
+        df_view['fecha_dt'] = df_view['fecha_evento']
 
     df_proximos = df_view[df_view['fecha_dt'] >= hoy].sort_values(by='fecha_dt', ascending=True)
     df_finalizados = df_view[df_view['fecha_dt'] < hoy].sort_values(by='fecha_dt', ascending=False)
@@ -1,9 +1,12 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 from datetime import datetime, date, timedelta
 import time
-import random
+
+from comun.cola_escritura import desmarcar_realizada, marcar_realizada
+from comun.datos import CLAVES_FILA, actualizar_filas, agregar_filas, eliminar_filas, leer_hoja
+from comun.limitador import intentar
+from comun.nadadores import DirectorioNadadores, directorio_nadadores
 
 # --- NUEVAS IMPORTACIONES PARA GENERAR WORD ---
 from docx import Document
@@ -27,9 +30,9 @@ mi_id = st.session_state.user_id
 mi_nombre = st.session_state.user_name
 
 # ==========================================
-# 3. CONEXIÓN A GOOGLE SHEETS
+# 3. ALMACENAMIENTO
 # ==========================================
-conn = st.connection("gsheets", type=GSheetsConnection)
+# Lecturas y escrituras pasan por comun.datos (backend configurable).
 
 # ==========================================
 # 4. FUNCIONES AUXILIARES Y GLOSARIO
@@ -151,66 +154,30 @@ def mostrar_referencias():
         * **C/:** Con tiempo de pausa
         """)
 
-# --- MANEJO DE RETRYS PARA API ---
-def actualizar_con_retry(worksheet, data, max_retries=5):
-    for i in range(max_retries):
-        try:
-            conn.update(worksheet=worksheet, data=data)
-            return True, None 
-        except Exception as e:
-            error_msg = str(e).lower()
-            if "429" in error_msg or "quota" in error_msg or "rate limit" in error_msg:
-                wait_time = (2 ** i) + random.uniform(0, 1)
-                time.sleep(wait_time)
-                continue 
-            else:
-                return False, e
-    return False, "Tiempo de espera agotado (API ocupada)."
-
-# --- LECTURA DE DATOS (CON CACHÉ) ---
-@st.cache_data(ttl="5s")
+# --- LECTURA DE DATOS (SNAPSHOT COMPARTIDO) ---
+# IDs, año/mes/sesión y fechas ya llegan tipados desde el snapshot (comun.esquemas)
 def cargar_datos_rutinas_view():
     try:
         try:
-            df_rut = conn.read(worksheet="Rutinas").copy()
+            df_rut = leer_hoja("rutinas")
         except:
             df_rut = pd.DataFrame(columns=["id_rutina", "anio_rutina", "mes_rutina", "nro_sesion", "texto_rutina"])
         
         try:
-            df_seg = conn.read(worksheet="Rutinas_Seguimiento").copy()
+            df_seg = leer_hoja("seguimiento")
         except:
             df_seg = pd.DataFrame(columns=["id_rutina", "codnadador", "fecha_realizada"])
 
         try:
-            df_nad = conn.read(worksheet="Nadadores").copy()
+            df_nad = leer_hoja("nadadores")
         except:
             df_nad = pd.DataFrame(columns=["codnadador", "nombre", "apellido"])
             
-        # Normalización de tipos
-        if not df_rut.empty:
-            df_rut['anio_rutina'] = pd.to_numeric(df_rut['anio_rutina'], errors='coerce').fillna(0).astype(int)
-            df_rut['mes_rutina'] = pd.to_numeric(df_rut['mes_rutina'], errors='coerce').fillna(0).astype(int)
-            df_rut['nro_sesion'] = pd.to_numeric(df_rut['nro_sesion'], errors='coerce').fillna(0).astype(int)
-            
-        if not df_seg.empty:
-            df_seg['codnadador'] = pd.to_numeric(df_seg['codnadador'], errors='coerce').fillna(0).astype(int)
-
-        if not df_nad.empty:
-             df_nad['codnadador'] = pd.to_numeric(df_nad['codnadador'], errors='coerce').fillna(0).astype(int)
-            
         return df_rut, df_seg, df_nad
     except Exception as e:
         st.error(f"Error visual al cargar datos: {e}")
         return None, None, None
 
-def leer_dataset_fresco(worksheet):
-    try:
-        df = conn.read(worksheet=worksheet, ttl=0).copy()
-        return df
-    except Exception as e:
-        st.error(f"Error de conexión fresca con {worksheet}: {e}")
-        return None
-
 def calcular_proxima_sesion(df, anio, mes):
     if df is None or df.empty: return 1
     filtro = df[(df['anio_rutina'] == anio) & (df['mes_rutina'] == mes)]
@@ -222,52 +189,29 @@ def calcular_proxima_sesion(df, anio, mes):
 # ==========================================
 
 def guardar_seguimiento(id_rutina, id_nadador):
-    df_seg = leer_dataset_fresco("Rutinas_Seguimiento")
-    if df_seg is None: return False 
+    # La vista ya incluye las marcas en cola: alcanza para evitar duplicados
+    try: df_seg = leer_hoja("seguimiento")
+    except: return False
     
-    if not df_seg.empty:
-        df_seg['codnadador'] = pd.to_numeric(df_seg['codnadador'], errors='coerce').fillna(0).astype(int)
-
-    existe = df_seg[(df_seg['id_rutina'] == id_rutina) & (df_seg['codnadador'] == id_nadador)]
+    existe = df_seg[(df_seg['id_rutina'] == id_rutina) & (df_seg['codnadador'] == id_nadador)] if not df_seg.empty else df_seg
     
     if existe.empty:
         hora_arg = datetime.now() - timedelta(hours=3)
-        nuevo_registro = pd.DataFrame([{
-            "id_rutina": id_rutina,
-            "codnadador": id_nadador,
-            "fecha_realizada": hora_arg.strftime("%Y-%m-%d %H:%M:%S")
-        }])
-        df_final = pd.concat([df_seg, nuevo_registro], ignore_index=True)
-        
-        exito, error = actualizar_con_retry("Rutinas_Seguimiento", df_final)
-        if exito:
-            st.cache_data.clear() 
-            return True
-        else:
-            st.error(f"Error al guardar: {error}")
-            return False
+        # Se confirma al instante; la cola la escribe junto con las demás marcas
+        marcar_realizada(id_rutina, id_nadador, hora_arg.strftime("%Y-%m-%d %H:%M:%S"))
+        return True
     return False
 
 def borrar_seguimiento(id_rutina, id_nadador):
-    df_seg = leer_dataset_fresco("Rutinas_Seguimiento")
-    if df_seg is None: return False
-    
-    if not df_seg.empty:
-        df_seg['codnadador'] = pd.to_numeric(df_seg['codnadador'], errors='coerce').fillna(0).astype(int)
-
-    df_final = df_seg[~((df_seg['id_rutina'] == id_rutina) & (df_seg['codnadador'] == id_nadador))]
-    
-    exito, error = actualizar_con_retry("Rutinas_Seguimiento", df_final)
-    if exito:
-        st.cache_data.clear()
-        return True
-    else:
-        st.error(f"Error al borrar: {error}")
-        return False
+    desmarcar_realizada(id_rutina, id_nadador)
+    return True
 
 def eliminar_sesion_admin(id_rutina):
-    df_rut = leer_dataset_fresco("Rutinas")
-    if df_rut is None: return "❌ Error de conexión."
+    # Cada escritura ya actualiza el snapshot: no hace falta releer la hoja
+    try: df_rut = leer_hoja("rutinas")
+    except Exception as e:
+        st.error(f"Error de conexión con rutinas: {e}")
+        return "❌ Error de conexión."
     
     rutina_a_borrar = df_rut[df_rut['id_rutina'] == id_rutina]
     
@@ -284,27 +228,15 @@ def eliminar_sesion_admin(id_rutina):
     if r_sesion < max_sesion:
         return f"🚫 Solo se permite eliminar la última sesión del mes (Sesión {max_sesion})."
 
-    df_rut_final = df_rut[df_rut['id_rutina'] != id_rutina]
-    
-    exito, error = actualizar_con_retry("Rutinas", df_rut_final)
+    exito, error = intentar(lambda: eliminar_filas("rutinas", CLAVES_FILA["rutinas"], rutina_a_borrar[['id_rutina']]))
     
     if exito:
-        st.cache_data.clear()
         return "🗑️ Sesión eliminada correctamente."
     else:
         return f"❌ Error al eliminar: {error}"
 
 def guardar_sesion_admin(anio, mes, sesion, texto):
-    df_rut = leer_dataset_fresco("Rutinas")
-    if df_rut is None: return "❌ Error CRÍTICO de conexión."
-
-    if not df_rut.empty:
-        df_rut['anio_rutina'] = pd.to_numeric(df_rut['anio_rutina'], errors='coerce').fillna(0).astype(int)
-        df_rut['mes_rutina'] = pd.to_numeric(df_rut['mes_rutina'], errors='coerce').fillna(0).astype(int)
-        df_rut['nro_sesion'] = pd.to_numeric(df_rut['nro_sesion'], errors='coerce').fillna(0).astype(int)
-
     nuevo_id = f"{anio}-{mes:02d}-S{sesion:02d}"
-    mask = df_rut['id_rutina'] == nuevo_id
     
     nueva_fila = {
         "id_rutina": nuevo_id,
@@ -314,17 +246,14 @@ def guardar_sesion_admin(anio, mes, sesion, texto):
         "texto_rutina": texto
     }
     
-    if df_rut[mask].empty:
-        df_rut = pd.concat([df_rut, pd.DataFrame([nueva_fila])], ignore_index=True)
-        msg = "✅ Sesión creada correctamente."
-    else:
-        df_rut.loc[mask, "texto_rutina"] = texto
-        msg = "✅ Sesión actualizada correctamente."
-        
-    exito, error = actualizar_con_retry("Rutinas", df_rut)
-    if exito:
-        st.cache_data.clear()
-    return msg if exito else f"❌ Error al escribir: {error}"
+    # Si la sesión ya existe sólo se pisa el texto; si no, se agrega la fila completa
+    cambio = pd.DataFrame([{"id_rutina": nuevo_id, "texto_rutina": texto}])
+    exito, modificadas = intentar(lambda: actualizar_filas("rutinas", CLAVES_FILA["rutinas"], cambio))
+    if not exito: return f"❌ Error al escribir: {modificadas}"
+    if modificadas: return "✅ Sesión actualizada correctamente."
+
+    exito, error = intentar(lambda: agregar_filas("rutinas", pd.DataFrame([nueva_fila])))
+    return "✅ Sesión creada correctamente." if exito else f"❌ Error al escribir: {error}"
 
 def activar_calculo_auto():
     st.session_state.trigger_calculo = True
@@ -586,6 +515,12 @@ if df_rutinas is None:
     st.error("No se pudieron cargar los datos. Verifica tu conexión.")
     st.stop()
 
+# Nombres de alumnos por código, armados una vez por snapshot
+try:
+    directorio = directorio_nadadores()
+except:
+    directorio = DirectorioNadadores(df_nadadores)
+
 st.write("---")
 
 # ==========================
@@ -719,20 +654,17 @@ if rol in ["M", "P"]:
         st.info("Seleccione un alumno para ver su cumplimiento histórico.")
         
         ids_activos = df_seguimiento['codnadador'].unique()
-        df_nad_activos = df_nadadores[df_nadadores['codnadador'].isin(ids_activos)].copy()
+        lista_nads = directorio.ordenados(ids_activos)
         
-        if df_nad_activos.empty:
+        if not lista_nads:
             st.warning("⚠️ Aún no hay alumnos con sesiones completadas.")
         else:
-            df_nad_activos['NombreCompleto'] = df_nad_activos['apellido'] + ", " + df_nad_activos['nombre']
-            lista_nads = df_nad_activos[['codnadador', 'NombreCompleto']].sort_values('NombreCompleto')
-            
             col_s1, col_s2, col_s3 = st.columns([2, 1, 1])
             with col_s1:
                 sel_nad_id = st.selectbox(
                     "Alumno", 
-                    lista_nads['codnadador'], 
-                    format_func=lambda x: lista_nads[lista_nads['codnadador'] == x]['NombreCompleto'].values[0]
+                    lista_nads, 
+                    format_func=directorio.etiqueta
                 )
             
             # Aplicamos defaults calculados previamente (Global Best Period)
@@ -762,7 +694,7 @@ if rol in ["M", "P"]:
 
                  with col_s3: sel_m_seg = st.selectbox("Mes", meses_disp_seg, format_func=lambda x: mapa_meses_seg[x], index=idx_m_seg, key="seg_m")
                 
-            st.markdown(f"**Reporte para:** {lista_nads[lista_nads['codnadador']==sel_nad_id]['NombreCompleto'].values[0]}")
+            st.markdown(f"**Reporte para:** {directorio.etiqueta(sel_nad_id)}")
             if sel_m_seg:
                 render_historial_compacto(df_rutinas, df_seguimiento, sel_a_seg, sel_m_seg, sel_nad_id)
 
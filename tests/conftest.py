@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Las páginas importan `comun` desde la raíz del repo (donde corre streamlit)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
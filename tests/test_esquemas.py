@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from comun.esquemas import TIPO_TEXTO, aplicar_esquema, unificar_codigos
+
+
+def test_texto_faltante_queda_nan():
+    df = aplicar_esquema("nadadores", pd.DataFrame({"apellido": ["Pérez", None, np.nan],
+                                                    "nombre": ["Ana", "Luis", ""]}))
+    assert df["apellido"].dtype == TIPO_TEXTO
+    assert df["apellido"].iloc[0] == "Pérez"
+    assert df["apellido"].iloc[1:].isna().all()
+    assert not df["apellido"].isin(["None", "nan"]).any()
+    assert (df["apellido"] == "Pérez").tolist() == [True, False, False]
+
+
+def test_texto_reaplicado_no_cambia():
+    df = aplicar_esquema("estilos", pd.DataFrame({"descripcion": ["Libre", None]}))
+    assert aplicar_esquema("estilos", df) is df
+
+
+def test_codigo_en_blanco_queda_nan():
+    tiempos = aplicar_esquema("tiempos", pd.DataFrame({"codestilo": ["E1", None, " ", np.nan],
+                                                       "coddistancia": ["D1", "D2", None, ""]}))
+    assert tiempos["codestilo"].cat.categories.tolist() == ["E1"]
+    assert tiempos["codestilo"].iloc[1:].isna().all()
+    assert tiempos["coddistancia"].cat.categories.tolist() == ["D1", "D2"]
+
+    vocabulario = {}
+    tiempos, _ = unificar_codigos(tiempos, vocabulario)
+    estilos = aplicar_esquema("estilos", pd.DataFrame({"codestilo": ["E2", None]}))
+    estilos, _ = unificar_codigos(estilos, vocabulario)
+    assert vocabulario["codestilo"].tolist() == ["E1", "E2"]
+    assert estilos["codestilo"].isna().tolist() == [False, True]
+
+
+def test_snapshot_igual_en_pandas_2_y_3():
+    # Filas como llegan de Sheets: todo texto, con celdas vacías
+    crudo = pd.DataFrame({"CodNadador": ["7", "8"], "Apellido": ["Gómez", ""], "Nombre": ["Eva", None],
+                          "NroSocio": ["1234.0", None], "DNI": [30111222.0, np.nan],
+                          "FechaNac": ["1980-05-02", "no sé"], "CodGenero": ["F", " "]})
+    df = aplicar_esquema("nadadores", crudo)
+    assert df["codnadador"].dtype == "int32"
+    assert df["apellido"].dtype == TIPO_TEXTO and df["nombre"].dtype == TIPO_TEXTO
+    assert isinstance(df["codgenero"].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_datetime64_dtype(df["fechanac"])
+    assert df["apellido"].tolist()[0] == "Gómez" and df["nombre"].isna().tolist() == [False, True]
+    assert df["nrosocio"].tolist() == ["1234", ""] and df["dni"].tolist() == ["30111222", ""]
+    assert df["codgenero"].isna().tolist() == [False, True] and df["fechanac"].isna().tolist() == [False, True]